@@ -1,4 +1,5 @@
 import json
+import os
 import random
 import uuid
 from collections import Counter, deque
@@ -100,7 +101,15 @@ class AnalyticsData:
     so instructors can easily validate analytics coverage.
     """
 
-    def __init__(self, recent_query_window: int = 50, session_timeout_minutes: int = 30):
+    def __init__(
+        self,
+        recent_query_window: int = 50,
+        session_timeout_minutes: int = 30,
+        query_log_path: Optional[str] = None,
+    ):
+        # append-only JSONL log of queries, survives restarts (used for cache warm-up)
+        self.query_log_path = query_log_path
+
         # fact tables
         self.fact_clicks: Counter[str] = Counter()
         self.fact_brand_clicks: Counter[str] = Counter()
@@ -116,6 +125,7 @@ class AnalyticsData:
         self.query_metadata: Dict[int, QueryRecord] = {}
         self.total_queries: int = 0
         self.zero_result_queries: int = 0
+        self.relaxed_queries: int = 0
         self.session_query_order: Counter[str] = Counter()
 
         # click level breakdowns
@@ -385,6 +395,7 @@ class AnalyticsData:
             timestamp=timestamp,
         )
         self.query_metadata[search_id] = record
+        self._append_query_log(record)
         self.sessions[session_id].query_ids.append(search_id)
         self.sessions[session_id].last_activity = timestamp
         if mission_id:
@@ -393,10 +404,61 @@ class AnalyticsData:
         self._update_context_counters(device_type, os_label, country, city, timestamp)
         return search_id
 
-    def update_query_results(self, search_id: int, results_count: int):
+    def _append_query_log(self, record: QueryRecord):
+        if not self.query_log_path or not record.normalized_terms:
+            return
+        entry = {
+            "timestamp": record.timestamp.isoformat(timespec="seconds"),
+            "query_id": record.query_id,
+            "session_id": record.session_id,
+            "terms": record.terms,
+            "normalized_terms": record.normalized_terms,
+        }
+        try:
+            # the default log lives under data/, which a fresh checkout does not have
+            os.makedirs(os.path.dirname(self.query_log_path) or ".", exist_ok=True)
+            with open(self.query_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Could not append to query log {self.query_log_path}: {e}")
+
+    @staticmethod
+    def read_top_queries(query_log_path: str, limit: int = 50) -> List[str]:
+        """
+        Return the `limit` most frequent normalized queries of a persisted query log,
+        most frequent first. Missing or unreadable logs yield an empty list.
+        """
+        counter = AnalyticsData.read_query_counts(query_log_path)
+        return [query for query, _ in counter.most_common(limit)]
+
+    @staticmethod
+    def read_query_counts(query_log_path: str) -> Counter:
+        """
+        Count the normalized queries of a persisted query log (same keys as query_counter).
+        Missing or unreadable logs yield an empty counter.
+        """
+        counter: Counter[str] = Counter()
+        try:
+            with open(query_log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        normalized = json.loads(line).get("normalized_terms")
+                    except json.JSONDecodeError:
+                        continue
+                    if normalized:
+                        counter[normalized] += 1
+        except OSError:
+            return Counter()
+        return counter
+
+    def update_query_results(self, search_id: int, results_count: int, relaxed: bool = False):
         """
         Once we know how many documents were returned we enrich the
         existing query event so dashboards can report zero-result rates.
+        Relaxed queries (some terms dropped to find results) are counted separately.
         """
         record = self.query_metadata.get(search_id)
         if not record:
@@ -408,6 +470,8 @@ class AnalyticsData:
                 break
         if results_count == 0:
             self.zero_result_queries += 1
+        if relaxed:
+            self.relaxed_queries += 1
 
     # Click instrumentation 
     def register_click(
@@ -504,6 +568,11 @@ class AnalyticsData:
             return 0.0
         return round((self.zero_result_queries / self.total_queries) * 100, 2)
 
+    def get_relaxed_query_rate(self) -> float:
+        if self.total_queries == 0:
+            return 0.0
+        return round((self.relaxed_queries / self.total_queries) * 100, 2)
+
     def get_top_brands(self, limit: int = 5) -> List[Dict[str, Any]]:
         return [{"brand": brand, "count": count} for brand, count in self.fact_brand_clicks.most_common(limit)]
 
@@ -525,6 +594,7 @@ class AnalyticsData:
             "avg_latency_ms": request_summary["avg_latency_ms"],
             "total_queries": self.total_queries,
             "zero_result_rate": self.get_zero_result_rate(),
+            "relaxed_query_rate": self.get_relaxed_query_rate(),
             "avg_dwell_time_ms": click_metrics["avg_dwell_time_ms"],
         }
 
@@ -1,7 +1,14 @@
+import gc
+import heapq
 import json
 import os
 import sys
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from operator import itemgetter
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
 
 # Add part_2 directory to path to import TF-IDF ranker
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -14,13 +21,28 @@ PART3_DIR = os.path.abspath(os.path.join(PROJECT_ROOT, "project_progress", "part
 if PART3_DIR not in sys.path:
     sys.path.append(PART3_DIR)
 
-from inverted_index import InvertedIndex
 from tfidf_ranking import TFIDFRanker
 from bm25_ranking import BM25Ranker
 from word2vec_ranking import Word2VecRanker
 from custom_ranking import CustomRanker
 
+from myapp.search.attributes import NUMERIC_FIELDS, AttributeStore, SearchFilters
+from myapp.search.blob_store import BlobStore
+from myapp.search.cache import CandidateSetCache, QueryResultCache
+from myapp.search.enrichment import derive_display_fields, enrich_corpus, enrich_document
+from myapp.search.expansion import ExpansionTable
+from myapp.search.fielded import evaluate_field_clauses, parse_field_clauses
+from myapp.search.objects import SearchResponse
+from myapp.search.pagination import decode_cursor, encode_cursor
+from myapp.search.pair_index import PairIndex
+from myapp.search.compaction import TokenVocabulary, compact_token_fields
 from myapp.search.preprocessing import preprocess_query
+from myapp.search.query_language import compile_query, is_structured_query
+from myapp.search.relaxation import QueryRelaxer
+from myapp.search.segments import SegmentedIndex
+from myapp.search.sharded_build import build_sharded_index
+from myapp.search.shared_index import SharedBM25Ranker, SharedIndex, SharedPairIndex, SharedTFIDFRanker, write_shared_index
+from myapp.search.spelling import FuzzyTermExpander, SymSpellIndex
 
 
 class SearchAlgorithm:
@@ -36,24 +58,100 @@ class SearchAlgorithm:
         ("custom", "Custom hybrid"),
     ]
     DEFAULT_RANKING_METHOD = "tfidf"
+    # Ranking methods that read term positions (CustomRanker proximity); the others only need tf
+    POSITIONAL_RANKING_METHODS = {"custom"}
     _METHOD_LABEL_MAP = {method: label for method, label in AVAILABLE_RANKING_METHODS}
+    # Result orders offered in the UI; any "<price|discount|rating>_<asc|desc>" is accepted
+    SORT_OPTIONS: List[Tuple[str, str]] = [
+        ("relevance", "Relevance"),
+        ("price_asc", "Price: low to high"),
+        ("price_desc", "Price: high to low"),
+        ("rating_desc", "Rating: high to low"),
+        ("discount_desc", "Discount: high to low"),
+    ]
+    DEFAULT_SORT = "relevance"
     
-    def __init__(self, corpus_data_path: str):
+    def __init__(
+        self,
+        corpus_data_path: str,
+        pair_index_queries: Optional[List[str]] = None,
+        blob_store_path: Optional[str] = None,
+    ):
         """
         Initialize the search algorithm with the corpus data.
         Builds inverted index and TF-IDF ranker at initialization for optimal performance.
         
         :param corpus_data_path: Path to the processed corpus JSON file
+        :param pair_index_queries: Logged queries whose term pairs get precomputed intersections first
+        :param blob_store_path: File for the large display fields (default: BLOB_STORE_PATH or next to the corpus)
         """
         self.corpus_data_path = corpus_data_path
+        self.blob_store_path = blob_store_path
+        self.enabled_methods = self._parse_enabled_methods(os.getenv("ENABLED_RANKING_METHODS"))
         self.corpus_data = self._load_corpus_data()
+        enrich_corpus(self.corpus_data)
+        self.doc_lookup: Dict[str, Dict[str, Any]] = {
+            doc['pid']: doc for doc in self.corpus_data if doc.get('pid')
+        }
+        self.blob_store = self._build_blob_store()
+        self.attribute_store = AttributeStore(self.corpus_data)
+        # Facet counting stops after FACET_BUDGET_MS and samples result sets above FACET_SAMPLE_SIZE (0 disables)
+        self.facet_budget_ms = float(os.getenv("FACET_BUDGET_MS", "20"))
+        self.facet_sample_size = int(os.getenv("FACET_SAMPLE_SIZE", "50000")) or None
+        # TF-IDF statistics computed by the index build, consumed by _build_tfidf_ranker
+        self._tfidf_statistics: Optional[Dict[str, Any]] = None
         self.inverted_index = self._build_inverted_index()
-        self.tfidf_ranker = TFIDFRanker(self.inverted_index, self.corpus_data)
+        # Documents (re)indexed or deleted since TF-IDF lengths were last computed
+        self.documents_changed = 0
+        self.pair_index = self._build_pair_index(pair_index_queries)
+        self.fuzzy_expander = self._build_fuzzy_expander()
+        self.expansion_table = self._load_expansion_table()
+        # Related terms added per query term and the share of their similarity they score with
+        self.expansion_max_terms = int(os.getenv("EXPANSION_MAX_TERMS", "3"))
+        self.expansion_weight = float(os.getenv("EXPANSION_WEIGHT", "0.5"))
+        # Queries with fewer than RELAX_MIN_RESULTS results drop up to RELAX_MAX_ATTEMPTS terms (0 disables)
+        self.query_relaxer = QueryRelaxer(
+            min_results=int(os.getenv("RELAX_MIN_RESULTS", "3")),
+            max_attempts=int(os.getenv("RELAX_MAX_ATTEMPTS", "2")),
+        )
+        self.tfidf_ranker = self._build_tfidf_ranker()
         self._ranker_cache: Dict[str, Any] = {"tfidf": self.tfidf_ranker}
+        # Build state of every enabled ranker (see get_ranker_status) and the locks that make each build run once
+        self._ranker_states: Dict[str, Dict[str, Any]] = {method: {"state": "lazy"} for method in self.enabled_methods}
+        self._ranker_states[self.DEFAULT_RANKING_METHOD] = {"state": "ready"}
+        self._ranker_locks: Dict[str, threading.Lock] = {method: threading.Lock() for method in self.enabled_methods}
+        self._prebuild_threads: List[threading.Thread] = []
         self.word2vec_model_name = os.getenv("WORD2VEC_MODEL_NAME", "glove-wiki-gigaword-100")
         self.word2vec_model_path = os.getenv("WORD2VEC_MODEL_PATH")
+        self.compaction_report = self.compact()
+        # Bumped whenever indexed data changes; cached results from older generations are dropped
+        self.index_generation = 0
+        # Collection-wide N, df and token count when this index is one shard of a partitioned corpus
+        self.collection_statistics: Optional[Dict[str, Any]] = None
+        # Read-only memory-mapped index once share_index() ran (multi-process serving)
+        self.shared_index: Optional[SharedIndex] = None
+        self.query_cache = QueryResultCache(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", "300")),
+            max_bytes=int(float(os.getenv("QUERY_CACHE_MAX_MB", "32")) * 1024 * 1024),
+        )
+        self.refinement_cache = CandidateSetCache(
+            max_sessions=int(os.getenv("REFINEMENT_CACHE_SESSIONS", "1000")),
+        )
         print(f"Search algorithm initialized with {len(self.corpus_data)} documents")
     
+    @classmethod
+    def _parse_enabled_methods(cls, value: Optional[str]) -> List[str]:
+        """
+        Parse a comma-separated list of ranking methods (ENABLED_RANKING_METHODS).
+        Unknown names are ignored and the default method is always enabled.
+        """
+        if not value:
+            return [method for method, _ in cls.AVAILABLE_RANKING_METHODS]
+        requested = {name.strip().lower() for name in value.split(",") if name.strip()}
+        requested.add(cls.DEFAULT_RANKING_METHOD)
+        return [method for method, _ in cls.AVAILABLE_RANKING_METHODS if method in requested]
+
     def _load_corpus_data(self) -> List[Dict[str, Any]]:
         """
         Load the processed corpus from JSON file.
@@ -62,71 +160,1053 @@ class SearchAlgorithm:
         with open(self.corpus_data_path, 'r', encoding='utf-8') as f:
             corpus = json.load(f)
         return corpus
+
+    def _build_blob_store(self) -> BlobStore:
+        """
+        Move the large display-only fields (description, product_details, images, full_text)
+        into a memory-mapped blob file so the in-memory corpus keeps only what ranking needs.
+        The file location can be overridden with BLOB_STORE_PATH, or per instance with blob_store_path
+        (index generations building side by side need separate files).
+        """
+        blob_path = (
+            self.blob_store_path
+            or os.getenv("BLOB_STORE_PATH")
+            or os.path.splitext(self.corpus_data_path)[0] + ".blobs"
+        )
+        store = BlobStore.build(blob_path, self.corpus_data)
+        print(f"Moved large fields of {len(store)} documents ({store.size_bytes() / 1e6:.1f} MB) to {blob_path}")
+        return store
     
-    def _build_inverted_index(self) -> InvertedIndex:
+    def _build_inverted_index(self) -> SegmentedIndex:
         """
         Build the inverted index from the corpus data.
         Uses the 'tokens' field which contains preprocessed tokens.
+        Term positions are only stored when an enabled ranking method reads them.
+        The built index is the first segment of a SegmentedIndex so catalogue updates can be
+        applied incrementally (see apply_updates); INDEX_BUFFER_DOCS, INDEX_MERGE_FACTOR and
+        INDEX_MAX_DELETED_RATIO tune the mutable segment size and the merge policy.
+        The index and the TF-IDF statistics are built over corpus partitions by INDEX_BUILD_WORKERS
+        processes (default 1: in this process; see sharded_build).
         """
-        index = InvertedIndex()
-        index.build_from_corpus(self.corpus_data, text_field='tokens', verbose=False)
-        return index
+        store_positions = any(method in self.POSITIONAL_RANKING_METHODS for method in self.enabled_methods)
+        workers = int(os.getenv("INDEX_BUILD_WORKERS", "1"))
+        build = build_sharded_index(self.corpus_data, workers, store_positions=store_positions)
+        index = build.index
+        self._tfidf_statistics = build.tfidf_statistics
+        print(f"Index build with {build.workers} worker(s): {build.timings}")
+        mode = "positions" if store_positions else "frequencies only"
+        print(f"Inverted index built ({mode}): ~{index.estimate_memory_bytes() / 1e6:.1f} MB of postings")
+        return SegmentedIndex(
+            index,
+            (doc['pid'] for doc in self.corpus_data if doc.get('pid') and doc.get('tokens')),
+            max_buffered_docs=int(os.getenv("INDEX_BUFFER_DOCS", "1000")),
+            merge_factor=int(os.getenv("INDEX_MERGE_FACTOR", "4")),
+            max_deleted_ratio=float(os.getenv("INDEX_MAX_DELETED_RATIO", "0.3")),
+        )
     
-    def search(self, query: str, top_k: int = 20, ranking_method: Optional[str] = None) -> List[Tuple[str, float]]:
+    def _build_tfidf_ranker(self) -> TFIDFRanker:
+        """
+        TF-IDF ranker of the default method, from the statistics of the index build when there are some.
+        """
+        statistics, self._tfidf_statistics = self._tfidf_statistics, None
+        if statistics is None:
+            return TFIDFRanker(self.inverted_index, self.corpus_data)
+        return TFIDFRanker.from_statistics(self.inverted_index, self.corpus_data, **statistics)
+
+    def _build_pair_index(self, queries: Optional[List[str]] = None) -> Optional[PairIndex]:
+        """
+        Precompute intersections of frequent term pairs under PAIR_INDEX_MB (0 disables it).
+        """
+        budget_mb = float(os.getenv("PAIR_INDEX_MB", "16"))
+        if budget_mb <= 0:
+            return None
+        pair_index = PairIndex.build(
+            self.inverted_index,
+            memory_budget_bytes=int(budget_mb * 1024 * 1024),
+            max_terms=int(os.getenv("PAIR_INDEX_TERMS", "48")),
+            query_terms_log=[preprocess_query(query) for query in queries or []],
+        )
+        stats = pair_index.stats()
+        print(
+            f"Pair index built: {stats['pairs']} pairs, {stats['memory_bytes'] / 1e6:.1f} MB "
+            f"in {stats['build_ms']:.0f} ms"
+        )
+        return pair_index
+
+    def _build_fuzzy_expander(self) -> Optional[FuzzyTermExpander]:
+        """
+        SymSpell index over the vocabulary for out-of-vocabulary query terms.
+        FUZZY_MAX_DISTANCE (default 2, 0 disables) bounds the edit distance; FUZZY_MAX_EXPANSIONS and
+        FUZZY_QUERY_BUDGET bound the vocabulary terms tried per misspelled term and per query.
+        """
+        max_distance = int(os.getenv("FUZZY_MAX_DISTANCE", "2"))
+        if max_distance <= 0:
+            return None
+        spelling_index = SymSpellIndex.build(
+            {term: len(postings) for term, postings in self.inverted_index.term_to_docs.items()},
+            max_distance=max_distance,
+        )
+        stats = spelling_index.stats()
+        print(
+            f"Spelling index built: {stats['terms']} terms, {stats['delete_keys']} delete keys "
+            f"in {stats['build_ms']:.0f} ms"
+        )
+        return FuzzyTermExpander(
+            spelling_index,
+            max_expansions=int(os.getenv("FUZZY_MAX_EXPANSIONS", "3")),
+            max_total_expansions=int(os.getenv("FUZZY_QUERY_BUDGET", "6")),
+        )
+
+    def _load_expansion_table(self) -> Optional[ExpansionTable]:
+        """
+        Embedding neighbours of the vocabulary precomputed offline (python -m myapp.search.expansion).
+        Read from EXPANSION_TABLE_PATH, by default next to the processed corpus; expansion is unavailable without it.
+        """
+        table_path = os.getenv("EXPANSION_TABLE_PATH") or os.path.splitext(self.corpus_data_path)[0] + ".expansions.npz"
+        if not os.path.exists(table_path):
+            return None
+        table = ExpansionTable.load(table_path)
+        stats = table.stats()
+        print(f"Expansion table loaded: {stats['terms']} terms, {stats['pairs']} related terms from {table_path}")
+        return table
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Compaction phase run once the inverted index is built.
+        Token fields still read by the rankers ('tokens' for BM25/Word2Vec lengths and vectors,
+        CustomRanker's weighted fields) are encoded as term-id arrays; the remaining token fields
+        are dropped. Rankers built lazily afterwards read the encoded fields transparently.
+        
+        :return: Compaction report with the measured size of the dropped, original and encoded token fields
+        """
+        keep_fields = {"tokens", "description_tokens", *CustomRanker.FIELD_WEIGHTS.keys()}
+        vocabulary = TokenVocabulary(self.inverted_index.term_to_docs.keys())
+        report = compact_token_fields(self.corpus_data, vocabulary, keep_fields)
+        print(
+            f"Compacted token fields: {report['encoded_fields']} encoded "
+            f"({report['list_bytes'] / 1e6:.1f} MB -> {report['encoded_bytes'] / 1e6:.1f} MB), "
+            f"{report['dropped_fields']} dropped ({report['dropped_bytes'] / 1e6:.1f} MB), "
+            f"{report['reclaimed_bytes'] / 1e6:.1f} MB reclaimed"
+        )
+        return report
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 20,
+        ranking_method: Optional[str] = None,
+        use_cache: bool = True,
+        session_id: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        sort_by: Optional[str] = None,
+        offset: int = 0,
+        search_after: Optional[str] = None,
+        expand: bool = False,
+    ) -> List[Tuple[str, float]]:
         """
         Perform search using the selected ranking strategy.
         
         :param query: Search query string
         :param top_k: Number of top results to return
         :param ranking_method: Identifier of the ranking algorithm to use
-        :return: List of (doc_id, score) tuples sorted by relevance
+        :param use_cache: Read and populate the query result cache
+        :param session_id: Analytics session, enables candidate reuse when a query refines the previous one
+        :param filters: Attribute filters (brand, category, seller, stock, price/discount/rating ranges)
+        :param sort_by: "relevance" (default) or an attribute order such as "price_asc" or "rating_desc"
+        :param offset: Number of results to skip (pagination)
+        :param search_after: Cursor of the previous page (see execute)
+        :param expand: Also match embedding neighbours of the query terms (see execute)
+        :return: List of (doc_id, score) tuples in the requested order
+        """
+        response = self.execute(
+            query,
+            top_k=top_k,
+            ranking_method=ranking_method,
+            use_cache=use_cache,
+            session_id=session_id,
+            filters=filters,
+            sort_by=sort_by,
+            offset=offset,
+            search_after=search_after,
+            expand=expand,
+        )
+        return list(response.results)
+
+    def execute(
+        self,
+        query: str,
+        top_k: int = 20,
+        ranking_method: Optional[str] = None,
+        use_cache: bool = True,
+        session_id: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        facets: bool = False,
+        sort_by: Optional[str] = None,
+        offset: int = 0,
+        search_after: Optional[str] = None,
+        expand: bool = False,
+    ) -> SearchResponse:
+        """
+        Run a query and describe the whole result set, not only the returned page.
+        Responses are served from the query cache when the same stemmed terms were
+        ranked with the same method, page, order, filters and facet option on the current index generation.
+        Results are totally ordered (ties broken by doc id) so consecutive pages never overlap.
+        Queries matching fewer than RELAX_MIN_RESULTS documents are relaxed (see _relax_query).
+        Queries using the query language ("round neck" -polo (cotton OR linen)) run a compiled plan instead.
+        A ranking method that is not ready yet (see prebuild_rankers) is replaced by the default one and
+        reported in ranking_fallback.
+
+        :param query: Search query string (keywords, or AND/OR/NOT, parentheses and quoted phrases)
+        :param top_k: Number of top results to return
+        :param ranking_method: Identifier of the ranking algorithm to use
+        :param use_cache: Read and populate the query result cache
+        :param session_id: Analytics session, enables candidate reuse when a query refines the previous one
+        :param filters: Attribute filters (brand, category, seller, stock, price/discount/rating ranges)
+        :param facets: Also count brand/category/seller values and price buckets over all matching documents
+        :param sort_by: "relevance" (default) or an attribute order such as "price_asc" or "rating_desc";
+                        relevance breaks ties between equal attribute values
+        :param offset: Number of results to skip (after the cursor, if any)
+        :param search_after: next_cursor of the previous page; only results after it are returned
+        :param expand: Weighted OR-expansion: every query term also matches its precomputed embedding
+                       neighbours, which score with a reduced weight (no-op without an expansion table)
+        :return: SearchResponse with the ranked (doc_id, score) page, total matches, facets and next_cursor
+        :raises ValueError: if search_after is malformed or was produced for another sort order
         """
         if not query or not query.strip():
-            return []
+            return SearchResponse()
         
-        # Preprocess query using the same pipeline as the indexed tokens
-        query_terms = preprocess_query(query)
+        # Attribute clauses (brand:puma price:<1500) become column predicates; the rest is searched as text
+        text_query, field_clauses, invalid_clauses = parse_field_clauses(query) if ":" in query else (query, [], [])
+        # Query language (AND/OR/NOT, parentheses, phrases) is compiled into a plan; keyword queries are
+        # preprocessed using the same pipeline as the indexed tokens
+        plan = compile_query(text_query, self.inverted_index) if is_structured_query(text_query) else None
+        query_terms = plan.terms() if plan is not None else preprocess_query(text_query)
         
-        if not query_terms:
-            return []
+        if not query_terms and not field_clauses:
+            return SearchResponse(field_clauses={"clauses": [], "invalid": invalid_clauses} if invalid_clauses else None)
 
         method = (ranking_method or self.DEFAULT_RANKING_METHOD).lower()
-        if method not in self._METHOD_LABEL_MAP:
+        if method not in self.enabled_methods:
+            method = self.DEFAULT_RANKING_METHOD
+        # A method whose ranker is still being built (or failed to build) ranks with the default one meanwhile;
+        # such responses are neither read from nor stored in the query cache
+        ranking_fallback = self._ranker_fallback(method) if query_terms else None
+        if ranking_fallback is not None:
             method = self.DEFAULT_RANKING_METHOD
+            use_cache = False
 
-        # Perform conjunctive query to find candidate documents
-        candidate_docs = self.inverted_index.conjunctive_query(query_terms)
+        sort_field, descending = self._parse_sort(sort_by)
+        sort_id = f"{sort_field}_{'desc' if descending else 'asc'}" if sort_field else self.DEFAULT_SORT
+        after_key = None
+        if search_after:
+            cursor_sort_id, after_key = decode_cursor(search_after)
+            if cursor_sort_id != sort_id:
+                raise ValueError(f"search_after cursor belongs to sort order '{cursor_sort_id}', not '{sort_id}'")
+        offset = max(0, offset)
+        if filters is not None and filters.is_empty():
+            filters = None
+        cache_key = (
+            plan.canonical() if plan is not None else tuple(query_terms),
+            method,
+            top_k,
+            offset,
+            sort_id,
+            search_after,
+            filters.cache_key() if filters else (),
+            facets,
+            expand,
+            tuple(str(clause) for clause in field_clauses),
+            tuple(item["clause"] for item in invalid_clauses),
+        )
+        if use_cache:
+            cached = self.query_cache.get(cache_key, self.index_generation)
+            if cached is not None:
+                response, refinement = cached
+                if refinement is not None and session_id is not None:
+                    # The session refines from this query's candidates as if it had run it
+                    self.refinement_cache.put(session_id, *refinement, self.index_generation)
+                return response
+        generation = self.index_generation
+
+        spelling_report = synonym_report = relaxation_report = query_plan = None
+        term_weights = None
+        # (terms, conjunctive candidates) cached with the response for the refinement of later sessions
+        refinement: Optional[Tuple[FrozenSet[str], FrozenSet[str]]] = None
+        field_mask = field_report = field_docs = None
+        if field_clauses:
+            field_mask, field_report = evaluate_field_clauses(self.attribute_store, field_clauses)
+        if invalid_clauses:
+            # Ignored, not searched as words: field:value tokens never reach spelling or relaxation
+            field_report = {**(field_report or {"clauses": []}), "invalid": invalid_clauses}
+        if plan is not None:
+            # The plan replaces the keyword pipeline: no typo, synonym or relaxation rewrites
+            if field_mask is not None:
+                plan.restrict(self.attribute_store.mask_doc_ids(field_mask), "attributes")
+                field_report["pushdown"] = "plan"
+            candidate_docs = self.attribute_store.apply_filters(plan.execute(), filters)
+            ranking_terms = query_terms
+            query_plan = plan.explain()
+        elif not query_terms:
+            # Attribute clauses only: every matching document, ranked by attribute order or equally
+            candidate_docs = self.attribute_store.apply_filters(self.attribute_store.mask_doc_ids(field_mask), filters)
+            ranking_terms = []
+            field_report["pushdown"] = "only"
+        else:
+            # Misspelled (out-of-vocabulary) terms match any of their nearest vocabulary terms
+            expansions: Dict[str, List[str]] = {}
+            vocabulary = self.inverted_index.term_to_docs
+            # A shard knows the collection vocabulary: a term only other shards index is not a misspelling
+            known_terms = self.collection_statistics["document_frequencies"] if self.collection_statistics else vocabulary
+            if self.fuzzy_expander is not None and any(term not in known_terms for term in query_terms):
+                expansions, spelling_report = self.fuzzy_expander.expand(query_terms, known_terms)
+            if expand and self.expansion_table is not None:
+                term_weights, synonym_report = self._expand_terms(query_terms, expansions)
+            exact_terms = [term for term in query_terms if term not in expansions]
+            ranking_terms = exact_terms + [term for group in expansions.values() for term in group]
+
+            # Perform conjunctive query to find candidate documents. Attribute clauses more selective than
+            # the rarest term seed the intersection; otherwise their mask filters its result
+            if field_mask is not None and exact_terms and field_report["matched"] < min(
+                len(vocabulary.get(term, ())) for term in exact_terms
+            ):
+                field_docs = self.attribute_store.mask_doc_ids(field_mask)
+                candidate_docs = self._conjunctive_candidates(exact_terms, initial_docs=field_docs)
+                field_report["pushdown"] = "seed"
+            else:
+                candidate_docs = self._candidate_docs(exact_terms, session_id) if exact_terms else None
+                if use_cache and candidate_docs is not None and (
+                    len(candidate_docs) <= self.refinement_cache.max_docs_per_session
+                ):
+                    refinement = (frozenset(exact_terms), frozenset(candidate_docs))
+            for group in expansions.values():
+                group_docs = {posting[0] for term in group for posting in vocabulary[term]}
+                candidate_docs = group_docs if candidate_docs is None else candidate_docs & group_docs
+            if field_mask is not None and field_docs is None:
+                candidate_docs = self.attribute_store.apply_mask(candidate_docs, field_mask)
+                field_report["pushdown"] = "filter"
+            # Filters are bitset operations on the candidates, applied before any scoring
+            candidate_docs = self.attribute_store.apply_filters(candidate_docs, filters)
+            if self.query_relaxer.needs_relaxation(len(set(query_terms)), len(candidate_docs)):
+                candidate_docs, relaxation_report = self._relax_query(
+                    query_terms, expansions, filters, candidate_docs, field_mask
+                )
         
         if not candidate_docs:
-            return []
+            page, remaining = [], 0
+        elif sort_field is None:
+            page, remaining = self._rank_by_relevance(
+                ranking_terms, candidate_docs, method, offset + top_k, after_key, term_weights
+            )
+        else:
+            page, remaining = self._rank_by_attribute(
+                ranking_terms, candidate_docs, method, sort_field, descending, offset + top_k, after_key, term_weights
+            )
+        page = page[offset:]
+        next_cursor = None
+        if len(page) == top_k and remaining > offset + top_k:
+            next_cursor = encode_cursor(sort_id, page[-1][0])
+
+        facet_counts = None
+        if facets:
+            facet_counts = self.attribute_store.facet_counts(
+                candidate_docs,
+                budget_ms=self.facet_budget_ms,
+                sample_size=self.facet_sample_size,
+            )
+        
+        response = SearchResponse(
+            results=tuple(result for _, result in page),
+            total=len(candidate_docs),
+            facets=facet_counts,
+            next_cursor=next_cursor,
+            spelling=spelling_report,
+            relaxation=relaxation_report,
+            synonyms=synonym_report,
+            query_plan=query_plan,
+            field_clauses=field_report,
+            ranking_fallback=ranking_fallback,
+        )
+        if use_cache:
+            self.query_cache.put(cache_key, (response, refinement), generation)
+        return response
+
+    @classmethod
+    def _parse_sort(cls, sort_by: Optional[str]) -> Tuple[Optional[str], bool]:
+        """
+        Parse "<attribute>_<asc|desc>" into (attribute, descending); relevance is (None, False).
+        """
+        if not sort_by or sort_by == cls.DEFAULT_SORT:
+            return None, False
+        field, _, direction = sort_by.lower().rpartition("_")
+        if field not in NUMERIC_FIELDS or direction not in ("asc", "desc"):
+            return None, False
+        return field, direction == "desc"
+
+    def _rank_by_relevance(
+        self,
+        query_terms: List[str],
+        candidate_docs: Set[str],
+        method: str,
+        count: int,
+        after_key: Optional[Tuple] = None,
+        term_weights: Optional[Dict[str, float]] = None,
+    ) -> Tuple[List[Tuple[Tuple, Tuple[str, float]]], int]:
+        """
+        First `count` candidates by descending score, then doc id, that come after `after_key`.
+        Candidates are scored unsorted and selected with a bounded heap of size `count`.
+        
+        :return: ([(sort key, (doc_id, score))] in order, number of candidates after the cursor)
+        """
+        keyed = (
+            ((-score, doc_id), (doc_id, score))
+            for doc_id, score in self._score_documents(method, query_terms, candidate_docs, term_weights)
+        )
+        if after_key is not None:
+            keyed = [entry for entry in keyed if entry[0] > after_key]
+        else:
+            keyed = list(keyed)
+        return heapq.nsmallest(count, keyed, key=itemgetter(0)), len(keyed)
+
+    def _rank_by_attribute(
+        self,
+        query_terms: List[str],
+        candidate_docs: Set[str],
+        method: str,
+        sort_field: str,
+        descending: bool,
+        count: int,
+        after_key: Optional[Tuple] = None,
+        term_weights: Optional[Dict[str, float]] = None,
+    ) -> Tuple[List[Tuple[Tuple, Tuple[str, float]]], int]:
+        """
+        First `count` candidates ordered by a numeric attribute, then relevance, then doc id,
+        that come after `after_key`. Only the attribute top-k (plus ties on the boundary values)
+        is scored by the ranker.
         
+        :return: ([(sort key, (doc_id, score))] in order, number of candidates after the cursor)
+        """
+        store = self.attribute_store
+        ordinals = store.candidate_ordinals(candidate_docs)
+        keys = store.sort_keys(sort_field, ordinals, descending)
+        remaining = len(ordinals)
+        boundary_ordinals = boundary_keys = keys[:0]
+        if after_key is not None:
+            # Results sharing the cursor's attribute value are ordered by score, so all of them are rescored
+            at_cursor = keys == after_key[0]
+            later = keys > after_key[0]
+            boundary_ordinals, boundary_keys = ordinals[at_cursor], keys[at_cursor]
+            ordinals, keys = ordinals[later], keys[later]
+            remaining = len(ordinals)
+        ordinals, keys = store.top_k_by_key(ordinals, keys, count)
+        ordinals = np.concatenate([boundary_ordinals.astype(ordinals.dtype), ordinals])
+        keys = np.concatenate([boundary_keys, keys]).tolist()
+        doc_ids = [store.doc_ids[ordinal] for ordinal in ordinals.tolist()]
+        scores = dict(self._score_documents(method, query_terms, set(doc_ids), term_weights))
+        keyed = []
+        for key, doc_id in zip(keys, doc_ids):
+            score = scores.get(doc_id, 0.0)
+            keyed.append(((key, -score, doc_id), (doc_id, score)))
+        if after_key is not None:
+            after_boundary = [entry for entry in keyed[:len(boundary_keys)] if entry[0] > after_key]
+            remaining += len(after_boundary)
+            keyed = after_boundary + keyed[len(boundary_keys):]
+        return heapq.nsmallest(count, keyed, key=itemgetter(0)), remaining
+
+    def _score_documents(
+        self,
+        method: str,
+        query_terms: List[str],
+        candidate_docs: Set[str],
+        term_weights: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[str, float]]:
+        if not query_terms:
+            # Attribute-only queries: no text to score, every candidate ties
+            return [(doc_id, 0.0) for doc_id in candidate_docs]
         ranker = self._get_ranker(method)
-        ranked_results = ranker.rank_documents(query_terms, candidate_docs)
+        if term_weights is None:
+            return ranker.score_documents(query_terms, candidate_docs)
+        return ranker.score_documents(query_terms, candidate_docs, term_weights)
+
+    def _expand_terms(
+        self, query_terms: List[str], expansions: Dict[str, List[str]]
+    ) -> Tuple[Optional[Dict[str, float]], Optional[Dict[str, Any]]]:
+        """
+        Turn every in-vocabulary query term with precomputed neighbours into an OR group
+        (the term itself plus up to EXPANSION_MAX_TERMS neighbours). Groups are added to `expansions`,
+        the clauses intersected as unions of postings; neighbours weigh EXPANSION_WEIGHT x similarity.
+        
+        :return: (ranking term weights, {query term: [[neighbour, similarity]]}) or (None, None)
+        """
+        vocabulary = self.inverted_index.term_to_docs
+        typed_terms = set(query_terms)
+        term_weights: Dict[str, float] = {}
+        report: Dict[str, List] = {}
+        for term in dict.fromkeys(query_terms):
+            if term in expansions or term not in vocabulary:
+                continue
+            neighbours = [
+                (neighbour, similarity)
+                for neighbour, similarity in self.expansion_table.expand(term, self.expansion_max_terms)
+                if neighbour in vocabulary and neighbour not in typed_terms and neighbour not in term_weights
+            ]
+            if not neighbours:
+                continue
+            expansions[term] = [term] + [neighbour for neighbour, _ in neighbours]
+            for neighbour, similarity in neighbours:
+                term_weights[neighbour] = self.expansion_weight * similarity
+            report[term] = [[neighbour, round(similarity, 3)] for neighbour, similarity in neighbours]
+        if not term_weights:
+            return None, None
+        return term_weights, report
+
+    def _relax_query(
+        self,
+        query_terms: List[str],
+        expansions: Dict[str, List[str]],
+        filters: Optional[SearchFilters],
+        candidate_docs: Set[str],
+        field_mask: Optional[np.ndarray] = None,
+    ) -> Tuple[Set[str], Optional[Dict[str, Any]]]:
+        """
+        Drop the out-of-vocabulary, then the most frequent, query terms until enough documents match.
+        Relaxed terms are still passed to the ranker, so they only stop being required.
         
-        # Return top_k results
-        return ranked_results[:top_k]
+        :return: (candidate set, relaxation report or None when no term could be relaxed usefully)
+        """
+        vocabulary = self.inverted_index.term_to_docs
+        clauses = [
+            (term, {posting[0] for expanded in expansions.get(term, [term]) for posting in vocabulary.get(expanded, ())})
+            for term in dict.fromkeys(query_terms)
+        ]
+        store = self.attribute_store
+        relaxed_docs, report = self.query_relaxer.relax(
+            clauses,
+            lambda docs: store.apply_mask(store.apply_filters(docs, filters), field_mask),
+            strict_total=len(candidate_docs),
+        )
+        if relaxed_docs is None:
+            return candidate_docs, None
+        return relaxed_docs, report
+
+    def _candidate_docs(self, query_terms: List[str], session_id: Optional[str] = None) -> Set[str]:
+        """
+        Conjunctive candidate set for the query terms.
+        If the session's previous query terms are a subset of the new ones, only the added
+        terms are intersected with the remembered candidates instead of starting over.
+        With a session the result is the frozenset remembered for it.
+        """
+        if session_id is None:
+            return self._conjunctive_candidates(query_terms)
+
+        term_set = frozenset(query_terms)
+        previous = self.refinement_cache.get(session_id, self.index_generation)
+        if previous is not None and previous[0] and previous[0] <= term_set:
+            previous_terms, previous_docs = previous
+            new_terms = [term for term in query_terms if term not in previous_terms]
+            candidate_docs = self._conjunctive_candidates(new_terms, initial_docs=previous_docs)
+            skipped = sum(len(self.inverted_index.term_to_docs.get(term, ())) for term in previous_terms)
+            self.refinement_cache.record(reused=True, postings_skipped=skipped)
+        else:
+            candidate_docs = self._conjunctive_candidates(query_terms)
+            self.refinement_cache.record(reused=False)
+        candidate_docs = frozenset(candidate_docs)
+        self.refinement_cache.put(session_id, term_set, candidate_docs, self.index_generation)
+        return candidate_docs
+
+    def _conjunctive_candidates(self, query_terms: List[str], initial_docs: Optional[Set[str]] = None) -> Set[str]:
+        """
+        Intersection planner: start from the cheapest precomputed pair lists covering the
+        query terms, then intersect the remaining terms in increasing document frequency.
+        """
+        seed: Optional[Set[str]] = None
+        remaining = list(dict.fromkeys(query_terms))
+        if self.pair_index is not None and len(remaining) > 1:
+            seed, remaining = self.pair_index.plan(remaining)
+        if initial_docs is not None:
+            if seed is None:
+                seed = set(initial_docs)
+            elif isinstance(seed, np.ndarray):
+                # Shared pair lists are doc numbers (see SharedPairIndex)
+                seed = np.intersect1d(seed, self.inverted_index.doc_numbers_of(list(initial_docs)))
+            else:
+                seed = seed & initial_docs
+        remaining.sort(key=lambda term: len(self.inverted_index.term_to_docs.get(term, ())))
+        if seed is None:
+            return self.inverted_index.conjunctive_query(remaining)
+        return self.inverted_index.conjunctive_query(remaining, initial_docs=seed)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters of the query result cache, for monitoring."""
+        return self.query_cache.stats()
+
+    def get_refinement_stats(self) -> Dict[str, Any]:
+        """Counters of session candidate reuse for refined queries."""
+        return self.refinement_cache.stats()
+
+    def get_spelling_stats(self) -> Dict[str, Any]:
+        """Size of the spelling index and how often misspelled terms were expanded (empty when disabled)."""
+        return self.fuzzy_expander.stats() if self.fuzzy_expander is not None else {}
+
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """
+        Compile and run a query-language query without ranking: the execution order of its set
+        operations with the estimated and actual number of matching documents of every node,
+        and the selectivity of every attribute clause (brand:, price:<, ...).
+        """
+        text_query, field_clauses, invalid_clauses = parse_field_clauses(query)
+        field_report = {"clauses": [], "invalid": invalid_clauses} if invalid_clauses else None
+        plan = compile_query(text_query, self.inverted_index)
+        if field_clauses:
+            field_mask, field_report = evaluate_field_clauses(self.attribute_store, field_clauses)
+            if invalid_clauses:
+                field_report["invalid"] = invalid_clauses
+            field_docs = self.attribute_store.mask_doc_ids(field_mask)
+            if plan is None:
+                return {"query": "", "plan": None, "elapsed_ms": None, "fields": field_report, "total": len(field_docs)}
+            plan.restrict(field_docs, "attributes")
+        if plan is None:
+            return {"query": "", "plan": None, "elapsed_ms": None, "fields": field_report, "total": 0}
+        total = len(plan.execute())
+        return {**plan.explain(), "fields": field_report, "total": total}
+
+    def get_expansion_stats(self) -> Dict[str, Any]:
+        """Size of the precomputed expansion table (empty when none was built)."""
+        return self.expansion_table.stats() if self.expansion_table is not None else {}
+
+    def get_relaxation_stats(self) -> Dict[str, Any]:
+        """How often low-result queries were relaxed and what it cost."""
+        return self.query_relaxer.stats()
+
+    def get_pair_index_stats(self) -> Dict[str, Any]:
+        """Size and usage of the frequent term pair index (empty when disabled)."""
+        return self.pair_index.stats() if self.pair_index is not None else {}
     
-    def get_document_by_id(self, doc_id: str) -> Dict[str, Any]:
+    def get_document_by_id(self, doc_id: str, include_large_fields: bool = True) -> Dict[str, Any]:
         """
         Retrieve a document from the corpus by its ID.
+        Large fields are materialized from the blob store only when requested.
         
         :param doc_id: Document ID (pid)
+        :param include_large_fields: Merge description, product_details, images and full_text into the result
         :return: Document dictionary or None if not found
         """
-        for doc in self.corpus_data:
-            if doc.get('pid') == doc_id:
-                return doc
-        return None
+        doc = self.doc_lookup.get(doc_id)
+        if doc is None or not include_large_fields:
+            return doc
+        return {**doc, **self.blob_store.get(doc_id)}
+
+    def reenrich_document(self, doc_id: str, changes: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Apply field changes to a stored document and recompute its derived display fields.
+        Only display data and attributes are refreshed; apply_updates re-indexes token changes.
+        
+        :param doc_id: Document ID (pid)
+        :param changes: Field values to overwrite before re-enrichment
+        :return: The updated document (with large fields) or None if not found
+        """
+        self._check_writable()
+        doc = self.doc_lookup.get(doc_id)
+        if doc is None:
+            return None
+        blobs: Dict[str, Dict[str, Any]] = {}
+        full_doc = self._apply_changes(doc, changes, blobs)
+        self.blob_store.put_many(blobs.items())
+        self.attribute_store.update_document(doc)
+        # Ranking signals and filter attributes (rating, stock, price) may have changed
+        self.index_generation += 1
+        return full_doc
+
+    def _apply_changes(
+        self,
+        doc: Dict[str, Any],
+        changes: Optional[Dict[str, Any]],
+        blobs: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        # Field changes and derived display fields; large fields are queued in `blobs`
+        # so the caller writes the whole batch to the blob store at once
+        doc_id = doc['pid']
+        stored = blobs[doc_id] if doc_id in blobs else self.blob_store.get(doc_id)
+        full_doc = {**doc, **stored, **(changes or {})}
+        full_doc.update(derive_display_fields(full_doc))
+        large_fields = {field: full_doc[field] for field in self.blob_store.fields if field in full_doc}
+        doc.update({key: value for key, value in full_doc.items() if key not in large_fields})
+        blobs[doc_id] = large_fields
+        return full_doc
+
+    def apply_updates(
+        self,
+        upserts: Iterable[Dict[str, Any]] = (),
+        deletes: Iterable[str] = (),
+    ) -> Dict[str, Any]:
+        """
+        Apply a batch of catalogue changes without rebuilding anything.
+        New products and products whose tokens changed are indexed into the mutable segment,
+        removed and replaced ones are tombstoned; TF-IDF/BM25 document frequencies and lengths,
+        the attribute columns, the display fields and the caches follow incrementally. Changes
+        that leave the tokens untouched (price, stock, rating) only refresh attributes.
+        The background merger is started on the first batch.
+        
+        :param upserts: Processed-corpus documents with a 'pid'; new ones need 'tokens'.
+                        For existing products, missing fields keep their current value
+        :param deletes: Document IDs to remove
+        :return: Counts of indexed, attribute-only and deleted documents and the batch time
+        """
+        self._check_writable()
+        start = time.perf_counter()
+        index = self.inverted_index
+        indexed = attribute_only = 0
+        removed: Dict[str, Dict[str, Any]] = {}
+        added: List[Dict[str, Any]] = []
+        updated: List[Dict[str, Any]] = []
+        # (doc_id, tokens) whose term pairs left or entered the index, for the pair index
+        pair_removals: List[Tuple[str, List[str]]] = []
+        pair_additions: List[Tuple[str, List[str]]] = []
+        # Large display fields of new and changed documents, appended to the blob store in one batch
+        blobs: Dict[str, Dict[str, Any]] = {}
+        with index.lock:
+            for doc_id in deletes:
+                doc = self.doc_lookup.pop(doc_id, None)
+                if doc is None:
+                    continue
+                self._unindex_document(doc)
+                pair_removals.append((doc_id, list(doc.get('tokens') or ())))
+                removed[doc_id] = doc
+            for changes in upserts:
+                doc_id = changes.get('pid')
+                if not doc_id:
+                    raise ValueError("Catalogue updates need a 'pid'")
+                doc = self.doc_lookup.get(doc_id)
+                if doc is None:
+                    if changes.get('tokens') is None:
+                        raise ValueError(f"New document {doc_id} has no 'tokens'")
+                    doc = enrich_document(dict(changes))
+                    blobs[doc_id] = {field: doc.pop(field) for field in self.blob_store.fields if field in doc}
+                    self.doc_lookup[doc_id] = doc
+                    self._index_document(doc)
+                    added.append(doc)
+                elif changes.get('tokens') is not None and list(changes['tokens']) != list(doc.get('tokens') or ()):
+                    pair_removals.append((doc_id, list(doc.get('tokens') or ())))
+                    self._unindex_document(doc)
+                    self._apply_changes(doc, changes, blobs)
+                    self._index_document(doc)
+                    updated.append(doc)
+                else:
+                    self._apply_changes(doc, changes, blobs)
+                    updated.append(doc)
+                    attribute_only += 1
+                    continue
+                pair_additions.append((doc_id, list(changes['tokens'])))
+                indexed += 1
+            self.blob_store.put_many(blobs.items())
+            if removed:
+                self.corpus_data[:] = [doc for doc in self.corpus_data if removed.get(doc.get('pid')) is not doc]
+                self.attribute_store.remove_documents(removed)
+            self.corpus_data.extend(added)
+            self.attribute_store.add_documents(added)
+            self.attribute_store.update_documents(updated)
+            if self.pair_index is not None:
+                self.pair_index.apply_changes(pair_removals, pair_additions)
+            self.documents_changed += indexed + len(removed)
+            self.index_generation += 1
+        if index.on_merge is None:
+            index.on_merge = self._on_segments_merged
+            index.start_merger(interval=float(os.getenv("INDEX_MERGE_INTERVAL", "1.0")))
+        return {
+            "indexed": indexed,
+            "attribute_only": attribute_only,
+            "deleted": len(removed),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def _check_writable(self) -> None:
+        if self.shared_index is not None:
+            # Every worker process maps the same file; a change applied in one would not reach the others
+            raise ValueError("The index is shared read-only between worker processes; rebuild it to apply changes")
+
+    def _index_document(self, doc: Dict[str, Any]) -> None:
+        self.inverted_index.add_document(doc['pid'], list(doc.get('tokens') or ()))
+        # CustomRanker only updates its own caches: the TF-IDF ranker it shares is updated once here
+        for ranker in self._ranker_cache.values():
+            ranker.add_document(doc)
+
+    def _unindex_document(self, doc: Dict[str, Any]) -> None:
+        self.inverted_index.delete_document(doc['pid'], doc.get('tokens') or ())
+        for ranker in self._ranker_cache.values():
+            ranker.remove_document(doc)
+
+    def _on_segments_merged(self, report: Dict[str, Any]) -> None:
+        """
+        Called by the merger thread after each merge. Once TFIDF_REFRESH_RATIO of the documents were
+        (re)indexed or deleted since the last refresh, TF-IDF lengths are recomputed with the current idf
+        (writers wait, queries do not).
+        """
+        refresh_ratio = float(os.getenv("TFIDF_REFRESH_RATIO", "0.05"))
+        if self.documents_changed < refresh_ratio * max(self.inverted_index.total_documents, 1):
+            return
+        with self.inverted_index.lock:
+            start = time.perf_counter()
+            self.tfidf_ranker.refresh_document_lengths()
+            report["length_refresh_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self.documents_changed = 0
+            self.index_generation += 1
+
+    def get_segment_stats(self) -> Dict[str, Any]:
+        """Segments, tombstones, buffered documents and merge counters of the incremental index."""
+        return self.inverted_index.stats()
+
+    def get_collection_statistics(self) -> Dict[str, Any]:
+        """
+        Statistics of this index alone, which a sharding broker sums over the shards:
+        N (as the rankers count it), the token count of the indexed documents and every term's df.
+        """
+        document_frequencies: Dict[str, int] = {}
+        total_length = 0
+        posting_frequency = self.inverted_index.posting_frequency
+        for term, postings in self.inverted_index.term_to_docs.items():
+            document_frequencies[term] = len(postings)
+            total_length += sum(map(posting_frequency, postings))
+        return {
+            "documents": len(self.corpus_data),
+            "total_document_length": total_length,
+            "document_frequencies": document_frequencies,
+            "generation": self.index_generation,
+        }
+
+    def set_collection_statistics(
+        self,
+        documents: int,
+        total_document_length: int,
+        document_frequencies: Dict[str, int],
+    ) -> None:
+        """
+        Score with collection-wide statistics instead of this index's own, so that the scores of
+        document-partitioned shards are comparable: TF-IDF and BM25 read N and df from them, TF-IDF
+        lengths are recomputed with the global idf and BM25 uses the global average length.
+        Word2Vec needs no collection statistics; the custom ranker gets them through its TF-IDF part.
+
+        :param documents: Documents in the whole collection
+        :param total_document_length: Tokens of all indexed documents in the collection
+        :param document_frequencies: Collection df of every term
+        """
+        with self.inverted_index.lock:
+            self.collection_statistics = {
+                "documents": documents,
+                "total_document_length": total_document_length,
+                "document_frequencies": document_frequencies,
+            }
+            for ranker in {id(ranker): ranker for ranker in self._ranker_cache.values()}.values():
+                self._apply_collection_statistics(ranker)
+            self.index_generation += 1
+
+    def _apply_collection_statistics(self, ranker) -> None:
+        statistics = self.collection_statistics
+        if statistics is None:
+            return
+        # Copies: catalogue updates keep adjusting the ranker's df with this shard's changes
+        if isinstance(ranker, TFIDFRanker):
+            ranker.total_documents = statistics["documents"]
+            ranker.document_frequencies = dict(statistics["document_frequencies"])
+            ranker.refresh_document_lengths()
+        elif isinstance(ranker, BM25Ranker):
+            ranker.total_documents = statistics["documents"]
+            ranker.document_frequencies = dict(statistics["document_frequencies"])
+            ranker.total_document_length = statistics["total_document_length"]
+            ranker.avg_document_length = (
+                ranker.total_document_length / ranker.total_documents if ranker.total_documents else 0.0
+            )
+
+    def share_index(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Move the inverted index, the TF-IDF and BM25 statistics, the Word2Vec document vectors
+        and the pair intersections into a read-only memory-mapped file (see shared_index) before worker processes are forked:
+        all workers then read the same physical pages. Every enabled ranker is built first, since a
+        ranker built lazily in a worker would be private to it. TF-IDF and BM25 switch to array
+        rankers with identical scores; catalogue updates are refused afterwards.
+
+        :param path: Index file (default: SHARED_INDEX_PATH or "<corpus root>.shared" next to the corpus)
+        :return: Size of the written file and the time it took
+        """
+        start = time.perf_counter()
+        # Builds still running in the background would not exist in the forked workers
+        self.wait_for_rankers()
+        for method in self.enabled_methods:
+            try:
+                self._get_ranker(method)
+            except (ImportError, RuntimeError) as e:
+                print(f"Ranking method {method} is unavailable: {e}")
+        path = path or os.getenv("SHARED_INDEX_PATH") or os.path.splitext(self.corpus_data_path)[0] + ".shared"
+        # Merges take the index lock, so the merger is stopped before it is held
+        self.inverted_index.stop_merger()
+        with self.inverted_index.lock:
+            report = write_shared_index(
+                path,
+                self.inverted_index,
+                [doc['pid'] for doc in self.corpus_data if doc.get('pid')],
+                self.tfidf_ranker,
+                bm25_ranker=self._ranker_cache.get("bm25"),
+                word2vec_ranker=self._ranker_cache.get("word2vec"),
+                pair_index=self.pair_index,
+            )
+            shared = SharedIndex(path)
+            tfidf_ranker = SharedTFIDFRanker(shared)
+            rankers: Dict[str, Any] = {"tfidf": tfidf_ranker}
+            if "bm25" in self._ranker_cache:
+                rankers["bm25"] = SharedBM25Ranker(shared)
+            word2vec_ranker = self._ranker_cache.get("word2vec")
+            if word2vec_ranker is not None:
+                word2vec_ranker.index = shared
+                if shared.doc_vectors is not None:
+                    word2vec_ranker.doc_vectors = shared.doc_vectors
+                rankers["word2vec"] = word2vec_ranker
+            custom_ranker = self._ranker_cache.get("custom")
+            if custom_ranker is not None:
+                custom_ranker.index = shared
+                custom_ranker.tfidf_ranker = tfidf_ranker
+                rankers["custom"] = custom_ranker
+            self.inverted_index = shared
+            if self.pair_index is not None:
+                self.pair_index = SharedPairIndex(shared)
+            self.tfidf_ranker = tfidf_ranker
+            self._ranker_cache = rankers
+            self.shared_index = shared
+        # The dict index and statistics are garbage now; scores did not change, so cached results stay valid
+        gc.collect()
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        print(
+            f"Shared index written to {path}: {report['terms']} terms, {report['postings']} postings, "
+            f"{report['bytes'] / 1e6:.1f} MB in {report['elapsed_ms']:.0f} ms"
+        )
+        return report
 
     def get_available_methods(self) -> List[Dict[str, str]]:
-        return [{"id": method, "label": label} for method, label in self.AVAILABLE_RANKING_METHODS]
+        return [
+            {"id": method, "label": label}
+            for method, label in self.AVAILABLE_RANKING_METHODS
+            if method in self.enabled_methods
+        ]
+
+    def get_sort_options(self) -> List[Dict[str, str]]:
+        return [{"id": sort_id, "label": label} for sort_id, label in self.SORT_OPTIONS]
 
     def get_method_label(self, method: Optional[str]) -> str:
-        if not method:
+        if not method or method.lower() not in self.enabled_methods:
             method = self.DEFAULT_RANKING_METHOD
-        return self._METHOD_LABEL_MAP.get(method.lower(), self._METHOD_LABEL_MAP[self.DEFAULT_RANKING_METHOD])
+        return self._METHOD_LABEL_MAP[method.lower()]
+
+    def prebuild_rankers(self, wait: bool = False) -> List[str]:
+        """
+        Build the ranker of every enabled method in a background thread (one per method), so that no
+        request pays for a build: the first Word2Vec query would otherwise wait for the model download.
+        Until its ranker is ready a method ranks with the default one (see execute).
+
+        :param wait: Block until every build finished
+        :return: Methods whose build was started
+        """
+        started = []
+        for method in self.enabled_methods:
+            if self._ranker_states[method]["state"] != "lazy":
+                continue
+            self._ranker_states[method] = {"state": "pending"}
+            thread = threading.Thread(
+                target=self._prebuild_ranker, args=(method,), name=f"ranker-prebuild-{method}", daemon=True
+            )
+            self._prebuild_threads.append(thread)
+            thread.start()
+            started.append(method)
+        if wait:
+            self.wait_for_rankers()
+        return started
+
+    def _prebuild_ranker(self, method: str) -> None:
+        try:
+            self._get_ranker(method)
+        except Exception as e:
+            print(f"Ranking method {method} is unavailable, its queries rank with {self.DEFAULT_RANKING_METHOD}: {e}")
+            return
+        print(f"Ranker {method} built in {self._ranker_states[method]['build_ms']:.0f} ms")
+
+    def wait_for_rankers(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the background ranker builds started by prebuild_rankers.
+
+        :param timeout: Seconds to wait for each build (None: until it finished)
+        :return: True if no build is still running
+        """
+        for thread in self._prebuild_threads:
+            thread.join(timeout)
+        return not any(thread.is_alive() for thread in self._prebuild_threads)
+
+    def get_ranker_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Build state of every enabled ranker: "lazy" (built by the first query using it), "pending"
+        (waiting for its background build), "building", "ready" or "failed" (with the error).
+        """
+        status = {}
+        for method in self.enabled_methods:
+            entry = dict(self._ranker_states[method])
+            started_at = entry.pop("started_at", None)
+            if started_at is not None:
+                entry["elapsed_s"] = round(time.time() - started_at, 1)
+            status[method] = entry
+        return status
+
+    def _ranker_fallback(self, method: str) -> Optional[Dict[str, Any]]:
+        """
+        None if `method` can rank now, building its ranker first when nothing built it yet;
+        otherwise the default method used instead and the state of the requested one.
+        """
+        if method in self._ranker_cache:
+            return None
+        if self._ranker_states[method]["state"] == "lazy":
+            try:
+                self._get_ranker(method)
+                return None
+            except Exception as e:
+                print(f"Ranking method {method} is unavailable: {e}")
+        status = self.get_ranker_status()[method]
+        if status["state"] == "ready":
+            # Built by another thread since the first check
+            return None
+        return dict(status, requested=method, used=self.DEFAULT_RANKING_METHOD)
 
     def _get_ranker(self, method: str):
+        """
+        Ranker of an enabled method, built on first use. A build runs once however many threads
+        ask for it: they wait on the method's lock and get the built ranker. A failed build is not
+        retried (RuntimeError); the next index generation tries again.
+        """
+        ranker = self._ranker_cache.get(method)
+        if ranker is not None:
+            return ranker
+        lock = self._ranker_locks.get(method)
+        if lock is None:
+            # fall back to default tfidf
+            return self.tfidf_ranker
+        with lock:
+            if method in self._ranker_cache:
+                return self._ranker_cache[method]
+            status = self._ranker_states[method]
+            if status["state"] == "failed":
+                raise RuntimeError(f"Ranking method {method} failed to build: {status['error']}")
+            start = time.perf_counter()
+            self._ranker_states[method] = {"state": "building", "started_at": time.time()}
+            try:
+                # The Word2Vec model (possibly a download) is loaded before the index lock is taken
+                word_vectors = None
+                if method == "word2vec":
+                    word_vectors = Word2VecRanker.load_word2vec_model(
+                        self.word2vec_model_name, self.word2vec_model_path
+                    )
+                # Built under the index write lock so no catalogue update is half-applied to the new ranker
+                with self.inverted_index.lock:
+                    ranker = self._build_ranker(method, word_vectors)
+            except Exception as e:
+                self._ranker_states[method] = {"state": "failed", "error": f"{type(e).__name__}: {e}"}
+                raise
+            self._ranker_states[method] = {"state": "ready", "build_ms": round((time.perf_counter() - start) * 1000, 1)}
+            return ranker
+
+    def _build_ranker(self, method: str, word_vectors=None):
         if method in self._ranker_cache:
             return self._ranker_cache[method]
 
@@ -139,6 +1219,7 @@ class SearchAlgorithm:
                 text_field="tokens",
                 model_name=self.word2vec_model_name,
                 model_path=self.word2vec_model_path,
+                word_vectors=word_vectors,
             )
         elif method == "custom":
             self._ranker_cache[method] = CustomRanker(
@@ -150,4 +1231,5 @@ class SearchAlgorithm:
             # fall back to default tfidf
             return self.tfidf_ranker
 
+        self._apply_collection_statistics(self._ranker_cache[method])
         return self._ranker_cache[method]
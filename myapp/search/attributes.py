@@ -0,0 +1,467 @@
+"""
+Columnar attribute store for the processed corpus.
+Every document gets a dense ordinal; categorical attributes (brand, category,
+sub_category, seller, stock) are kept as integer codes plus one packed bitset per
+value, and numeric attributes (price, discount, rating) as float columns with a
+sorted-array range index. Filters are evaluated as bitset operations before scoring.
+"""
+
+import math
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+
+CATEGORICAL_FIELDS = ("brand", "category", "sub_category", "seller")
+# public name -> corpus field
+NUMERIC_FIELDS = {"price": "selling_price", "discount": "discount", "rating": "average_rating"}
+# Facets computed for the results page, most important first (later ones may be cut by the budget)
+FACET_FIELDS = ("brand", "category", "price", "seller", "sub_category")
+DEFAULT_PRICE_BUCKETS = (0, 500, 1000, 2000, 5000)
+
+
+def normalize_value(value: Any) -> str:
+    """Case/whitespace-insensitive form used for categorical matching."""
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).lower()
+
+
+def to_float(value: Any) -> float:
+    """Parse prices/ratings/discounts stored as numbers or strings; NaN when missing."""
+    if value is None or isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace(",", "").replace("%", "").strip()
+    text = text.split()[0] if text else ""
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """
+    Attribute filters for a search. Unset fields do not filter.
+    Categorical values are matched case-insensitively; ranges are inclusive.
+    """
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    sub_category: Optional[str] = None
+    seller: Optional[str] = None
+    in_stock: bool = False
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_discount: Optional[float] = None
+    max_discount: Optional[float] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+
+    def is_empty(self) -> bool:
+        return not any(value not in (None, False, "") for value in asdict(self).values())
+
+    def cache_key(self) -> Tuple:
+        return tuple(sorted((key, value) for key, value in asdict(self).items() if value not in (None, False, "")))
+
+    def to_form(self) -> Dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if value not in (None, False, "")}
+
+    @classmethod
+    def from_form(cls, form: Mapping[str, Any]) -> "SearchFilters":
+        """
+        Build filters from request form/query values (e.g. brand=puma, max_price=1000, in_stock=on).
+        Invalid numbers are ignored.
+        """
+        def text(name: str) -> Optional[str]:
+            value = form.get(name)
+            return value.strip() if isinstance(value, str) and value.strip() else None
+
+        def number(name: str) -> Optional[float]:
+            value = to_float(form.get(name))
+            return None if math.isnan(value) else value
+
+        in_stock = form.get("in_stock")
+        return cls(
+            brand=text("brand"),
+            category=text("category"),
+            sub_category=text("sub_category"),
+            seller=text("seller"),
+            in_stock=in_stock in (True, "1", "on", "true", "yes"),
+            min_price=number("min_price"),
+            max_price=number("max_price"),
+            min_discount=number("min_discount"),
+            max_discount=number("max_discount"),
+            min_rating=number("min_rating"),
+            max_rating=number("max_rating"),
+        )
+
+
+class AttributeStore:
+    """
+    Structure:
+    - doc_ids[ordinal] = pid, ordinals[pid] = ordinal
+    - codes[field] = int32 array of value codes per ordinal (0 = missing)
+    - values[field][code] = normalized value, value_codes[field][value] = code
+    - labels[field][code] = value as first seen in the corpus, for display
+    - bitmaps[field][code] = packed bitset (np.packbits) of ordinals having that value
+    - columns[name] = float64 column (NaN = missing) for price/discount/rating
+    - live = bool array, False for removed documents (their ordinals are not reused)
+    """
+
+    def __init__(self, corpus_data: Iterable[Dict[str, Any]]):
+        docs = [doc for doc in corpus_data if doc.get("pid")]
+        self.doc_ids: List[str] = [doc["pid"] for doc in docs]
+        self.ordinals: Dict[str, int] = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        self.size = len(self.doc_ids)
+
+        self.values: Dict[str, List[str]] = {}
+        self.labels: Dict[str, List[str]] = {}
+        self.value_codes: Dict[str, Dict[str, int]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.bitmaps: Dict[str, List[np.ndarray]] = {}
+        for field in CATEGORICAL_FIELDS:
+            source = "display_brand" if field == "brand" else field
+            self._build_categorical(field, [doc.get(source) or doc.get(field) for doc in docs])
+
+        in_stock = np.array([not bool(doc.get("out_of_stock")) for doc in docs], dtype=bool)
+        self.in_stock_bitmap = np.packbits(in_stock)
+        # Removed documents keep their ordinal with live[ordinal] = False
+        self.live = np.ones(self.size, dtype=bool)
+
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, field in NUMERIC_FIELDS.items():
+            self.columns[name] = np.array([to_float(doc.get(field)) for doc in docs], dtype=np.float64)
+
+    def _build_categorical(self, field: str, raw_values: List[Any]) -> None:
+        values = [""]
+        labels = [""]
+        value_codes = {"": 0}
+        codes = np.zeros(self.size, dtype=np.int32)
+        for ordinal, raw_value in enumerate(raw_values):
+            value = normalize_value(raw_value)
+            code = value_codes.get(value)
+            if code is None:
+                code = len(values)
+                value_codes[value] = code
+                values.append(value)
+                labels.append(" ".join(str(raw_value).split()))
+            codes[ordinal] = code
+        self.values[field] = values
+        self.labels[field] = labels
+        self.value_codes[field] = value_codes
+        self.codes[field] = codes
+        self.bitmaps[field] = [np.packbits(codes == code) for code in range(len(values))]
+
+    @staticmethod
+    def _set_bit(bitmap: np.ndarray, ordinal: int, value: bool) -> None:
+        # np.packbits is big-endian within each byte
+        mask = np.uint8(1 << (7 - (ordinal & 7)))
+        if value:
+            bitmap[ordinal >> 3] |= mask
+        else:
+            bitmap[ordinal >> 3] &= ~mask
+
+    def update_document(self, doc: Dict[str, Any]) -> None:
+        """
+        Refresh the attributes of an already indexed document after its fields changed.
+        Unknown documents are ignored (see add_documents).
+        """
+        self.update_documents([doc])
+
+    def update_documents(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """Batch form of update_document."""
+        for doc in docs:
+            ordinal = self.ordinals.get(doc.get("pid"))
+            if ordinal is not None:
+                self._set_attributes(ordinal, doc)
+
+    def add_documents(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """
+        Append new documents at the next ordinals: columns, codes and bitsets grow once per batch.
+        """
+        docs = [doc for doc in docs if doc.get("pid")]
+        if not docs:
+            return
+        start = self.size
+        size = start + len(docs)
+        padding = (size + 7) // 8 - len(self.in_stock_bitmap)
+
+        def grown(bitmap: np.ndarray) -> np.ndarray:
+            return np.concatenate([bitmap, np.zeros(padding, dtype=np.uint8)]) if padding else bitmap.copy()
+
+        # New arrays are complete before `size` and `ordinals` expose the new documents to readers
+        for field in CATEGORICAL_FIELDS:
+            self.codes[field] = np.concatenate([self.codes[field], np.zeros(len(docs), dtype=np.int32)])
+            self.bitmaps[field] = [grown(bitmap) for bitmap in self.bitmaps[field]]
+        self.in_stock_bitmap = grown(self.in_stock_bitmap)
+        self.live = np.concatenate([self.live, np.ones(len(docs), dtype=bool)])
+        for name in NUMERIC_FIELDS:
+            self.columns[name] = np.concatenate([self.columns[name], np.full(len(docs), np.nan)])
+        self.doc_ids.extend(doc["pid"] for doc in docs)
+        self.size = size
+        for ordinal, doc in enumerate(docs, start):
+            self._set_attributes(ordinal, doc)
+        for ordinal, doc in enumerate(docs, start):
+            self.ordinals[doc["pid"]] = ordinal
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        Tombstone documents: their ordinals stay allocated but no filter, mask or facet matches them again.
+
+        :return: Number of documents removed
+        """
+        removed = 0
+        for doc_id in doc_ids:
+            ordinal = self.ordinals.pop(doc_id, None)
+            if ordinal is None:
+                continue
+            self.live[ordinal] = False
+            for field in CATEGORICAL_FIELDS:
+                self._set_bit(self.bitmaps[field][self.codes[field][ordinal]], ordinal, False)
+            self._set_bit(self.in_stock_bitmap, ordinal, False)
+            removed += 1
+        return removed
+
+    def _set_attributes(self, ordinal: int, doc: Dict[str, Any]) -> None:
+        """Write the attributes of `doc` at `ordinal`."""
+        for field in CATEGORICAL_FIELDS:
+            source = "display_brand" if field == "brand" else field
+            raw_value = doc.get(source) or doc.get(field)
+            value = normalize_value(raw_value)
+            code = self.value_codes[field].get(value)
+            if code is None:
+                code = len(self.values[field])
+                self.value_codes[field][value] = code
+                self.values[field].append(value)
+                self.labels[field].append(" ".join(str(raw_value).split()))
+                self.bitmaps[field].append(self._empty_bitmap())
+            old_code = int(self.codes[field][ordinal])
+            if old_code != code:
+                self._set_bit(self.bitmaps[field][old_code], ordinal, False)
+                self._set_bit(self.bitmaps[field][code], ordinal, True)
+                self.codes[field][ordinal] = code
+        self._set_bit(self.in_stock_bitmap, ordinal, not bool(doc.get("out_of_stock")))
+        for name, field in NUMERIC_FIELDS.items():
+            self.columns[name][ordinal] = to_float(doc.get(field))
+
+    def _empty_bitmap(self) -> np.ndarray:
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def value_bitmap(self, field: str, value: str) -> np.ndarray:
+        code = self.value_codes[field].get(normalize_value(value))
+        if code is None or code == 0:
+            return self._empty_bitmap()
+        return self.bitmaps[field][code]
+
+    @staticmethod
+    def bits_at(bitmap: np.ndarray, ordinals: np.ndarray) -> np.ndarray:
+        """Boolean array: the bit of each ordinal, read from the packed bitset without unpacking it."""
+        # np.packbits is big-endian within each byte
+        return (bitmap[ordinals >> 3] & (0x80 >> (ordinals & 7))).astype(bool)
+
+    def range_matches(self, name: str, ordinals: np.ndarray, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """Boolean array: whether the `name` value of each ordinal lies in [low, high] (missing never matches)."""
+        values = self.columns[name][ordinals]
+        matches = ~np.isnan(values)
+        with np.errstate(invalid="ignore"):
+            if low is not None:
+                matches &= values >= low
+            if high is not None:
+                matches &= values <= high
+        return matches
+
+    def filter_matches(self, filters: SearchFilters, ordinals: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Boolean array: whether each ordinal satisfies `filters`, or None when no filter is set.
+        Only the bits and column values of `ordinals` are read, so the cost follows the
+        candidate set rather than the corpus size.
+        """
+        matches: Optional[np.ndarray] = None
+
+        def narrow(selected: np.ndarray) -> None:
+            nonlocal matches
+            matches = selected if matches is None else matches & selected
+
+        for field in CATEGORICAL_FIELDS:
+            value = getattr(filters, field)
+            if value:
+                narrow(self.bits_at(self.value_bitmap(field, value), ordinals))
+        if filters.in_stock:
+            narrow(self.bits_at(self.in_stock_bitmap, ordinals))
+        for name in NUMERIC_FIELDS:
+            low = getattr(filters, f"min_{name}")
+            high = getattr(filters, f"max_{name}")
+            if low is not None or high is not None:
+                narrow(self.range_matches(name, ordinals, low, high))
+        return matches
+
+    def predicate_mask(self, field: str, op: str, value: Any) -> np.ndarray:
+        """
+        Boolean mask over all ordinals of one attribute predicate, evaluated on the whole column.
+        Missing values never match a positive predicate.
+
+        :param field: Categorical field, numeric column name or "stock"
+        :param op: "in" (value = tuple of categorical values), "stock" (value = in stock?),
+                   "range" (value = (low, high), inclusive) or a comparison "<", "<=", ">", ">=", "="
+        :param value: Predicate operand
+        """
+        if op == "in":
+            wanted = [self.value_codes[field].get(normalize_value(item)) for item in value]
+            wanted = [code for code in wanted if code]
+            return np.isin(self.codes[field], wanted) if wanted else np.zeros(self.size, dtype=bool)
+        if op == "stock":
+            in_stock = np.unpackbits(self.in_stock_bitmap, count=self.size).astype(bool)
+            return in_stock if value else ~in_stock
+        column = self.columns[field]
+        with np.errstate(invalid="ignore"):
+            if op == "range":
+                low, high = value
+                mask = ~np.isnan(column)
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+                return mask
+            comparisons = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal, "=": np.equal}
+            return comparisons[op](column, value)
+
+    def mask_doc_ids(self, mask: np.ndarray) -> Set[str]:
+        doc_ids = self.doc_ids
+        return {doc_ids[ordinal] for ordinal in np.flatnonzero(mask & self.live).tolist()}
+
+    def apply_mask(self, candidate_docs: Set[str], mask: Optional[np.ndarray]) -> Set[str]:
+        """Keep only the candidates whose ordinal is set in a boolean mask (None keeps every candidate)."""
+        if mask is None or not candidate_docs:
+            return candidate_docs
+        ordinals = self.candidate_ordinals(candidate_docs)
+        kept = ordinals[mask[ordinals]]
+        doc_ids = self.doc_ids
+        return {doc_ids[ordinal] for ordinal in kept.tolist()}
+
+    def candidate_ordinals(self, candidate_docs: Iterable[str]) -> np.ndarray:
+        ordinals = self.ordinals
+        return np.fromiter(
+            (ordinals[doc_id] for doc_id in candidate_docs if doc_id in ordinals),
+            dtype=np.int64,
+        )
+
+    def apply_filters(self, candidate_docs: Set[str], filters: Optional[SearchFilters]) -> Set[str]:
+        """
+        Keep only the candidates that satisfy `filters`.
+
+        :param candidate_docs: Conjunctive candidate doc ids
+        :param filters: Attribute filters (None or empty keeps every candidate)
+        :return: Filtered candidate doc ids
+        """
+        if filters is None or not candidate_docs:
+            return candidate_docs
+        ordinals = self.candidate_ordinals(candidate_docs)
+        matches = self.filter_matches(filters, ordinals)
+        if matches is None:
+            return candidate_docs
+        doc_ids = self.doc_ids
+        return {doc_ids[ordinal] for ordinal in ordinals[matches].tolist()}
+
+    def sort_keys(self, name: str, ordinals: np.ndarray, descending: bool = False) -> np.ndarray:
+        """
+        Ascending sort keys of a numeric column (negated for descending orders).
+        Missing values get +inf so they sort last in both directions.
+        """
+        keys = self.columns[name][ordinals]
+        if descending:
+            keys = -keys
+        return np.where(np.isnan(keys), np.inf, keys)
+
+    @staticmethod
+    def top_k_by_key(ordinals: np.ndarray, keys: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Select the k smallest keys with np.argpartition (no full sort).
+        Every ordinal tied with the k-th key is kept as well so the caller can break ties by relevance.
+
+        :param ordinals: Candidate ordinals
+        :param keys: Their sort keys (see sort_keys)
+        :param k: Number of results needed
+        :return: (selected ordinals, their keys), unordered
+        """
+        if 0 < k < len(keys):
+            kth_key = keys[np.argpartition(keys, k - 1)[k - 1]]
+            selected = keys <= kth_key
+            return ordinals[selected], keys[selected]
+        return ordinals, keys
+
+    def facet_counts(
+        self,
+        candidate_docs: Iterable[str],
+        fields: Iterable[str] = FACET_FIELDS,
+        limit: int = 10,
+        price_buckets: Iterable[float] = DEFAULT_PRICE_BUCKETS,
+        budget_ms: Optional[float] = None,
+        sample_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Count attribute values over a candidate set with np.bincount on the value codes.
+
+        :param candidate_docs: Candidate doc ids (the whole filtered result set, not just the page)
+        :param fields: Facets to compute in priority order ('price' is a histogram)
+        :param limit: Number of values kept per categorical facet (highest counts)
+        :param price_buckets: Lower bucket edges of the price histogram
+        :param budget_ms: Once exceeded, the remaining facets are skipped (the first one is always computed)
+        :param sample_size: Count over a uniform sample of this size when the set is larger; counts are scaled up
+        :return: {"total", "sampled", "counted", "facets": {field: [...]}, "skipped", "elapsed_ms"}
+        """
+        start = time.perf_counter()
+        ordinals = self.candidate_ordinals(candidate_docs)
+        total = len(ordinals)
+        scale = 1.0
+        if sample_size and total > sample_size:
+            ordinals = np.random.default_rng(total).choice(ordinals, size=sample_size, replace=False)
+            scale = total / sample_size
+
+        facets: Dict[str, List[Dict[str, Any]]] = {}
+        skipped: List[str] = []
+        for field in fields:
+            if budget_ms is not None and facets and (time.perf_counter() - start) * 1000 > budget_ms:
+                skipped.append(field)
+            elif field == "price":
+                facets[field] = self._histogram("price", ordinals, price_buckets, scale)
+            else:
+                facets[field] = self._value_counts(field, ordinals, limit, scale)
+        return {
+            "total": total,
+            "sampled": scale != 1.0,
+            "counted": len(ordinals),
+            "facets": facets,
+            "skipped": skipped,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def _value_counts(self, field: str, ordinals: np.ndarray, limit: int, scale: float) -> List[Dict[str, Any]]:
+        counts = np.bincount(self.codes[field][ordinals], minlength=len(self.values[field]))
+        counts[0] = 0  # missing value
+        codes = np.flatnonzero(counts)
+        if len(codes) > limit:
+            codes = codes[np.argpartition(-counts[codes], limit - 1)[:limit]]
+        labels = self.labels[field]
+        top = sorted(codes.tolist(), key=lambda code: (-counts[code], labels[code]))
+        return [{"value": labels[code], "count": int(round(counts[code] * scale))} for code in top]
+
+    def _histogram(self, name: str, ordinals: np.ndarray, lower_edges: Iterable[float], scale: float) -> List[Dict[str, Any]]:
+        edges = np.asarray(sorted(lower_edges), dtype=np.float64)
+        values = self.columns[name][ordinals]
+        values = values[~np.isnan(values)]
+        buckets = np.searchsorted(edges, values, side="right") - 1
+        counts = np.bincount(buckets[buckets >= 0], minlength=len(edges))
+        histogram = []
+        for i, low in enumerate(edges.tolist()):
+            high = edges[i + 1].item() if i + 1 < len(edges) else None
+            histogram.append({
+                "label": f"{low:g}+" if high is None else f"{low:g}-{high:g}",
+                "min": low,
+                "max": high,
+                "count": int(round(counts[i] * scale)),
+            })
+        return histogram
@@ -0,0 +1,564 @@
+"""
+Offline benchmarks for the search stack.
+Queries are replayed from a query log (one query per line, or the JSONL log written
+by AnalyticsData) against a SearchAlgorithm built from the processed corpus.
+
+Usage:
+    python -m myapp.search.benchmark replay <processed_corpus.json> <query_log>
+    python -m myapp.search.benchmark refinement <processed_corpus.json> <query_log.jsonl>
+    python -m myapp.search.benchmark pairs <processed_corpus.json>
+    python -m myapp.search.benchmark pagination <processed_corpus.json> <query_log> [page]
+    python -m myapp.search.benchmark suggest <processed_corpus.json> <query_log>
+    python -m myapp.search.benchmark updates <processed_corpus.json> <query_log> [batch_size] [rate]
+    python -m myapp.search.benchmark build <processed_corpus.json> [workers ...]
+    python -m myapp.search.benchmark serve <processed_corpus.json> <query_log> [workers ...]
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def load_query_log(path: str) -> List[str]:
+    """
+    Load queries from a log file, preserving order and repetitions.
+    JSON lines are read from their 'terms' (or 'query') key; other lines are used verbatim.
+    """
+    queries: List[str] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                line = (record.get('terms') or record.get('query') or '').strip()
+                if not line:
+                    continue
+            queries.append(line)
+    return queries
+
+
+def load_query_sessions(path: str) -> List[Tuple[Optional[str], str]]:
+    """
+    Load (session_id, query) pairs in log order from the JSONL query log.
+    """
+    entries: List[Tuple[Optional[str], str]] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            record = json.loads(line)
+            query = (record.get('terms') or '').strip()
+            if query:
+                entries.append((record.get('session_id'), query))
+    return entries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    return {
+        "queries": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(max(latencies_ms), 3) if latencies_ms else 0.0,
+    }
+
+
+def replay_query_log(
+    search_algorithm,
+    queries: List[str],
+    ranking_method: Optional[str] = None,
+    top_k: int = 20,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Replay queries in order and report latency percentiles.
+
+    :param search_algorithm: Initialized SearchAlgorithm
+    :param queries: Raw queries as typed by users
+    :param ranking_method: Ranking method to use for every query
+    :param top_k: Number of results requested per query
+    :param use_cache: Whether the query result cache is consulted
+    :return: Latency summary
+    """
+    latencies: List[float] = []
+    for query in queries:
+        start = time.perf_counter()
+        search_algorithm.search(query, top_k=top_k, ranking_method=ranking_method, use_cache=use_cache)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize_latencies(latencies)
+
+
+def compare_cache_replay(search_algorithm, queries: List[str], ranking_method: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Replay the same log without and with the query result cache and report the p50 gain.
+    """
+    search_algorithm.query_cache.clear()
+    uncached = replay_query_log(search_algorithm, queries, ranking_method, use_cache=False)
+    cached = replay_query_log(search_algorithm, queries, ranking_method, use_cache=True)
+    gain = uncached["p50_ms"] / cached["p50_ms"] if cached["p50_ms"] > 0 else float('inf')
+    return {
+        "uncached": uncached,
+        "cached": cached,
+        "p50_speedup": round(gain, 2),
+        "cache": search_algorithm.get_cache_stats(),
+    }
+
+
+def replay_refinement_chains(search_algorithm, entries: List[Tuple[Optional[str], str]]) -> Dict[str, Any]:
+    """
+    Replay a session-ordered query log with and without session candidate reuse.
+    The result cache is bypassed so only the intersection work is compared; latencies
+    are reported for the queries that were detected as refinements of the previous one.
+    """
+    cache = search_algorithm.refinement_cache
+    baseline: List[float] = []
+    reused: List[float] = []
+    for session_id, query in entries:
+        start = time.perf_counter()
+        search_algorithm.search(query, use_cache=False)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        reuses_before = cache.reuses
+        start = time.perf_counter()
+        search_algorithm.search(query, use_cache=False, session_id=session_id)
+        elapsed_with_reuse = (time.perf_counter() - start) * 1000
+        if cache.reuses > reuses_before:
+            baseline.append(elapsed)
+            reused.append(elapsed_with_reuse)
+    return {
+        "queries": len(entries),
+        "refinements": len(reused),
+        "without_reuse": summarize_latencies(baseline),
+        "with_reuse": summarize_latencies(reused),
+        "total_saved_ms": round(sum(baseline) - sum(reused), 3),
+        "refinement_cache": search_algorithm.get_refinement_stats(),
+    }
+
+
+def common_term_queries(inverted_index, count: int = 300, top_terms: int = 12, seed: int = 13) -> List[List[str]]:
+    """
+    Synthesize worst-case queries made only of the highest-df terms (2 to 4 terms each).
+    """
+    term_to_docs = inverted_index.term_to_docs
+    frequent = sorted(term_to_docs, key=lambda term: len(term_to_docs[term]), reverse=True)[:top_terms]
+    rng = random.Random(seed)
+    return [rng.sample(frequent, rng.randint(2, min(4, len(frequent)))) for _ in range(count)]
+
+
+def benchmark_pair_intersections(search_algorithm, queries: List[List[str]]) -> Dict[str, Any]:
+    """
+    Compare candidate generation for multi-common-term queries: plain conjunctive_query
+    in query order versus the planner backed by the frequent pair index.
+    """
+    baseline: List[float] = []
+    planned: List[float] = []
+    for terms in queries:
+        start = time.perf_counter()
+        expected = search_algorithm.inverted_index.conjunctive_query(terms)
+        baseline.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        candidates = search_algorithm._conjunctive_candidates(terms)
+        planned.append((time.perf_counter() - start) * 1000)
+        if candidates != expected:
+            raise AssertionError(f"Planner returned a different candidate set for {terms}")
+    return {
+        "conjunctive_query": summarize_latencies(baseline),
+        "pair_planner": summarize_latencies(planned),
+        "pair_index": search_algorithm.get_pair_index_stats(),
+    }
+
+
+def benchmark_deep_pagination(
+    search_algorithm,
+    queries: List[str],
+    page: int = 50,
+    page_size: int = 20,
+    sort_by: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Compare the latency of page 1 with page N, reached through search_after cursors and
+    through offsets. Cursors are collected by walking the pages first; the result cache is bypassed.
+    Queries with fewer than N pages are measured on their last page.
+    """
+    first_page: List[float] = []
+    cursor_page: List[float] = []
+    offset_page: List[float] = []
+    for query in dict.fromkeys(queries):
+        start = time.perf_counter()
+        response = search_algorithm.execute(query, top_k=page_size, sort_by=sort_by, use_cache=False)
+        first_page.append((time.perf_counter() - start) * 1000)
+
+        cursor, pages_before = None, 0
+        while response.next_cursor and pages_before < page - 1:
+            cursor, pages_before = response.next_cursor, pages_before + 1
+            response = search_algorithm.execute(
+                query, top_k=page_size, sort_by=sort_by, use_cache=False, search_after=cursor
+            )
+        if cursor is None:
+            continue
+        start = time.perf_counter()
+        search_algorithm.execute(query, top_k=page_size, sort_by=sort_by, use_cache=False, search_after=cursor)
+        cursor_page.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        search_algorithm.execute(query, top_k=page_size, sort_by=sort_by, use_cache=False, offset=pages_before * page_size)
+        offset_page.append((time.perf_counter() - start) * 1000)
+    return {
+        "page": page,
+        "sort_by": sort_by or "relevance",
+        "page_1": summarize_latencies(first_page),
+        "page_n_search_after": summarize_latencies(cursor_page),
+        "page_n_offset": summarize_latencies(offset_page),
+    }
+
+
+def benchmark_suggest(search_algorithm, queries: List[str], k: int = 8) -> Dict[str, Any]:
+    """
+    Build the autocomplete structure from the logged queries and the index vocabulary, then
+    time a completion request for every prefix of every query (as typed, one keystroke at a time)
+    and an incremental update for every query.
+    """
+    from myapp.search.suggest import PrefixSuggester, vocabulary_completions
+
+    start = time.perf_counter()
+    term_frequencies = vocabulary_completions(search_algorithm.inverted_index, search_algorithm.corpus_data)
+    suggester = PrefixSuggester(Counter(" ".join(query.lower().split()) for query in queries), term_frequencies)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    lookups: List[float] = []
+    for query in dict.fromkeys(queries):
+        for end in range(1, len(query) + 1):
+            start = time.perf_counter()
+            suggester.suggest(query[:end], k)
+            lookups.append((time.perf_counter() - start) * 1000)
+    updates: List[float] = []
+    for query in queries:
+        start = time.perf_counter()
+        suggester.record_query(query)
+        updates.append((time.perf_counter() - start) * 1000)
+    return {
+        "build_ms": round(build_ms, 1),
+        "structure": suggester.stats(),
+        "suggest": summarize_latencies(lookups),
+        "record_query": summarize_latencies(updates),
+    }
+
+
+def catalogue_update_batches(
+    corpus_data: List[Dict[str, Any]],
+    batches: int,
+    batch_size: int = 100,
+    seed: int = 7,
+) -> List[Tuple[List[Dict[str, Any]], List[str]]]:
+    """
+    Synthetic catalogue changes in the proportions of a product feed: per batch, 40% price/stock
+    updates, 20% new products (copies of existing ones under new pids), 20% re-tokenized products
+    and 20% deletions of previously added products (so the catalogue size stays stable).
+    """
+    rng = random.Random(seed)
+    docs = [doc for doc in corpus_data if doc.get('pid') and doc.get('tokens')]
+    added: List[str] = []
+    stream = []
+    for batch in range(batches):
+        upserts: List[Dict[str, Any]] = []
+        deletes: List[str] = []
+        for i in range(batch_size):
+            kind = i % 5
+            doc = rng.choice(docs)
+            if kind in (0, 1):
+                upserts.append({'pid': doc['pid'], 'selling_price': rng.randint(100, 5000),
+                                'out_of_stock': rng.random() < 0.1})
+            elif kind == 2:
+                pid = f"{doc['pid']}-new{batch}-{i}"
+                upserts.append({**doc, 'pid': pid, 'tokens': list(doc['tokens'])})
+                added.append(pid)
+            elif kind == 3:
+                upserts.append({'pid': doc['pid'], 'tokens': list(rng.choice(docs)['tokens'])})
+            elif added:
+                deletes.append(added.pop(rng.randrange(len(added))))
+        stream.append((upserts, deletes))
+    return stream
+
+
+def benchmark_incremental_updates(
+    search_algorithm,
+    queries: List[str],
+    batch_size: int = 100,
+    batches: int = 200,
+    rate: float = 500.0,
+) -> Dict[str, Any]:
+    """
+    Incremental catalogue updates against the segmented index, in three phases:
+    query latency without updates; update throughput with the first half of the batches applied
+    back to back; query latency while a writer thread applies the second half at `rate` documents
+    per second (sealing segments and triggering background merges).
+    """
+    queries = queries[:2000]
+    # A built BM25 ranker is maintained by every batch too, as in a server that has served BM25 queries
+    search_algorithm._get_ranker("bm25")
+    baseline = replay_query_log(search_algorithm, queries, use_cache=False)
+
+    stream = catalogue_update_batches(search_algorithm.corpus_data, batches, batch_size)
+    half = len(stream) // 2
+    batch_latencies: List[float] = []
+    start = time.perf_counter()
+    documents = 0
+    for upserts, deletes in stream[:half]:
+        batch_latencies.append(search_algorithm.apply_updates(upserts, deletes)["elapsed_ms"])
+        documents += len(upserts) + len(deletes)
+    throughput = documents / (time.perf_counter() - start)
+
+    index = search_algorithm.inverted_index
+    merges_before, merge_ms_before = index.merges, index.merge_ms_total
+    done = threading.Event()
+
+    def write() -> None:
+        next_batch = time.perf_counter()
+        for upserts, deletes in stream[half:]:
+            search_algorithm.apply_updates(upserts, deletes)
+            next_batch += (len(upserts) + len(deletes)) / rate
+            time.sleep(max(0.0, next_batch - time.perf_counter()))
+        done.set()
+
+    writer = threading.Thread(target=write, name="catalogue-writer")
+    writer.start()
+    latencies: List[float] = []
+    while not done.is_set():
+        for query in queries:
+            query_start = time.perf_counter()
+            search_algorithm.search(query, use_cache=False)
+            latencies.append((time.perf_counter() - query_start) * 1000)
+            if done.is_set():
+                break
+    writer.join()
+    index.maybe_merge()
+    segments = search_algorithm.get_segment_stats()
+    return {
+        "batch_size": batch_size,
+        "updates_per_second": round(throughput, 1),
+        "batch": summarize_latencies(batch_latencies),
+        "queries_without_updates": baseline,
+        "update_rate": rate,
+        "queries_during_updates": summarize_latencies(latencies),
+        "merges_during_queries": index.merges - merges_before,
+        "merge_ms_during_queries": round(index.merge_ms_total - merge_ms_before, 2),
+        "last_merge": segments["last_merge"],
+        "segments": segments["segments"],
+        "tombstones": segments["tombstones"],
+    }
+
+
+def benchmark_parallel_build(
+    corpus_path: str,
+    worker_counts: Tuple[int, ...] = (1, 2, 4, 8),
+    store_positions: bool = True,
+) -> Dict[str, Any]:
+    """
+    Index build plus TF-IDF precomputation: the serial path (InvertedIndex.build_from_corpus, then
+    TFIDFRanker) against build_sharded_index with each worker count. Every parallel build is checked
+    against the serial one (postings, df, tf and TF-IDF lengths).
+    """
+    from myapp.search.sharded_build import InvertedIndex, build_sharded_index
+    from tfidf_ranking import TFIDFRanker
+
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    start = time.perf_counter()
+    index = InvertedIndex(store_positions=store_positions)
+    index.build_from_corpus(corpus, text_field='tokens')
+    index_ms = (time.perf_counter() - start) * 1000
+    ranker = TFIDFRanker(index, corpus)
+    serial_ms = (time.perf_counter() - start) * 1000
+
+    runs = []
+    for workers in worker_counts:
+        build = build_sharded_index(corpus, workers, store_positions=store_positions)
+        statistics = build.tfidf_statistics
+        lengths = statistics["doc_lengths"]
+        identical = (
+            build.index.term_to_docs == index.term_to_docs
+            and statistics["document_frequencies"] == ranker.document_frequencies
+            and statistics["term_frequencies"] == ranker.term_frequencies
+            and lengths.keys() == ranker.doc_lengths.keys()
+            and all(abs(lengths[doc_id] - length) <= 1e-9 * max(1.0, length) for doc_id, length in ranker.doc_lengths.items())
+        )
+        runs.append({
+            "workers": workers,
+            **build.timings,
+            "speedup": round(serial_ms / build.timings["total_ms"], 2),
+            "identical": identical,
+        })
+    return {
+        "documents": len(corpus),
+        "cpu_count": os.cpu_count(),
+        "serial": {"index_ms": round(index_ms, 1), "total_ms": round(serial_ms, 1)},
+        "parallel": runs,
+    }
+
+
+def _http_client(port: int, queries: List[str], deadline: float, seed: int, results) -> None:
+    from urllib.parse import urlencode
+    from urllib.request import urlopen
+
+    queries = list(queries)
+    random.Random(seed).shuffle(queries)
+    latencies: List[float] = []
+    while time.time() < deadline:
+        for query in queries:
+            start = time.perf_counter()
+            with urlopen(f"http://127.0.0.1:{port}/search?{urlencode({'q': query})}", timeout=30) as response:
+                response.read()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if time.time() >= deadline:
+                break
+    results.put(latencies)
+
+
+def _measure_prefork(app, workers: int, queries: List[str], duration: float, clients: int) -> Dict[str, Any]:
+    """Serve `app` with `workers` processes, load it from `clients` processes, then read the workers' memory."""
+    import psutil
+
+    from myapp.search.prefork import PreforkServer, process_memory
+
+    context = multiprocessing.get_context("fork")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = context.Process(target=PreforkServer(app, "127.0.0.1", port, workers).serve_forever)
+    server.start()
+    try:
+        for _ in range(600):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        results = context.Queue()
+        deadline = time.time() + duration
+        client_processes = [
+            context.Process(target=_http_client, args=(port, queries, deadline, seed, results)) for seed in range(clients)
+        ]
+        start = time.perf_counter()
+        for process in client_processes:
+            process.start()
+        latencies: List[float] = []
+        for _ in client_processes:
+            latencies.extend(results.get())
+        elapsed = time.perf_counter() - start
+        for process in client_processes:
+            process.join()
+        worker_memory = [process_memory(child.pid) for child in psutil.Process(server.pid).children()]
+        parent_memory = process_memory(server.pid)
+    finally:
+        server.terminate()
+        server.join()
+    return {
+        "workers": workers,
+        "clients": clients,
+        "qps": round(len(latencies) / elapsed, 1),
+        **summarize_latencies(latencies),
+        "parent_rss_mb": round(parent_memory["rss"] / 1e6, 1),
+        "worker_rss_mb": [round(memory["rss"] / 1e6, 1) for memory in worker_memory],
+        "worker_pss_mb": [round(memory["pss"] / 1e6, 1) for memory in worker_memory],
+        "worker_uss_mb": [round(memory["uss"] / 1e6, 1) for memory in worker_memory],
+    }
+
+
+def benchmark_prefork_serving(
+    search_algorithm,
+    queries: List[str],
+    worker_counts: Tuple[int, ...] = (1, 2, 4),
+    duration: float = 10.0,
+    clients_per_worker: int = 2,
+) -> Dict[str, Any]:
+    """
+    Throughput and per-worker memory of PreforkServer serving /search?q=, for each worker count:
+    first with the dict index inherited copy-on-write, then after share_index(). Client processes
+    replay the queries over HTTP for `duration` seconds; memory is read after the load, so every
+    page the queries touched is counted. A worker's uss is what one more worker costs.
+    """
+    from flask import Flask, jsonify, request
+
+    app = Flask("benchmark")
+
+    @app.route('/search')
+    def search():
+        response = search_algorithm.execute(request.args.get('q', ''), use_cache=False)
+        return jsonify({"total": response.total, "results": [doc_id for doc_id, _ in response.results]})
+
+    # One access log line per request would cost more than some of the queries
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    report: Dict[str, Any] = {"cpu_count": os.cpu_count(), "documents": len(search_algorithm.corpus_data)}
+    for mode in ("dict", "shared"):
+        if mode == "shared":
+            report["shared_index"] = search_algorithm.share_index()
+        report[mode] = [
+            _measure_prefork(app, workers, queries, duration, clients_per_worker * workers) for workers in worker_counts
+        ]
+    return report
+
+
+def _build_search_algorithm(corpus_path: str):
+    from myapp.search.algorithms import SearchAlgorithm
+    return SearchAlgorithm(corpus_path)
+
+
+def main(argv: List[str]) -> None:
+    commands = {
+        "replay": lambda sa, args: compare_cache_replay(sa, load_query_log(args[0])),
+        "refinement": lambda sa, args: replay_refinement_chains(sa, load_query_sessions(args[0])),
+        "pairs": lambda sa, args: benchmark_pair_intersections(sa, common_term_queries(sa.inverted_index)),
+        "pagination": lambda sa, args: benchmark_deep_pagination(
+            sa, load_query_log(args[0]), page=int(args[1]) if len(args) > 1 else 50
+        ),
+        "suggest": lambda sa, args: benchmark_suggest(sa, load_query_log(args[0])),
+        "serve": lambda sa, args: benchmark_prefork_serving(
+            sa, load_query_log(args[0]), worker_counts=tuple(int(arg) for arg in args[1:]) or (1, 2, 4)
+        ),
+        "updates": lambda sa, args: benchmark_incremental_updates(
+            sa,
+            load_query_log(args[0]),
+            batch_size=int(args[1]) if len(args) > 1 else 100,
+            rate=float(args[2]) if len(args) > 2 else 500.0,
+        ),
+    }
+    # Commands that build their own structures from the corpus file
+    corpus_commands = {
+        "build": lambda path, args: benchmark_parallel_build(
+            path, worker_counts=tuple(int(arg) for arg in args) or (1, 2, 4, 8)
+        ),
+    }
+    if len(argv) < 2 or argv[0] not in {**commands, **corpus_commands}:
+        print(__doc__)
+        return
+    command, corpus_path = argv[0], argv[1]
+    if command in corpus_commands:
+        print(json.dumps(corpus_commands[command](corpus_path, argv[2:]), indent=2))
+        return
+    search_algorithm = _build_search_algorithm(corpus_path)
+    report = commands[command](search_algorithm, argv[2:])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
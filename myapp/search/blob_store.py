@@ -0,0 +1,158 @@
+"""
+On-disk storage for the bulky product fields that ranking never reads.
+Descriptions, product details, image lists and the concatenated full text are
+only needed when a result card or the detail page is rendered, so they are
+serialized once into a memory-mapped file and decoded per document on demand.
+"""
+
+import json
+import mmap
+import os
+import threading
+from array import array
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+LARGE_FIELDS = ("description", "product_details", "images", "full_text", "display_description")
+
+
+class _BlobView(NamedTuple):
+    # Offset table and the map it points into, always replaced together
+    slots: Dict[str, int]
+    offsets: array
+    lengths: array
+    data: Optional[mmap.mmap]
+
+
+class BlobStore:
+    """
+    Append-only file of JSON records with an in-memory offset table by doc id.
+
+    Structure:
+    - slots[doc_id] = i
+    - offsets[i], lengths[i] = byte range of the record for that document
+    Only the offset table lives on the Python heap; record bytes are read
+    through `mmap`, so the OS page cache decides what stays resident.
+
+    Readers take one snapshot of (table, map); writers append a whole batch,
+    map the grown file and publish a new snapshot in a single assignment.
+    Replaced maps are never closed: a reader may still be slicing one, and it
+    is unmapped once the last snapshot referencing it is dropped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fields: tuple = LARGE_FIELDS
+        self._view = _BlobView({}, array('Q'), array('I'), None)
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, path: str, corpus_data: Iterable[Dict[str, Any]],
+              fields: Iterable[str] = LARGE_FIELDS) -> "BlobStore":
+        """
+        Move `fields` out of every document dict into a new blob file.
+        The dicts are modified in place: after this call they only keep the hot fields.
+
+        :param path: Destination file (overwritten if it exists)
+        :param corpus_data: Documents to split, each one with a 'pid'
+        :param fields: Names of the fields to move off-heap
+        :return: BlobStore opened on the written file
+        """
+        store = cls(path)
+        store.fields = tuple(fields)
+        slots: Dict[str, int] = {}
+        offsets = array('Q')
+        lengths = array('I')
+        position = 0
+        with open(path, 'wb') as f:
+            for doc in corpus_data:
+                doc_id = doc.get('pid')
+                if not doc_id:
+                    continue
+                payload = {field: doc.pop(field) for field in store.fields if field in doc}
+                record = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                f.write(record)
+                slots[doc_id] = len(offsets)
+                offsets.append(position)
+                lengths.append(len(record))
+                position += len(record)
+        store._view = _BlobView(slots, offsets, lengths, store._map_file())
+        return store
+
+    def _map_file(self) -> Optional[mmap.mmap]:
+        # mmap keeps its own handle on the file, so the descriptor can be closed right away
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, doc_id: str) -> Dict[str, Any]:
+        """
+        Decode the stored large fields of a document.
+
+        :param doc_id: Document ID (pid)
+        :return: Dictionary with the stored fields, empty if the document is unknown
+        """
+        view = self._view
+        slot = view.slots.get(doc_id)
+        if slot is None or view.data is None:
+            return {}
+        start = view.offsets[slot]
+        return json.loads(view.data[start:start + view.lengths[slot]])
+
+    def put(self, doc_id: str, payload: Dict[str, Any]) -> None:
+        """
+        Append a new record for a document and point its slot at it.
+        The previous record stays in the file until the store is rebuilt.
+
+        :param doc_id: Document ID (pid)
+        :param payload: Complete set of large fields for the document
+        """
+        self.put_many([(doc_id, payload)])
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Append records for a batch of documents and publish them all at once.
+        The file is remapped once per batch, not once per document.
+
+        :param items: (doc_id, complete set of large fields) pairs
+        """
+        records = [(doc_id, json.dumps(payload, ensure_ascii=False).encode('utf-8')) for doc_id, payload in items]
+        if not records:
+            return
+        with self._write_lock:
+            view = self._view
+            with open(self.path, 'ab') as f:
+                position = f.tell()
+                for _, record in records:
+                    f.write(record)
+            slots = dict(view.slots)
+            offsets = array('Q', view.offsets)
+            lengths = array('I', view.lengths)
+            for doc_id, record in records:
+                slot = slots.get(doc_id)
+                if slot is None:
+                    slots[doc_id] = len(offsets)
+                    offsets.append(position)
+                    lengths.append(len(record))
+                else:
+                    offsets[slot] = position
+                    lengths[slot] = len(record)
+                position += len(record)
+            self._view = _BlobView(slots, offsets, lengths, self._map_file())
+
+    def size_bytes(self) -> int:
+        return sum(self._view.lengths)
+
+    def close(self) -> None:
+        # Only for shutdown: unlike a batch swap, this unmaps the current file under any reader
+        with self._write_lock:
+            view = self._view
+            self._view = _BlobView({}, array('Q'), array('I'), None)
+        if view.data is not None:
+            view.data.close()
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._view.slots
+
+    def __len__(self) -> int:
+        return len(self._view.slots)
@@ -0,0 +1,226 @@
+"""
+Caches used by SearchAlgorithm to avoid recomputing work for repeated queries.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def estimate_result_size(value: Any) -> int:
+    """
+    Approximate heap size of a cached value (ranked (doc_id, score) lists, search responses, facets).
+    Strings are shared with the index and attribute store, so only containers and numbers are counted.
+    """
+    if isinstance(value, str):
+        return 0
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_result_size(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_result_size(item) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(estimate_result_size(getattr(value, name)) for name in value.__slots__)
+    return size
+
+
+class QueryResultCache:
+    """
+    Bounded LRU cache with TTL for ranked query results.
+
+    Entries are keyed by (normalized stemmed terms, ranking method, top_k, ...) and
+    tagged with the index generation they were computed on; when the generation
+    moves forward the whole cache is dropped, and results of an older generation (a
+    slow request that started before an index update) are never stored. Capacity is
+    bounded both by entry count and by the estimated size of the cached results.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _check_generation(self, generation: int) -> bool:
+        # Caller holds the lock. False for a generation older than the cached one
+        if self.generation is not None and generation < self.generation:
+            return False
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.current_bytes = 0
+            self.generation = generation
+        return True
+
+    def _remove(self, key: Hashable) -> None:
+        # Caller holds the lock
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """
+        Return the cached value for `key` or None on a miss.
+
+        :param key: Cache key
+        :param generation: Current index generation
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key) if self._check_generation(generation) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        """
+        Store `value` for `key`, evicting least recently used entries beyond capacity.
+
+        :param key: Cache key
+        :param value: Immutable value to cache
+        :param generation: Index generation the value was computed on (dropped if older than the cache's)
+        """
+        if not self.enabled:
+            return
+        size = estimate_result_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._check_generation(generation):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class CandidateSetCache:
+    """
+    Per-session memory of the last conjunctive candidate set, used for query refinement.
+
+    When a session's new query contains every term of its previous query
+    ("jeans" -> "jeans slim"), only the added terms need to be intersected with the
+    remembered candidates. Bounded by number of sessions and by the total number of
+    remembered doc ids; large candidate sets are not remembered at all. As in
+    QueryResultCache, a newer index generation drops every entry and candidate sets
+    of an older one are not remembered.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_total_docs: int = 500_000, max_docs_per_session: int = 50_000):
+        self.max_sessions = max_sessions
+        self.max_total_docs = max_total_docs
+        self.max_docs_per_session = max_docs_per_session
+        self.total_docs = 0
+        self.reuses = 0
+        self.misses = 0
+        self.postings_skipped = 0
+        self.generation: Optional[int] = None
+        self._entries: "OrderedDict[Hashable, Tuple[frozenset, frozenset, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation: int) -> bool:
+        # Caller holds the lock. False for a generation older than the latest one seen
+        if self.generation is not None and generation < self.generation:
+            return False
+        if generation != self.generation:
+            self._entries.clear()
+            self.total_docs = 0
+            self.generation = generation
+        return True
+
+    def get(self, session_key: Hashable, generation: int) -> Optional[Tuple[frozenset, frozenset]]:
+        """
+        Return (terms, candidate doc ids) of the session's previous query, if still valid.
+        """
+        with self._lock:
+            entry = self._entries.get(session_key) if self._check_generation(generation) else None
+            if entry is None:
+                return None
+            terms, docs, _ = entry
+            self._entries.move_to_end(session_key)
+            return terms, docs
+
+    def put(self, session_key: Hashable, terms: frozenset, docs: frozenset, generation: int) -> None:
+        with self._lock:
+            if not self._check_generation(generation):
+                return
+            if session_key in self._entries:
+                self._remove(session_key)
+            if len(docs) > self.max_docs_per_session:
+                return
+            self._entries[session_key] = (terms, docs, generation)
+            self.total_docs += len(docs)
+            while len(self._entries) > self.max_sessions or self.total_docs > self.max_total_docs:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, session_key: Hashable) -> None:
+        # Caller holds the lock
+        _, docs, _ = self._entries.pop(session_key)
+        self.total_docs -= len(docs)
+
+    def record(self, reused: bool, postings_skipped: int = 0) -> None:
+        with self._lock:
+            if reused:
+                self.reuses += 1
+                self.postings_skipped += postings_skipped
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._entries),
+            "remembered_docs": self.total_docs,
+            "reuses": self.reuses,
+            "misses": self.misses,
+            "postings_skipped": self.postings_skipped,
+        }
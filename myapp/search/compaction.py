@@ -0,0 +1,139 @@
+"""
+Post-build compaction of the per-document token lists kept in the processed corpus.
+Once the inverted index exists, the token lists are only read to compute lengths
+and field sets, so they are re-encoded as compact term-id arrays over a shared
+vocabulary and the fields nobody reads are dropped.
+"""
+
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List
+
+
+class TokenVocabulary:
+    """
+    Bidirectional term <-> id mapping shared by every encoded token field.
+    Seeding it with the index vocabulary lets encoded fields reuse the index term strings.
+    """
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self.term_to_id: Dict[str, int] = {}
+        self.id_to_term: List[str] = []
+        for term in terms:
+            self.get_id(term)
+
+    def get_id(self, term: str) -> int:
+        term_id = self.term_to_id.get(term)
+        if term_id is None:
+            term_id = len(self.id_to_term)
+            self.term_to_id[term] = term_id
+            self.id_to_term.append(term)
+        return term_id
+
+    def encode(self, tokens: Iterable[str]) -> "EncodedTokens":
+        return EncodedTokens(array('I', (self.get_id(token) for token in tokens)), self.id_to_term)
+
+    def __len__(self) -> int:
+        return len(self.id_to_term)
+
+
+class EncodedTokens(Sequence):
+    """
+    Read-only token list stored as an array of term ids.
+    Supports len(), iteration, indexing and set() like the original list of strings,
+    so rankers reading `doc[field]` keep working after compaction.
+    """
+
+    __slots__ = ("_ids", "_vocabulary")
+
+    def __init__(self, ids: array, vocabulary: List[str]):
+        self._ids = ids
+        self._vocabulary = vocabulary
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._vocabulary[term_id] for term_id in self._ids[index]]
+        return self._vocabulary[self._ids[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        vocabulary = self._vocabulary
+        for term_id in self._ids:
+            yield vocabulary[term_id]
+
+    def __repr__(self) -> str:
+        return f"EncodedTokens({list(self)!r})"
+
+    def size_bytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self._ids)
+
+
+def token_list_bytes(tokens: Any, vocabulary: TokenVocabulary) -> int:
+    """
+    Heap size of a token list and of its strings, leaving out the strings the vocabulary
+    holds (they stay alive once the list is gone, so they are not reclaimed).
+    """
+    if isinstance(tokens, str):
+        return sys.getsizeof(tokens)
+    size = sys.getsizeof(tokens)
+    terms = vocabulary.id_to_term
+    for token in tokens:
+        term_id = vocabulary.term_to_id.get(token)
+        if term_id is None or terms[term_id] is not token:
+            size += sys.getsizeof(token)
+    return size
+
+
+def is_token_field(field: str) -> bool:
+    return field == "tokens" or field.endswith("_tokens")
+
+
+def compact_token_fields(
+    corpus_data: List[Dict[str, Any]],
+    vocabulary: TokenVocabulary,
+    keep_fields: Iterable[str],
+) -> Dict[str, Any]:
+    """
+    Encode the token fields listed in `keep_fields` and drop every other token field.
+    Documents are modified in place.
+
+    :param corpus_data: Processed corpus documents
+    :param vocabulary: Shared vocabulary used for encoding
+    :param keep_fields: Token fields that still have a reader (e.g. 'tokens', 'title_tokens')
+    :return: Report with counts of encoded/dropped fields and their measured sizes (sys.getsizeof):
+             dropped_bytes of the dropped lists, list_bytes -> encoded_bytes of the encoded ones
+    """
+    keep_fields = set(keep_fields)
+    encoded = 0
+    dropped = 0
+    dropped_bytes = 0
+    list_bytes = 0
+    encoded_bytes = 0
+    for doc in corpus_data:
+        for field in [name for name in doc if is_token_field(name)]:
+            tokens = doc[field]
+            if field not in keep_fields:
+                del doc[field]
+                dropped_bytes += token_list_bytes(tokens, vocabulary)
+                dropped += 1
+                continue
+            if isinstance(tokens, EncodedTokens):
+                continue
+            encoded_tokens = vocabulary.encode((tokens.split() if isinstance(tokens, str) else tokens) or [])
+            doc[field] = encoded_tokens
+            # Measured after encoding, so strings that became new vocabulary terms count as kept
+            list_bytes += token_list_bytes(tokens, vocabulary)
+            encoded_bytes += encoded_tokens.size_bytes()
+            encoded += 1
+    return {
+        "encoded_fields": encoded,
+        "dropped_fields": dropped,
+        "vocabulary_size": len(vocabulary),
+        "dropped_bytes": dropped_bytes,
+        "list_bytes": list_bytes,
+        "encoded_bytes": encoded_bytes,
+        "reclaimed_bytes": dropped_bytes + list_bytes - encoded_bytes,
+    }
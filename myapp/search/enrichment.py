@@ -0,0 +1,100 @@
+"""
+Ingestion-time enrichment of the processed corpus.
+Display values that used to be recomputed for every result (brand inferred from the
+product URL, description fallback chain, crawl date string) are derived once per
+product and stored next to the document, so query-time hydration only reads fields.
+"""
+
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+
+STOP_BRAND_TOKENS = {
+    "men", "man", "women", "woman", "boys", "boy", "girls", "girl",
+    "solid", "printed", "print", "striped", "strip", "slim", "fit", "regular", "relaxed",
+    "round", "v", "neck", "crew", "tshirt", "t-shirt", "shirt", "t", "dress", "kurta",
+    "top", "tops", "jeans", "denim", "track", "tracks", "pants", "pant", "shorts", "short",
+    "jacket", "hoodie", "sweatshirt", "sweater", "sweat", "trouser", "capri", "legging", "leggings",
+    "palazzo", "set", "combo", "pack", "cotton", "polyester", "blend", "full", "half",
+    "sleeve", "sleeves", "three", "quarter", "ankle", "length", "graphic", "logo",
+    "collar", "henley", "polo", "mock", "high", "rise", "mid", "low", "waist",
+    "sports", "sport", "running", "gym", "yoga", "casual", "formal", "ethnic", "party",
+    "wedding", "plain", "classic", "basic", "essential", "boys'", "girls'"
+}
+
+DERIVED_FIELDS = ("display_brand", "display_description", "doc_date")
+
+
+def infer_brand_from_url(url: Optional[str]) -> Optional[str]:
+    """
+    Guess the brand from the leading words of the product URL slug
+    (e.g. /ecko-unl-solid-men-round-neck-t-shirt/p/... -> "Ecko Unl").
+    """
+    if not url:
+        return None
+    path = urlparse(url).path
+    if not path:
+        return None
+    slug = next((segment for segment in path.split('/') if segment), '')
+    if not slug:
+        return None
+    tokens = [token for token in slug.split('-') if token]
+    brand_tokens: List[str] = []
+    for token in tokens:
+        token = token.strip().lower()
+        if not token or token.isdigit() or token in STOP_BRAND_TOKENS:
+            break
+        brand_tokens.append(token)
+    if not brand_tokens:
+        return None
+    brand = ' '.join(token.capitalize() for token in brand_tokens)
+    return brand if len(brand) >= 3 else None
+
+
+def _is_blank(value: Any) -> bool:
+    return not value or (isinstance(value, str) and value.strip() == '')
+
+
+def derive_display_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compute the derived display fields of a document.
+    The document must still contain its large fields (description, full_text).
+
+    :param doc: Document dictionary
+    :return: Dictionary with display_brand, display_description and doc_date
+    """
+    description = doc.get('description')
+    if _is_blank(description):
+        description = doc.get('full_text', '')
+    if _is_blank(description):
+        description = doc.get('title', '')
+
+    brand = doc.get('brand')
+    if not brand or len(brand) <= 2:
+        brand = infer_brand_from_url(doc.get('url')) or brand
+
+    crawled_at = doc.get('crawled_at')
+    doc_date = '' if crawled_at is None else str(crawled_at)
+
+    return {
+        "display_brand": brand or None,
+        "display_description": description or '',
+        "doc_date": doc_date,
+    }
+
+
+def enrich_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Store the derived display fields on the document (in place) and return it."""
+    doc.update(derive_display_fields(doc))
+    return doc
+
+
+def enrich_corpus(corpus_data: List[Dict[str, Any]]) -> int:
+    """
+    Enrichment stage of the ingestion pipeline: derive display fields for every document.
+
+    :return: Number of documents enriched
+    """
+    for doc in corpus_data:
+        enrich_document(doc)
+    return len(corpus_data)
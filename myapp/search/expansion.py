@@ -0,0 +1,226 @@
+"""
+Precomputed query expansion table built from word embeddings.
+An offline job finds the nearest embedding neighbours of every index vocabulary term with
+batched matrix products over the normalized term vectors and keeps the neighbours above a
+similarity threshold whose document frequency is in range. The table is stored as CSR arrays
+(neighbour offsets, neighbour term ids, float16 similarities) in a compressed .npz file, so
+expanding a query at search time is an array slice per term.
+
+Usage:
+    python -m myapp.search.expansion <processed_corpus.json> [output.npz]
+
+The embedding model is read from WORD2VEC_MODEL_PATH or downloaded as WORD2VEC_MODEL_NAME (gensim).
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from myapp.search.suggest import surface_forms
+
+try:
+    from gensim import downloader
+    from gensim.models import KeyedVectors
+except ImportError:
+    downloader = None
+    KeyedVectors = None
+
+
+class ExpansionTable:
+    """
+    Structure:
+    - terms[i] = vocabulary term i (only terms with at least one neighbour, plus their neighbours)
+    - neighbours[offsets[i]:offsets[i + 1]] = ids of the neighbours of term i, most similar first
+    - weights[offsets[i]:offsets[i + 1]] = cosine similarities of those neighbours
+    """
+
+    def __init__(self, terms: Sequence[str], offsets: np.ndarray, neighbours: np.ndarray, weights: np.ndarray):
+        self.terms = list(terms)
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.weights = weights
+        self.term_ids: Dict[str, int] = {term: i for i, term in enumerate(self.terms)}
+
+    @classmethod
+    def from_lists(cls, expansions: Mapping[str, List[Tuple[str, float]]]) -> "ExpansionTable":
+        terms: List[str] = list(expansions)
+        term_ids = {term: i for i, term in enumerate(terms)}
+        for neighbours in expansions.values():
+            for neighbour, _ in neighbours:
+                if neighbour not in term_ids:
+                    term_ids[neighbour] = len(terms)
+                    terms.append(neighbour)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int32)
+        neighbour_ids: List[int] = []
+        weights: List[float] = []
+        for i, term in enumerate(terms):
+            for neighbour, weight in expansions.get(term, ()):
+                neighbour_ids.append(term_ids[neighbour])
+                weights.append(weight)
+            offsets[i + 1] = len(neighbour_ids)
+        return cls(terms, offsets, np.asarray(neighbour_ids, dtype=np.int32), np.asarray(weights, dtype=np.float16))
+
+    def expand(self, term: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        :param term: Vocabulary term (stem)
+        :param limit: Maximum number of neighbours
+        :return: [(neighbour term, similarity)] most similar first
+        """
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return []
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return [
+            (self.terms[neighbour], float(weight))
+            for neighbour, weight in zip(self.neighbours[start:end].tolist(), self.weights[start:end].tolist())
+        ]
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            terms=np.asarray(self.terms, dtype=str),
+            offsets=self.offsets,
+            neighbours=self.neighbours,
+            weights=self.weights,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ExpansionTable":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["terms"].tolist(), data["offsets"], data["neighbours"], data["weights"])
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(np.diff(self.offsets)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "terms": len(self),
+            "pairs": int(len(self.neighbours)),
+            "memory_bytes": int(self.offsets.nbytes + self.neighbours.nbytes + self.weights.nbytes),
+        }
+
+
+def build_expansion_table(
+    term_vectors: Mapping[str, np.ndarray],
+    document_frequencies: Mapping[str, int],
+    top_k: int = 5,
+    min_similarity: float = 0.6,
+    min_df: int = 2,
+    max_df_ratio: float = 0.2,
+    num_documents: Optional[int] = None,
+    batch_size: int = 1024,
+) -> ExpansionTable:
+    """
+    Nearest embedding neighbours of every term, computed block by block as
+    (batch x dim) @ (dim x vocabulary) products of L2-normalized vectors.
+
+    :param term_vectors: Vocabulary term -> embedding vector (terms without a vector are skipped)
+    :param document_frequencies: Vocabulary term -> document frequency
+    :param top_k: Neighbours kept per term
+    :param min_similarity: Cosine similarity threshold
+    :param min_df: Neighbours must occur in at least this many documents
+    :param max_df_ratio: Neighbours occurring in more than this share of documents are too generic to expand to
+    :param num_documents: Corpus size for max_df_ratio (defaults to the largest document frequency)
+    :param batch_size: Rows per matrix product (bounds the batch x vocabulary similarity block)
+    :return: ExpansionTable
+    """
+    terms = [term for term in term_vectors if term in document_frequencies]
+    if not terms:
+        return ExpansionTable.from_lists({})
+    matrix = np.stack([np.asarray(term_vectors[term], dtype=np.float32) for term in terms])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1.0, norms)
+
+    num_documents = num_documents or max(document_frequencies.values())
+    dfs = np.array([document_frequencies[term] for term in terms])
+    # Columns that can never be a neighbour
+    excluded = (dfs < min_df) | (dfs > max_df_ratio * num_documents)
+    k = min(top_k, len(terms) - 1)
+    expansions: Dict[str, List[Tuple[str, float]]] = {}
+    if k <= 0:
+        return ExpansionTable.from_lists(expansions)
+    for start in range(0, len(terms), batch_size):
+        similarities = matrix[start:start + batch_size] @ matrix.T
+        rows = np.arange(similarities.shape[0])
+        similarities[rows, rows + start] = -np.inf
+        similarities[:, excluded] = -np.inf
+        best = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(similarities, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for row, (columns, scores) in enumerate(zip(best.tolist(), best_scores.tolist())):
+            neighbours = [(terms[column], score) for column, score in zip(columns, scores) if score >= min_similarity]
+            if neighbours:
+                expansions[terms[start + row]] = neighbours
+    return ExpansionTable.from_lists(expansions)
+
+
+def vocabulary_vectors(word_vectors, vocabulary: Sequence[str], words: Mapping[str, str]) -> Dict[str, np.ndarray]:
+    """
+    Embedding of every stemmed vocabulary term: the vector of its most frequent surface word,
+    or of the stem itself when the word is not in the model.
+    """
+    vectors: Dict[str, np.ndarray] = {}
+    for term in vocabulary:
+        for candidate in (words.get(term), term):
+            if candidate and candidate in word_vectors:
+                vectors[term] = word_vectors[candidate]
+                break
+    return vectors
+
+
+def _load_word_vectors():
+    if KeyedVectors is None:
+        raise ImportError("gensim is required to build the expansion table. Install with: pip install gensim")
+    model_path = os.getenv("WORD2VEC_MODEL_PATH")
+    if model_path and os.path.exists(model_path):
+        try:
+            return KeyedVectors.load(model_path)
+        except Exception:
+            return KeyedVectors.load_word2vec_format(model_path, binary=model_path.endswith(".bin"))
+    return downloader.load(os.getenv("WORD2VEC_MODEL_NAME", "glove-wiki-gigaword-100"))
+
+
+def main(argv: List[str]) -> None:
+    if not argv:
+        print(__doc__)
+        return
+    corpus_path = argv[0]
+    output_path = argv[1] if len(argv) > 1 else os.path.splitext(corpus_path)[0] + ".expansions.npz"
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    document_frequencies: Dict[str, int] = {}
+    for doc in corpus:
+        for term in set(doc.get("tokens") or ()):
+            document_frequencies[term] = document_frequencies.get(term, 0) + 1
+
+    start = time.perf_counter()
+    word_vectors = _load_word_vectors()
+    print(f"Embedding model loaded in {time.perf_counter() - start:.1f} s")
+    words = surface_forms(corpus, fields=("title", "description", "product_details"))
+    vectors = vocabulary_vectors(word_vectors, list(document_frequencies), words)
+    print(f"{len(vectors)} of {len(document_frequencies)} vocabulary terms have a vector")
+
+    start = time.perf_counter()
+    table = build_expansion_table(
+        vectors,
+        document_frequencies,
+        top_k=int(os.getenv("EXPANSION_TOP_K", "5")),
+        min_similarity=float(os.getenv("EXPANSION_MIN_SIMILARITY", "0.6")),
+        num_documents=len(corpus),
+    )
+    table.save(output_path)
+    print(
+        f"Expansion table built in {time.perf_counter() - start:.1f} s: {table.stats()} -> {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+"""
+Fielded query syntax over the attribute columns.
+Clauses such as brand:puma, category:"winter wear", price:<1500, price:500..1500, rating:>=4,
+discount:>30 or stock:in are taken out of the query text before preprocessing; the remaining
+words are searched as usual. Categorical clauses accept several values (brand:puma,nike) and
+any clause can be negated (-brand:puma). Malformed clauses (price:abc, size:xl) are taken out
+too and reported instead of being searched, spell-corrected or relaxed as words.
+
+Every clause is evaluated as one vectorized predicate over a precomputed column of the
+AttributeStore (integer codes or float values), giving a boolean mask over all documents.
+The AND of the masks narrows the candidate set before text intersection and scoring.
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from myapp.search.attributes import CATEGORICAL_FIELDS, to_float
+
+# query field name -> attribute store field
+FIELD_ALIASES = {
+    "brand": "brand",
+    "category": "category",
+    "cat": "category",
+    "sub_category": "sub_category",
+    "subcategory": "sub_category",
+    "seller": "seller",
+    "price": "price",
+    "discount": "discount",
+    "rating": "rating",
+    "stock": "stock",
+    "in_stock": "stock",
+}
+CLAUSE_PATTERN = re.compile(r'(?<!\S)(?P<negated>-?)(?P<field>[A-Za-z_]+):(?P<value>"[^"]*"?|[^\s"]+)')
+NUMERIC_PATTERN = re.compile(r"^(?P<op><=|>=|<|>|=)?(?P<number>[\d.,]+)$")
+RANGE_PATTERN = re.compile(r"^(?P<low>[\d.,]*)\.\.(?P<high>[\d.,]*)$")
+STOCK_VALUES = {"in": True, "yes": True, "true": True, "1": True, "out": False, "no": False, "false": False, "0": False}
+
+
+@dataclass(frozen=True)
+class FieldClause:
+    """
+    One attribute predicate. op is "in" (categorical values), "<", "<=", ">", ">=", "=",
+    "range" (value = (low, high), inclusive, None = unbounded) or "stock" (value = in stock?).
+    """
+    field: str
+    op: str
+    value: Any
+    negated: bool = False
+
+    def __str__(self) -> str:
+        if self.op == "in":
+            text = ",".join(self.value)
+            text = f'"{text}"' if " " in text else text
+        elif self.op == "range":
+            text = "..".join("" if bound is None else f"{bound:g}" for bound in self.value)
+        elif self.op == "stock":
+            text = "in" if self.value else "out"
+        else:
+            text = f"{'' if self.op == '=' else self.op}{self.value:g}"
+        return f"{'-' if self.negated else ''}{self.field}:{text}"
+
+
+def _parse_clause(field: str, value: str, negated: bool) -> FieldClause:
+    """
+    :raises ValueError: if the field is unknown or the value does not fit it
+    """
+    name = field
+    field = FIELD_ALIASES.get(field.lower())
+    if field is None:
+        raise ValueError(f"unknown field '{name}'")
+    value = value.strip('"').strip()
+    if field in CATEGORICAL_FIELDS:
+        values = tuple(part.strip() for part in value.split(",") if part.strip())
+        if not values:
+            raise ValueError("missing value")
+        return FieldClause(field, "in", values, negated)
+    if field == "stock":
+        in_stock = STOCK_VALUES.get(value.lower())
+        if in_stock is None:
+            raise ValueError("expected in or out")
+        return FieldClause(field, "stock", in_stock, negated)
+    range_match = RANGE_PATTERN.match(value)
+    if range_match:
+        low, high = to_float(range_match.group("low")), to_float(range_match.group("high"))
+        if np.isnan(low) and np.isnan(high):
+            raise ValueError("expected a number range (low..high)")
+        bounds = (None if np.isnan(low) else low, None if np.isnan(high) else high)
+        return FieldClause(field, "range", bounds, negated)
+    numeric_match = NUMERIC_PATTERN.match(value)
+    if numeric_match:
+        number = to_float(numeric_match.group("number"))
+        if not np.isnan(number):
+            return FieldClause(field, numeric_match.group("op") or "=", number, negated)
+    raise ValueError("expected a number, a comparison (<1500, >=4) or a range (500..1500)")
+
+
+def parse_field_clauses(query: str) -> Tuple[str, List[FieldClause], List[Dict[str, str]]]:
+    """
+    Split a query into its free text and its attribute clauses.
+    Every field:value token leaves the text; the ones with an unknown field or an unparsable
+    value (e.g. price:cheap) are ignored and returned with the reason for explain output.
+
+    :return: (remaining text, clauses in query order, invalid clauses as {"clause", "error"})
+    """
+    clauses: List[FieldClause] = []
+    invalid: List[Dict[str, str]] = []
+
+    def take(match: re.Match) -> str:
+        try:
+            clauses.append(_parse_clause(match.group("field"), match.group("value"), bool(match.group("negated"))))
+        except ValueError as e:
+            invalid.append({"clause": match.group(0), "error": str(e)})
+        return " "
+
+    text = CLAUSE_PATTERN.sub(take, query)
+    return " ".join(text.split()), clauses, invalid
+
+
+def evaluate_field_clauses(attribute_store, clauses: List[FieldClause]) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    AND of the clause masks, with the selectivity of every clause for explain output.
+
+    :param attribute_store: AttributeStore holding the columns
+    :param clauses: Parsed clauses
+    :return: (boolean mask over document ordinals, report)
+    """
+    live = attribute_store.live
+    size = max(int(np.count_nonzero(live)), 1)
+    mask = live.copy()
+    report_clauses = []
+    start = time.perf_counter()
+    for clause in clauses:
+        clause_start = time.perf_counter()
+        clause_mask = attribute_store.predicate_mask(clause.field, clause.op, clause.value)
+        if clause.negated:
+            clause_mask = ~clause_mask
+        np.logical_and(mask, clause_mask, out=mask)
+        matched = int(np.count_nonzero(clause_mask & live))
+        report_clauses.append({
+            "clause": str(clause),
+            "matched": matched,
+            "selectivity": round(matched / size, 4),
+            "remaining": int(np.count_nonzero(mask)),
+            "elapsed_ms": round((time.perf_counter() - clause_start) * 1000, 3),
+        })
+    matched = int(np.count_nonzero(mask))
+    report = {
+        "clauses": report_clauses,
+        "matched": matched,
+        "selectivity": round(matched / size, 4),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+    return mask, report
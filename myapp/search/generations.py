@@ -0,0 +1,233 @@
+"""
+Zero-downtime reloads of the processed corpus.
+A generation is everything built from one version of processed_corpus.json (index,
+rankers, attribute columns, blob file, caches). A new generation is built in a
+background thread while the current one keeps serving, then swapped in with a
+single reference assignment: requests that already took the current generation
+finish on it, new requests see the new one.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from myapp.search.algorithms import SearchAlgorithm
+from myapp.search.search_engine import SearchEngine
+
+
+def corpus_signature(corpus_path: str) -> Optional[Tuple[float, int]]:
+    """(mtime, size) of the corpus file, None if it does not exist."""
+    try:
+        stat = os.stat(corpus_path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+class IndexGeneration:
+    """
+    One built corpus version. Read-only once swapped in, except for catalogue updates
+    (SearchAlgorithm.apply_updates) applied to the serving generation.
+    """
+
+    def __init__(self, number: int, corpus_path: str, search_algorithm: SearchAlgorithm,
+                 blob_path: str, signature: Optional[Tuple[float, int]], build_ms: float):
+        self.number = number
+        self.corpus_path = corpus_path
+        self.search_algorithm = search_algorithm
+        self.search_engine = SearchEngine(search_algorithm)
+        self.blob_path = blob_path
+        self.signature = signature
+        self.build_ms = build_ms
+        self.built_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "number": self.number,
+            "corpus_path": self.corpus_path,
+            "documents": len(self.search_algorithm.corpus_data),
+            "built_at": self.built_at,
+            "build_ms": round(self.build_ms, 1),
+        }
+
+
+class GenerationManager:
+    """
+    Holds the serving generation and builds the next one.
+
+    :param corpus_path: processed_corpus.json to (re)load
+    :param build: Creates the SearchAlgorithm of a generation from (corpus_path, blob_path)
+    :param blob_path: Blob file of the first generation; generation n > 1 writes "<root>.gen<n><ext>"
+                      next to it so a build never overwrites the file the serving generation reads
+    :param prepare: Called with (new, current) before the swap, e.g. to warm the query cache
+    :param on_swap: Called with (new, previous) after the swap, e.g. to rebind helpers
+    """
+
+    def __init__(
+        self,
+        corpus_path: str,
+        build: Callable[[str, str], SearchAlgorithm],
+        blob_path: Optional[str] = None,
+        prepare: Optional[Callable[[IndexGeneration, Optional[IndexGeneration]], Any]] = None,
+        on_swap: Optional[Callable[[IndexGeneration, Optional[IndexGeneration]], None]] = None,
+    ):
+        self.corpus_path = corpus_path
+        self.build = build
+        self.blob_path = blob_path or os.path.splitext(corpus_path)[0] + ".blobs"
+        self.prepare = prepare
+        self.on_swap = on_swap
+        self.current: Optional[IndexGeneration] = None
+        self._next_number = 1
+        # At most one build at a time; reload() returns False while one is running
+        self._build_lock = threading.Lock()
+        self.building: Optional[Dict[str, Any]] = None
+        self.swaps = 0
+        self.failed_builds = 0
+        self.last_error: Optional[str] = None
+        self.last_swap: Optional[Dict[str, Any]] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watcher = threading.Event()
+
+    def _blob_path_for(self, number: int) -> str:
+        if number == 1:
+            return self.blob_path
+        root, ext = os.path.splitext(self.blob_path)
+        return f"{root}.gen{number}{ext}"
+
+    def load(self) -> IndexGeneration:
+        """
+        Build a generation in the calling thread and serve it (used at startup).
+        Raises whatever the build raises.
+        """
+        with self._build_lock:
+            return self._build_and_swap(self.corpus_path, "startup")
+
+    def reload(self, reason: str = "manual", wait: bool = False) -> bool:
+        """
+        Start building a new generation from the corpus file in a background thread.
+        The current generation serves until the new one is ready; a failed build keeps it.
+        Catalogue updates applied to the current generation meanwhile are not carried over,
+        the corpus file is the source of the new generation.
+
+        :param reason: Recorded in the status ("manual", "admin", "watcher", ...)
+        :param wait: Block until the build finished
+        :return: False if a build is already running
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        thread = threading.Thread(target=self._reload, args=(reason,), name="index-generation-builder", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def _reload(self, reason: str) -> None:
+        try:
+            self._build_and_swap(self.corpus_path, reason)
+        except Exception as e:
+            self.failed_builds += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Index generation build failed ({reason}), still serving generation "
+                  f"{self.current.number if self.current else None}: {self.last_error}")
+        finally:
+            self._build_lock.release()
+
+    def _build_and_swap(self, corpus_path: str, reason: str) -> IndexGeneration:
+        # Caller holds _build_lock
+        number = self._next_number
+        self._next_number += 1
+        blob_path = self._blob_path_for(number)
+        self.building = {"number": number, "reason": reason, "started_at": time.time()}
+        signature = corpus_signature(corpus_path)
+        start = time.perf_counter()
+        previous = self.current
+        try:
+            search_algorithm = self.build(corpus_path, blob_path)
+            generation = IndexGeneration(
+                number, corpus_path, search_algorithm, blob_path, signature, (time.perf_counter() - start) * 1000
+            )
+            if self.prepare is not None:
+                self.prepare(generation, previous)
+        except Exception:
+            # Nothing serves from a failed build's blob file
+            if os.path.exists(blob_path):
+                os.remove(blob_path)
+            raise
+        finally:
+            self.building = None
+        # The swap: requests holding `previous` keep reading it, the next ones read `generation`
+        self.current = generation
+        self.swaps += 1
+        self.last_error = None
+        self.last_swap = {
+            "from": previous.number if previous else None,
+            "to": number,
+            "reason": reason,
+            "at": generation.built_at,
+            "build_ms": round(generation.build_ms, 1),
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        if self.on_swap is not None:
+            self.on_swap(generation, previous)
+        if previous is not None:
+            self._retire(previous)
+        print(f"Serving index generation {number} ({len(search_algorithm.corpus_data)} documents, {reason})")
+        return generation
+
+    def _retire(self, generation: IndexGeneration) -> None:
+        """
+        Stop the background work of a replaced generation. In-flight requests may still read it,
+        so its blob file is only unlinked (an open mmap stays readable) and nothing is closed;
+        the memory is freed when the last reference goes away.
+        """
+        generation.search_algorithm.inverted_index.stop_merger()
+        if generation.blob_path != self.current.blob_path:
+            try:
+                os.remove(generation.blob_path)
+            except OSError:
+                pass
+
+    def start_watcher(self, interval: float = 5.0) -> None:
+        """
+        Reload when the corpus file changes. A change is acted on once the file kept the same
+        mtime and size for one interval, so a file that is still being written is not loaded.
+        """
+        if self._watcher is not None:
+            return
+
+        def run() -> None:
+            pending = None
+            while not self._stop_watcher.wait(interval):
+                signature = corpus_signature(self.corpus_path)
+                serving = self.current.signature if self.current else None
+                if signature is None or signature == serving:
+                    pending = None
+                elif signature != pending:
+                    pending = signature
+                elif self.reload("watcher"):
+                    pending = None
+
+        self._watcher = threading.Thread(target=run, name="corpus-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop_watcher.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.current is not None
+
+    def status(self) -> Dict[str, Any]:
+        building = self.building
+        return {
+            "ready": self.ready,
+            "state": "building" if building else ("serving" if self.ready else "starting"),
+            "generation": self.current.stats() if self.current else None,
+            "building": dict(building, elapsed_s=round(time.time() - building["started_at"], 1)) if building else None,
+            "swaps": self.swaps,
+            "last_swap": self.last_swap,
+            "failed_builds": self.failed_builds,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None and not self._stop_watcher.is_set(),
+        }
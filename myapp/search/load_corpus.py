@@ -1,7 +1,11 @@
 import pandas as pd
 
 from myapp.search.objects import Document
-from typing import List, Dict
+from typing import List, Dict, Iterable
+
+# Short raw fields the web app shows as written by the seller; descriptions, images and
+# product details are served from the search algorithm's blob store instead
+DISPLAY_FIELDS = ("pid", "title", "brand", "category", "sub_category", "seller", "url")
 
 
 def load_corpus(path) -> List[Document]:
@@ -15,6 +19,18 @@ def load_corpus(path) -> List[Document]:
     corpus = _build_corpus(df)
     return corpus
 
+def load_display_corpus(path, fields: Iterable[str] = DISPLAY_FIELDS) -> Dict[str, Document]:
+    """
+    Load only the small display fields of the raw corpus, without the large ones
+    (description, product details, images), which would otherwise stay in RAM twice.
+    :param path:
+    :param fields: Columns to keep; the other Document fields keep their defaults
+    :return:
+    """
+    df = pd.read_json(path)
+    df = df[[field for field in fields if field in df.columns]]
+    return _build_corpus(df)
+
 def _build_corpus(df: pd.DataFrame) -> Dict[str, Document]:
     """
     Build corpus from dataframe
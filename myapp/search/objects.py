@@ -1,6 +1,8 @@
 from pydantic import BaseModel, field_validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+from dataclasses import dataclass, fields, replace
 from datetime import datetime
+import json
 import re
 
 
@@ -116,3 +118,66 @@ class ResultItem(BaseModel):
     
     def to_json(self):
         return self.model_dump_json()
+
+
+@dataclass(frozen=True, slots=True)
+class ResultView:
+    """
+    Read-only search result built directly from the document store.
+    Values were already normalized when the corpus was loaded, so unlike Document
+    no validators run per result; highlighted fields are attached for the template.
+    """
+    pid: str
+    title: str
+    description: Optional[str] = None
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    sub_category: Optional[str] = None
+    product_details: Optional[Dict[str, Any]] = None
+    seller: Optional[str] = None
+    out_of_stock: bool = False
+    selling_price: Optional[float] = None
+    discount: Optional[float] = None
+    actual_price: Optional[float] = None
+    average_rating: Optional[float] = None
+    url: Optional[str] = None
+    original_url: Optional[str] = None
+    images: Optional[List[str]] = None
+    ranking: Optional[float] = None
+    doc_date: Optional[str] = None
+    highlighted_title: Optional[str] = None
+    highlighted_description: Optional[str] = None
+
+    def with_highlights(self, title: Optional[str], description: Optional[str]) -> "ResultView":
+        return replace(self, highlighted_title=title, highlighted_description=description)
+
+    def model_dump(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def to_json(self):
+        return json.dumps(self.model_dump(), default=str)
+
+
+@dataclass(frozen=True, slots=True)
+class SearchResponse:
+    """
+    Outcome of one SearchAlgorithm query: the ranked page plus data about the whole result set.
+    Immutable so it can be shared through the query result cache.
+    """
+    results: Tuple[Tuple[str, float], ...] = ()
+    total: int = 0
+    facets: Optional[Dict[str, Any]] = None
+    # Opaque search_after token for the next page (None on the last page)
+    next_cursor: Optional[str] = None
+    # Typo-tolerance report: misspelled terms, the vocabulary terms they matched and the lookup cost
+    spelling: Optional[Dict[str, Any]] = None
+    # Zero/low-result relaxation report: terms no longer required, attempts and result counts
+    relaxation: Optional[Dict[str, Any]] = None
+    # Weighted OR-expansion: embedding neighbours each query term also matched, with their similarity
+    synonyms: Optional[Dict[str, Any]] = None
+    # Compiled query-language plan (canonical query, per-node estimated and matched counts)
+    query_plan: Optional[Dict[str, Any]] = None
+    # Fielded attribute clauses: selectivity of every clause and how the mask was applied
+    field_clauses: Optional[Dict[str, Any]] = None
+    # Requested ranking method that was not ready (still building or failed) and the method used instead
+    ranking_fallback: Optional[Dict[str, Any]] = None
@@ -0,0 +1,36 @@
+"""
+Opaque search_after cursors for deep pagination.
+A cursor stores the sort key of the last result of a page: (-score, doc id) for relevance,
+(attribute key, -score, doc id) for attribute orders. The next page keeps only the results
+whose key is strictly greater, so no page has to re-rank or skip over the pages before it.
+"""
+
+import base64
+import json
+from typing import Tuple
+
+
+def encode_cursor(sort_id: str, sort_key: Tuple) -> str:
+    """
+    :param sort_id: Canonical order the key belongs to ("relevance", "price_asc", ...)
+    :param sort_key: Sort key of the last returned result
+    :return: URL-safe token
+    """
+    payload = json.dumps([sort_id, list(sort_key)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, Tuple]:
+    """
+    Inverse of encode_cursor.
+
+    :raises ValueError: if the token is malformed
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_id, sort_key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid search_after cursor: {token!r}") from e
+    if not isinstance(sort_id, str) or not isinstance(sort_key, list) or not sort_key:
+        raise ValueError(f"Invalid search_after cursor: {token!r}")
+    return sort_id, tuple(sort_key)
@@ -0,0 +1,183 @@
+"""
+Auxiliary index of precomputed intersections for frequent term pairs.
+Queries made only of common terms ("men cotton solid regular") spend most of their
+candidate-generation time turning huge posting lists into sets; when their terms are
+covered by stored pairs the planner starts from the (much smaller) pair lists instead.
+"""
+
+import sys
+import time
+from collections import Counter
+from itertools import combinations
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+Pair = Tuple[str, str]
+
+
+def _pair(term_a: str, term_b: str) -> Pair:
+    return (term_a, term_b) if term_a <= term_b else (term_b, term_a)
+
+
+class PairIndex:
+    """
+    Structure:
+    - pairs[(term_a, term_b)] = frozenset of doc ids containing both terms (term_a < term_b)
+    The total estimated size of the stored sets stays under memory_budget_bytes.
+    """
+
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.memory_bytes = 0
+        self.pairs: Dict[Pair, FrozenSet[str]] = {}
+        self.build_ms = 0.0
+        self.planned_queries = 0
+        self.pairs_used = 0
+        self.updated_pairs = 0
+
+    @classmethod
+    def build(
+        cls,
+        inverted_index,
+        memory_budget_bytes: int = 16 * 1024 * 1024,
+        max_terms: int = 48,
+        query_terms_log: Optional[Iterable[List[str]]] = None,
+    ) -> "PairIndex":
+        """
+        Select and materialize pairs until the memory budget is used.
+
+        Candidate pairs are the pairs among the `max_terms` highest-df terms plus, when a
+        query log is given, every pair of terms that co-occurred in a logged query.
+        Logged pairs are stored first (by query frequency), then corpus pairs by
+        co-occurrence count, since larger intersections are the most expensive to recompute.
+
+        :param inverted_index: Built InvertedIndex
+        :param memory_budget_bytes: Upper bound for the stored sets
+        :param max_terms: Number of highest-df terms considered for corpus pairs
+        :param query_terms_log: Preprocessed query term lists (e.g. from the analytics query log)
+        """
+        start = time.perf_counter()
+        pair_index = cls(memory_budget_bytes)
+        term_to_docs = inverted_index.term_to_docs
+        doc_sets: Dict[str, Set[str]] = {}
+
+        def docs_of(term: str) -> Set[str]:
+            if term not in doc_sets:
+                doc_sets[term] = {posting[0] for posting in term_to_docs.get(term, ())}
+            return doc_sets[term]
+
+        logged_pairs: Counter = Counter()
+        for terms in query_terms_log or ():
+            known_terms = sorted({term for term in terms if term in term_to_docs})
+            for term_a, term_b in combinations(known_terms, 2):
+                logged_pairs[(term_a, term_b)] += 1
+
+        frequent_terms = sorted(term_to_docs, key=lambda term: len(term_to_docs[term]), reverse=True)[:max_terms]
+        corpus_pairs: List[Tuple[int, Pair, Set[str]]] = []
+        for term_a, term_b in combinations(frequent_terms, 2):
+            pair = _pair(term_a, term_b)
+            if pair in logged_pairs:
+                continue
+            docs = docs_of(term_a) & docs_of(term_b)
+            if docs:
+                corpus_pairs.append((len(docs), pair, docs))
+        corpus_pairs.sort(key=lambda item: item[0], reverse=True)
+
+        ordered = [
+            (pair, docs_of(pair[0]) & docs_of(pair[1]))
+            for pair, _ in logged_pairs.most_common()
+        ]
+        ordered.extend((pair, docs) for _, pair, docs in corpus_pairs)
+        for pair, docs in ordered:
+            if not docs:
+                continue
+            stored = frozenset(docs)
+            size = sys.getsizeof(stored)
+            if pair_index.memory_bytes + size > memory_budget_bytes:
+                continue
+            pair_index.pairs[pair] = stored
+            pair_index.memory_bytes += size
+        pair_index.build_ms = (time.perf_counter() - start) * 1000
+        return pair_index
+
+    def plan(self, terms: List[str]) -> Tuple[Optional[Set[str]], List[str]]:
+        """
+        Cover the query terms with stored pairs, cheapest (smallest) pair first.
+
+        :param terms: Query terms
+        :return: (intersection of the used pair lists or None, terms not covered by any pair)
+        """
+        pairs = self.pairs
+        uncovered = set(terms)
+        seed: Optional[Set[str]] = None
+        used = 0
+        while len(uncovered) > 1:
+            options = [
+                (len(pairs[pair]), pair)
+                for pair in combinations(sorted(uncovered), 2)
+                if pair in pairs
+            ]
+            if not options:
+                break
+            _, pair = min(options)
+            docs = pairs[pair]
+            seed = set(docs) if seed is None else seed & docs
+            uncovered.difference_update(pair)
+            used += 1
+            if not seed:
+                break
+        self.planned_queries += 1
+        self.pairs_used += used
+        remaining = [term for term in dict.fromkeys(terms) if term in uncovered]
+        return seed, remaining
+
+    def apply_changes(
+        self,
+        removed: Iterable[Tuple[str, Iterable[str]]] = (),
+        added: Iterable[Tuple[str, Iterable[str]]] = (),
+    ) -> int:
+        """
+        Keep the stored intersections exact after documents left or entered the index.
+        Each affected pair list is rewritten once per call; pairs are neither added nor dropped,
+        so the size may drift from the budget until the next build.
+
+        :param removed: (doc_id, indexed tokens) of deleted documents and old versions of updated ones
+        :param added: (doc_id, indexed tokens) of new documents and new versions of updated ones
+        :return: Number of pair lists rewritten
+        """
+        pairs = self.pairs
+        removals: Dict[Pair, Set[str]] = {}
+        additions: Dict[Pair, Set[str]] = {}
+        for changes, target in ((removed, removals), (added, additions)):
+            for doc_id, tokens in changes:
+                terms = sorted(set(tokens))
+                # Probe whichever is smaller: the document's term pairs or the stored pairs
+                if len(terms) * (len(terms) - 1) // 2 <= len(pairs):
+                    matched = [pair for pair in combinations(terms, 2) if pair in pairs]
+                else:
+                    term_set = set(terms)
+                    matched = [pair for pair in pairs if pair[0] in term_set and pair[1] in term_set]
+                for pair in matched:
+                    target.setdefault(pair, set()).add(doc_id)
+        affected = removals.keys() | additions.keys()
+        if not affected:
+            return 0
+        # Replaced rather than mutated: plan() may be reading the current dict
+        updated = dict(pairs)
+        for pair in affected:
+            docs = frozenset((pairs[pair] - removals.get(pair, set())) | additions.get(pair, set()))
+            self.memory_bytes += sys.getsizeof(docs) - sys.getsizeof(pairs[pair])
+            updated[pair] = docs
+        self.pairs = updated
+        self.updated_pairs += len(affected)
+        return len(affected)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pairs": len(self.pairs),
+            "memory_bytes": self.memory_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "build_ms": round(self.build_ms, 2),
+            "planned_queries": self.planned_queries,
+            "pairs_used": self.pairs_used,
+            "updated_pairs": self.updated_pairs,
+        }
@@ -0,0 +1,123 @@
+"""
+Pre-forked serving of a WSGI app from several processes.
+The parent builds everything once, then forks worker processes that accept connections on one
+shared listening socket, each serving one request at a time as app.run(threaded=False) does.
+What the parent built is shared copy-on-write: gc.freeze() keeps the collector from writing to
+(and so copying) the pages of those objects in every worker, and the data every query reads lives
+in memory-mapped files (SearchAlgorithm.share_index), whose pages are never copied.
+"""
+
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from werkzeug.serving import make_server
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# A worker that exits sooner than this after being forked is failing at startup: stop instead of re-forking it
+MIN_WORKER_LIFETIME = 5.0
+
+
+def process_memory(pid: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Memory of a process in bytes: rss, pss (shared pages split between the processes mapping them)
+    and uss (pages no other process maps, what one more worker costs). None without psutil.
+    """
+    if psutil is None:
+        return None
+    info = psutil.Process(pid).memory_full_info()
+    return {"pid": pid or os.getpid(), "rss": info.rss, "pss": getattr(info, "pss", None), "uss": info.uss}
+
+
+class PreforkServer:
+    """
+    :param app: WSGI application
+    :param host: Listening address
+    :param port: Listening port (0 picks a free one, see `port` once serving)
+    :param workers: Number of worker processes; a worker that dies is forked again
+    :param post_fork: Called in every worker with its slot number before it serves
+                      (threads of the parent do not exist in a forked worker)
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        host: str,
+        port: int,
+        workers: int,
+        post_fork: Optional[Callable[[int], None]] = None,
+    ):
+        if workers < 1:
+            raise ValueError("A prefork server needs at least one worker")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.post_fork = post_fork
+        # pid -> (slot, fork time)
+        self.worker_pids: Dict[int, tuple] = {}
+
+    def serve_forever(self) -> None:
+        listener = socket.create_server((self.host, self.port), backlog=128)
+        self.port = listener.getsockname()[1]
+        # Everything allocated so far is shared with the workers; keep the collector off it
+        gc.collect()
+        gc.freeze()
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            for slot in range(self.workers):
+                self._spawn(slot, listener)
+            print(f"Serving on http://{self.host}:{self.port} with {self.workers} worker processes")
+            while True:
+                pid, status = os.wait()
+                if pid not in self.worker_pids:
+                    continue
+                slot, started = self.worker_pids.pop(pid)
+                print(f"Worker {slot} (pid {pid}) exited with status {status}")
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    raise RuntimeError(f"Worker {slot} exited right after its start")
+                self._spawn(slot, listener)
+        finally:
+            for pid in self.worker_pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            for pid in self.worker_pids:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+            self.worker_pids = {}
+            listener.close()
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    def _spawn(self, slot: int, listener: socket.socket) -> None:
+        pid = os.fork()
+        if pid:
+            self.worker_pids[pid] = (slot, time.monotonic())
+            return
+        # Worker process: never returns into the parent's code
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if self.post_fork is not None:
+                self.post_fork(slot)
+            server = make_server(self.host, self.port, self.app, threaded=False, fd=listener.fileno())
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
@@ -0,0 +1,403 @@
+"""
+Boolean and phrase query language.
+Syntax: terms are ANDed implicitly; AND, OR and NOT (upper case) combine clauses, "-term" negates,
+parentheses group and double quotes delimit phrases, e.g. "round neck" -polo (cotton OR linen).
+Words go through the same preprocessing pipeline as indexed tokens. The parser is lenient so a
+search box never fails: unclosed quotes and parentheses are closed at the end of the query and
+operators without operands are ignored.
+
+A parsed query is compiled into a plan: every node gets an estimated cardinality from document
+frequencies, AND children are intersected from the smallest estimate up (stopping as soon as the
+intersection is empty), negations are subtracted last, and phrases intersect their terms first and
+then verify adjacency with a positional merge of the sorted position arrays.
+"""
+
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from myapp.search.preprocessing import preprocess_query
+
+TOKEN_PATTERN = re.compile(r'"(?P<phrase>[^"]*)"?|(?P<paren>[()])|(?P<word>[^\s()"]+)')
+OPERATORS = {"AND", "OR", "NOT"}
+STRUCTURE_PATTERN = re.compile(r'["()]|(^|\s)-\S|\b(AND|OR|NOT)\b')
+
+
+def is_structured_query(query: str) -> bool:
+    """
+    Whether the raw query uses the query language (quotes, parentheses, operators or -term);
+    plain keyword queries keep the default conjunctive pipeline.
+    """
+    return bool(STRUCTURE_PATTERN.search(query))
+
+
+class QueryNode:
+    """
+    Plan node. `estimate` is the expected number of matching documents, `matched` the actual
+    number once executed (None before).
+    """
+
+    op = ""
+
+    def __init__(self):
+        self.estimate = 0
+        self.matched: Optional[int] = None
+
+    def terms(self) -> List[str]:
+        """Positive (non-negated) index terms, used for ranking."""
+        return []
+
+    def explain(self) -> Dict[str, Any]:
+        return {"op": self.op, "estimate": self.estimate, "matched": self.matched}
+
+
+class TermNode(QueryNode):
+    op = "term"
+
+    def __init__(self, term: str):
+        super().__init__()
+        self.term = term
+
+    def terms(self) -> List[str]:
+        return [self.term]
+
+    def __str__(self) -> str:
+        return self.term
+
+    def explain(self) -> Dict[str, Any]:
+        return {**super().explain(), "term": self.term}
+
+
+class PhraseNode(QueryNode):
+    op = "phrase"
+
+    def __init__(self, phrase_terms: List[str]):
+        super().__init__()
+        self.phrase_terms = phrase_terms
+        self.positional = True
+
+    def terms(self) -> List[str]:
+        return list(self.phrase_terms)
+
+    def __str__(self) -> str:
+        return '"' + " ".join(self.phrase_terms) + '"'
+
+    def explain(self) -> Dict[str, Any]:
+        return {**super().explain(), "terms": self.phrase_terms, "positional": self.positional}
+
+
+class NotNode(QueryNode):
+    op = "not"
+
+    def __init__(self, child: QueryNode):
+        super().__init__()
+        self.child = child
+
+    def __str__(self) -> str:
+        return f"-{self.child}"
+
+    def explain(self) -> Dict[str, Any]:
+        return {**super().explain(), "children": [self.child.explain()]}
+
+
+class DocSetNode(QueryNode):
+    """Precomputed document set ANDed into the plan (e.g. documents matching attribute clauses)."""
+    op = "docs"
+
+    def __init__(self, docs: Set[str], label: str):
+        super().__init__()
+        self.docs = docs
+        self.label = label
+
+    def __str__(self) -> str:
+        return self.label
+
+    def explain(self) -> Dict[str, Any]:
+        return {**super().explain(), "label": self.label}
+
+
+class AndNode(QueryNode):
+    op = "and"
+
+    def __init__(self, children: List[QueryNode]):
+        super().__init__()
+        self.children = children
+
+    def terms(self) -> List[str]:
+        return [term for child in self.children for term in child.terms()]
+
+    def __str__(self) -> str:
+        return "(" + " AND ".join(str(child) for child in self.children) + ")"
+
+    def explain(self) -> Dict[str, Any]:
+        return {**super().explain(), "children": [child.explain() for child in self.children]}
+
+
+class OrNode(AndNode):
+    op = "or"
+
+    def __str__(self) -> str:
+        return "(" + " OR ".join(str(child) for child in self.children) + ")"
+
+
+class QueryParser:
+    """
+    Recursive descent parser:
+        or_expr  := and_expr ("OR" and_expr)*
+        and_expr := unary (["AND"] unary)*
+        unary    := ("NOT" | "-") unary | primary
+        primary  := "(" or_expr ")" | phrase | word
+    """
+
+    def __init__(self, query: str):
+        self.tokens: List[Tuple[str, str]] = []
+        for match in TOKEN_PATTERN.finditer(query):
+            if match.group("phrase") is not None:
+                self.tokens.append(("phrase", match.group("phrase")))
+            elif match.group("paren"):
+                self.tokens.append((match.group("paren"), match.group("paren")))
+            else:
+                word = match.group("word")
+                if word in OPERATORS:
+                    self.tokens.append((word, word))
+                elif word.startswith("-") and len(word) > 1:
+                    self.tokens.append(("NOT", "-"))
+                    self.tokens.append(("word", word[1:]))
+                else:
+                    self.tokens.append(("word", word))
+        self.position = 0
+
+    def parse(self) -> Optional[QueryNode]:
+        node = self._or_expr()
+        # A stray ")" ends the expression early; parse what follows as more ANDed clauses
+        while self.position < len(self.tokens):
+            self.position += 1
+            rest = self._or_expr()
+            node = _combine(AndNode, [node, rest])
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def _or_expr(self) -> Optional[QueryNode]:
+        children = [self._and_expr()]
+        while self._peek() == "OR":
+            self.position += 1
+            children.append(self._and_expr())
+        return _combine(OrNode, children)
+
+    def _and_expr(self) -> Optional[QueryNode]:
+        children = []
+        while self._peek() not in (None, "OR", ")"):
+            if self._peek() == "AND":
+                self.position += 1
+                continue
+            children.append(self._unary())
+        return _combine(AndNode, children)
+
+    def _unary(self) -> Optional[QueryNode]:
+        if self._peek() == "NOT":
+            self.position += 1
+            if self._peek() in (None, "OR", ")"):
+                return None
+            child = self._unary()
+            return NotNode(child) if child is not None else None
+        return self._primary()
+
+    def _primary(self) -> Optional[QueryNode]:
+        kind, value = self.tokens[self.position]
+        self.position += 1
+        if kind == "(":
+            node = self._or_expr()
+            if self._peek() == ")":
+                self.position += 1
+            return node
+        # A word that preprocesses into several terms (e.g. "cotton/linen") is matched as a phrase
+        terms = preprocess_query(value)
+        if len(terms) > 1:
+            return PhraseNode(terms)
+        return TermNode(terms[0]) if terms else None
+
+
+def _combine(node_type, children: List[Optional[QueryNode]]) -> Optional[QueryNode]:
+    children = [child for child in children if child is not None]
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    # Flatten nested nodes of the same operator
+    flat: List[QueryNode] = []
+    for child in children:
+        flat.extend(child.children if type(child) is node_type else [child])
+    return node_type(flat)
+
+
+def parse_query(query: str) -> Optional[QueryNode]:
+    """
+    :param query: Raw query in the query language
+    :return: Root node, or None when nothing searchable remains (e.g. only stopwords)
+    """
+    return QueryParser(query).parse()
+
+
+class QueryPlan:
+    """
+    Compiled query: cardinality estimates on every node and an executor over an InvertedIndex.
+    Negations only restrict the clauses they are ANDed with; a purely negative query matches nothing.
+    """
+
+    def __init__(self, root: QueryNode, inverted_index):
+        self.root = root
+        self.index = inverted_index
+        self.num_documents = max(inverted_index.total_documents, 1)
+        self.elapsed_ms: Optional[float] = None
+        self._doc_sets: Dict[str, Set[str]] = {}
+        self._estimate(root)
+
+    def _df(self, term: str) -> int:
+        return len(self.index.term_to_docs.get(term, ()))
+
+    def restrict(self, docs: Set[str], label: str) -> None:
+        """
+        AND a precomputed document set into the plan; it is ordered among the other
+        clauses by its size like any term.
+        """
+        self.root = _combine(AndNode, [self.root, DocSetNode(docs, label)])
+        self._estimate(self.root)
+
+    def _estimate(self, node: QueryNode) -> int:
+        if isinstance(node, DocSetNode):
+            node.estimate = len(node.docs)
+        elif isinstance(node, TermNode):
+            node.estimate = self._df(node.term)
+        elif isinstance(node, PhraseNode):
+            node.estimate = min(self._df(term) for term in node.phrase_terms)
+        elif isinstance(node, NotNode):
+            node.estimate = self.num_documents - self._estimate(node.child)
+        elif isinstance(node, OrNode):
+            node.estimate = min(self.num_documents, sum(self._estimate(child) for child in node.children))
+        else:
+            estimates = [self._estimate(child) for child in node.children]
+            positive = [estimate for child, estimate in zip(node.children, estimates) if not isinstance(child, NotNode)]
+            node.estimate = min(positive) if positive else self.num_documents
+            # Execution order: most selective positive clauses first, negations last
+            node.children.sort(key=lambda child: (isinstance(child, NotNode), child.estimate))
+        return node.estimate
+
+    def terms(self) -> List[str]:
+        return self.root.terms()
+
+    def canonical(self) -> str:
+        """Normalized form of the plan, usable as a cache key."""
+        return str(self.root)
+
+    def execute(self) -> Set[str]:
+        """
+        :return: Ids of the matching documents (empty for purely negative queries)
+        """
+        start = time.perf_counter()
+        if isinstance(self.root, NotNode) or (
+            isinstance(self.root, AndNode) and all(isinstance(child, NotNode) for child in self.root.children)
+        ):
+            result: Set[str] = set()
+        else:
+            # Copy so callers never hold the plan's cached posting sets
+            result = set(self._execute(self.root))
+        self.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    def _term_docs(self, term: str) -> Set[str]:
+        docs = self._doc_sets.get(term)
+        if docs is None:
+            docs = self._doc_sets[term] = {posting[0] for posting in self.index.term_to_docs.get(term, ())}
+        return docs
+
+    def _execute(self, node: QueryNode) -> Set[str]:
+        if isinstance(node, TermNode):
+            result = self._term_docs(node.term)
+        elif isinstance(node, DocSetNode):
+            result = node.docs
+        elif isinstance(node, PhraseNode):
+            result = self._execute_phrase(node)
+        elif isinstance(node, OrNode):
+            result = set()
+            for child in node.children:
+                result |= self._execute(child)
+        elif isinstance(node, AndNode):
+            result = None
+            for child in node.children:
+                if isinstance(child, NotNode):
+                    if result is None:
+                        break
+                    result = result - self._execute(child.child)
+                    child.matched = self.num_documents - (child.child.matched or 0)
+                else:
+                    docs = self._execute(child)
+                    result = set(docs) if result is None else result & docs
+                if not result:
+                    break
+            result = result or set()
+        else:
+            result = set()
+        node.matched = len(result)
+        return result
+
+    def _execute_phrase(self, node: PhraseNode) -> Set[str]:
+        terms = sorted(set(node.phrase_terms), key=self._df)
+        candidates = set(self._term_docs(terms[0]))
+        for term in terms[1:]:
+            candidates &= self._term_docs(term)
+            if not candidates:
+                return set()
+        if not self.index.store_positions:
+            # Frequency-only index: the phrase degrades to a conjunction of its terms
+            node.positional = False
+            return candidates
+        positions: List[Dict[str, Any]] = []
+        for term in node.phrase_terms:
+            positions.append({
+                posting[0]: posting[1] for posting in self.index.term_to_docs[term] if posting[0] in candidates
+            })
+        return {doc_id for doc_id in candidates if _phrase_match([term_positions[doc_id] for term_positions in positions])}
+
+    def explain(self) -> Dict[str, Any]:
+        return {
+            "query": self.canonical(),
+            "plan": self.root.explain(),
+            "elapsed_ms": round(self.elapsed_ms, 3) if self.elapsed_ms is not None else None,
+        }
+
+
+def _phrase_match(term_positions: List[Any]) -> bool:
+    """
+    Positional merge: start positions p such that term i occurs at p + i, intersecting the
+    sorted position arrays pairwise with two pointers.
+    """
+    starts = list(term_positions[0])
+    for offset, positions in enumerate(term_positions[1:], start=1):
+        matched = []
+        i = j = 0
+        while i < len(starts) and j < len(positions):
+            target = starts[i] + offset
+            if positions[j] == target:
+                matched.append(starts[i])
+                i += 1
+                j += 1
+            elif positions[j] < target:
+                j += 1
+            else:
+                i += 1
+        if not matched:
+            return False
+        starts = matched
+    return True
+
+
+def compile_query(query: str, inverted_index) -> Optional[QueryPlan]:
+    """
+    Parse and compile a query-language string against an index.
+
+    :return: QueryPlan, or None when nothing searchable remains
+    """
+    root = parse_query(query)
+    return QueryPlan(root, inverted_index) if root is not None else None
@@ -0,0 +1,97 @@
+"""
+Relaxation of conjunctive queries that match nothing (or too little).
+Query clauses are intersected from the most to the least selective and every partial
+intersection is kept. Dropping the last clauses of that order (out-of-vocabulary terms first,
+then the highest document frequency terms) therefore needs no new intersection: relaxing k clauses
+is the partial intersection of the first n - k clauses. Relaxed terms stay in the ranking query,
+so documents that still contain them score higher.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+
+class QueryRelaxer:
+    """
+    Relaxes a query when its filtered candidate set has fewer than `min_results` documents,
+    dropping at most `max_attempts` clauses and always keeping at least one.
+    """
+
+    def __init__(self, min_results: int = 3, max_attempts: int = 2):
+        self.min_results = min_results
+        self.max_attempts = max_attempts
+        self.relaxed_queries = 0
+        self.failed_queries = 0
+        self.attempts = 0
+        self.total_ms = 0.0
+
+    def needs_relaxation(self, clause_count: int, result_count: int) -> bool:
+        return self.max_attempts > 0 and clause_count > 1 and result_count < self.min_results
+
+    def relax(
+        self,
+        clauses: Sequence[Tuple[str, Set[str]]],
+        accept: Callable[[Set[str]], Set[str]],
+        strict_total: int,
+    ) -> Tuple[Optional[Set[str]], Dict[str, Any]]:
+        """
+        :param clauses: (query term, documents matching it) per conjunctive clause; a misspelled
+                        term expanded to close matches is one clause with the union of their documents
+        :param accept: Applies the attribute filters to a candidate set
+        :param strict_total: Number of results of the unrelaxed query
+        :return: (relaxed candidate set or None if nothing better was found,
+                  report with the relaxed and kept terms, attempts and result counts)
+        """
+        start = time.perf_counter()
+        # Most selective first; empty (out-of-vocabulary) clauses last so they are relaxed first
+        ordered = sorted(clauses, key=lambda clause: (not clause[1], len(clause[1])))
+        partial: List[Set[str]] = []
+        for _, docs in ordered:
+            current = docs if not partial else partial[-1] & docs
+            partial.append(current)
+            if not current:
+                break
+
+        best: Optional[Set[str]] = None
+        dropped_count = 0
+        attempts = 0
+        for dropped in range(1, min(self.max_attempts, len(ordered) - 1) + 1):
+            kept = len(ordered) - dropped
+            # Partial intersections past the first empty one are empty as well
+            if kept > len(partial) or not partial[kept - 1]:
+                continue
+            attempts += 1
+            candidates = accept(partial[kept - 1])
+            if len(candidates) > max(strict_total, len(best) if best else 0):
+                best, dropped_count = candidates, dropped
+            if len(candidates) >= self.min_results:
+                break
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.attempts += attempts
+        self.total_ms += elapsed_ms
+        if best is None:
+            self.failed_queries += 1
+        else:
+            self.relaxed_queries += 1
+        kept_count = len(ordered) - dropped_count
+        report = {
+            "relaxed_terms": [term for term, _ in ordered[kept_count:]] if best is not None else [],
+            "kept_terms": [term for term, _ in ordered[:kept_count]],
+            "attempts": attempts,
+            "strict_total": strict_total,
+            "relaxed_total": len(best) if best is not None else strict_total,
+            "elapsed_ms": round(elapsed_ms, 3),
+        }
+        return best, report
+
+    def stats(self) -> Dict[str, Any]:
+        triggered = self.relaxed_queries + self.failed_queries
+        return {
+            "min_results": self.min_results,
+            "max_attempts": self.max_attempts,
+            "relaxed_queries": self.relaxed_queries,
+            "failed_queries": self.failed_queries,
+            "avg_attempts": round(self.attempts / triggered, 2) if triggered else 0.0,
+            "avg_ms": round(self.total_ms / triggered, 3) if triggered else 0.0,
+        }
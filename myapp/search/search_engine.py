@@ -1,24 +1,12 @@
-from typing import List, Optional
-from urllib.parse import urlparse
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-from myapp.search.objects import Document
+from myapp.search.attributes import SearchFilters
+from myapp.search.enrichment import infer_brand_from_url
+from myapp.search.objects import ResultView, SearchResponse
 from myapp.search.algorithms import SearchAlgorithm
 
 
-STOP_BRAND_TOKENS = {
-    "men", "man", "women", "woman", "boys", "boy", "girls", "girl",
-    "solid", "printed", "print", "striped", "strip", "slim", "fit", "regular", "relaxed",
-    "round", "v", "neck", "crew", "tshirt", "t-shirt", "shirt", "t", "dress", "kurta",
-    "top", "tops", "jeans", "denim", "track", "tracks", "pants", "pant", "shorts", "short",
-    "jacket", "hoodie", "sweatshirt", "sweater", "sweat", "trouser", "capri", "legging", "leggings",
-    "palazzo", "set", "combo", "pack", "cotton", "polyester", "blend", "full", "half",
-    "sleeve", "sleeves", "three", "quarter", "ankle", "length", "graphic", "logo",
-    "collar", "henley", "polo", "mock", "high", "rise", "mid", "low", "waist",
-    "sports", "sport", "running", "gym", "yoga", "casual", "formal", "ethnic", "party",
-    "wedding", "plain", "classic", "basic", "essential", "boys'", "girls'"
-}
-
-
 class SearchEngine:
     """
     Search engine that integrates TF-IDF ranking algorithm.
@@ -33,6 +21,7 @@ class SearchEngine:
                                  If None, must be set via set_search_algorithm() before use.
         """
         self.search_algorithm = search_algorithm
+        self.hydration_stats: Dict[str, float] = {"requests": 0, "results": 0, "total_ms": 0.0, "last_ms": 0.0}
     
     def set_search_algorithm(self, search_algorithm: SearchAlgorithm):
         """
@@ -43,35 +32,18 @@ class SearchEngine:
         """
         self.search_algorithm = search_algorithm
     
-    def _infer_brand_from_url(self, url: Optional[str]) -> Optional[str]:
-        if not url:
-            return None
-        path = urlparse(url).path
-        if not path:
-            return None
-        slug = next((segment for segment in path.split('/') if segment), '')
-        if not slug:
-            return None
-        tokens = [token for token in slug.split('-') if token]
-        brand_tokens: List[str] = []
-        for token in tokens:
-            token = token.strip().lower()
-            if not token or token.isdigit() or token in STOP_BRAND_TOKENS:
-                break
-            brand_tokens.append(token)
-        if not brand_tokens:
-            return None
-        brand = ' '.join(token.capitalize() for token in brand_tokens)
-        return brand if len(brand) >= 3 else None
-
     def search(
         self,
         search_query: str,
         search_id: int,
         corpus: dict,
         top_k: int = 20,
-        ranking_method: Optional[str] = None
-    ) -> List[Document]:
+        ranking_method: Optional[str] = None,
+        session_id: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        sort_by: Optional[str] = None,
+        offset: int = 0
+    ) -> List[ResultView]:
         """
         Perform search using the integrated search algorithm.
         
@@ -79,24 +51,80 @@ class SearchEngine:
         :param search_id: Search session ID for analytics
         :param corpus: Dictionary of Document objects (pid -> Document) for result formatting (fallback)
         :param top_k: Number of top results to return
-        :return: List of Document objects with ranking scores
+        :param ranking_method: Identifier of the ranking algorithm to use
+        :param session_id: Analytics session ID, lets refined queries reuse the previous candidates
+        :param filters: Attribute filters applied to the candidates before ranking
+        :param sort_by: "relevance" or an attribute order such as "price_asc"
+        :param offset: Number of results to skip (pagination)
+        :return: List of read-only ResultView objects with ranking scores
+        """
+        results, _ = self.run_search(
+            search_query,
+            search_id,
+            corpus,
+            top_k=top_k,
+            ranking_method=ranking_method,
+            session_id=session_id,
+            filters=filters,
+            sort_by=sort_by,
+            offset=offset
+        )
+        return results
+
+    def run_search(
+        self,
+        search_query: str,
+        search_id: int,
+        corpus: dict,
+        top_k: int = 20,
+        ranking_method: Optional[str] = None,
+        session_id: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        facets: bool = False,
+        sort_by: Optional[str] = None,
+        offset: int = 0,
+        search_after: Optional[str] = None,
+        first_position: Optional[int] = None,
+        expand: bool = False
+    ) -> Tuple[List[ResultView], SearchResponse]:
+        """
+        Same as search() but also returns the SearchResponse (total matches, facet counts, next page cursor).
+        
+        :param facets: Count attribute values over the full result set for the results page
+        :param search_after: next_cursor of the previous page
+        :param first_position: Rank of the first result on the page (defaults to offset + 1)
+        :param expand: Also match precomputed embedding neighbours of the query terms
+        :return: (result views of the page, search response)
         """
         if not self.search_algorithm:
             raise ValueError("Search algorithm not initialized. Call set_search_algorithm() first.")
         
         if not search_query or not search_query.strip():
-            return []
+            return [], SearchResponse()
         
         # Perform search using TF-IDF ranking
-        ranked_results = self.search_algorithm.search(
+        response = self.search_algorithm.execute(
             search_query,
             top_k=top_k,
-            ranking_method=ranking_method
+            ranking_method=ranking_method,
+            session_id=session_id,
+            filters=filters,
+            facets=facets,
+            sort_by=sort_by,
+            offset=offset,
+            search_after=search_after,
+            expand=expand
         )
-        
-        # Convert results to Document objects for web display
+        first_position = first_position or offset + 1
+        return self._hydrate(response.results, search_id, corpus, first_position=first_position), response
+
+    def _hydrate(self, ranked_results, search_id: int, corpus: dict, first_position: int = 1) -> List[ResultView]:
+        """
+        Convert (doc_id, score) results to lightweight result views for web display.
+        """
+        hydration_start = time.perf_counter()
         results = []
-        for position, (doc_id, score) in enumerate(ranked_results, start=1):
+        for position, (doc_id, score) in enumerate(ranked_results, start=first_position):
             # Get document data from search algorithm's corpus (processed corpus with all fields)
             doc_data = self.search_algorithm.get_document_by_id(doc_id)
             display_doc = corpus.get(doc_id)
@@ -109,40 +137,22 @@ class SearchEngine:
                 seller_display = display_doc.seller or None
             
             if doc_data:
-                # Get description with fallback to full_text or empty string
-                description = doc_data.get('description')
-                if not description or (isinstance(description, str) and description.strip() == ''):
-                    description = doc_data.get('full_text', '')
-                if not description or (isinstance(description, str) and description.strip() == ''):
-                    description = doc_data.get('title', '')
+                # Display fields were derived once at ingestion time (see myapp.search.enrichment)
+                description = doc_data.get('display_description', '')
                 
                 # Handle product_details - ensure it's a dict or None
                 product_details = doc_data.get('product_details')
                 if product_details is not None and not isinstance(product_details, dict):
                     product_details = None
                 
-                # Handle doc_date - convert timestamp to string if needed
-                crawled_at = doc_data.get('crawled_at')
-                if crawled_at is None:
-                    doc_date = ''
-                elif isinstance(crawled_at, (int, float)):
-                    # Convert timestamp to string
-                    doc_date = str(crawled_at)
-                else:
-                    doc_date = str(crawled_at)
-                
-                # Get original URL from corpus
                 original_url = doc_data.get('url')
-                brand_value = brand_display or doc_data.get('brand')
-                if not brand_value or len(brand_value) <= 2:
-                    inferred = self._infer_brand_from_url(
-                        original_url or (display_doc.original_url if display_doc else None)
-                    )
-                    if inferred:
-                        brand_value = inferred
+                if brand_display and len(brand_display) > 2:
+                    brand_value = brand_display
+                else:
+                    brand_value = doc_data.get('display_brand') or brand_display
                 
                 # Create result document from processed corpus data
-                result_doc = Document(
+                result_doc = ResultView(
                     pid=doc_data.get('pid', doc_id),
                     title=doc_data.get('title', 'N/A'),
                     description=description,
@@ -160,7 +170,7 @@ class SearchEngine:
                     original_url=original_url,
                     images=doc_data.get('images'),
                     ranking=score,
-                    doc_date=doc_date
+                    doc_date=doc_data.get('doc_date', '')
                 )
                 results.append(result_doc)
             else:
@@ -169,10 +179,10 @@ class SearchEngine:
                 if doc:
                     brand_value = doc.brand
                     if not brand_value or len(brand_value) <= 2:
-                        inferred = self._infer_brand_from_url(doc.original_url or doc.url)
+                        inferred = infer_brand_from_url(doc.original_url or doc.url)
                         if inferred:
                             brand_value = inferred
-                    result_doc = Document(
+                    result_doc = ResultView(
                         pid=doc.pid,
                         title=doc.title or 'N/A',
                         description=doc.description or '',
@@ -193,4 +203,25 @@ class SearchEngine:
                     )
                     results.append(result_doc)
         
+        self._record_hydration(len(results), (time.perf_counter() - hydration_start) * 1000)
         return results
+
+    def _record_hydration(self, result_count: int, elapsed_ms: float) -> None:
+        stats = self.hydration_stats
+        stats["requests"] += 1
+        stats["results"] += result_count
+        stats["total_ms"] += elapsed_ms
+        stats["last_ms"] = elapsed_ms
+
+    def get_hydration_stats(self) -> Dict[str, Any]:
+        """
+        Per-request result hydration timings (building result views from the document store).
+        """
+        stats = self.hydration_stats
+        requests = stats["requests"]
+        return {
+            "requests": int(requests),
+            "results": int(stats["results"]),
+            "last_ms": round(stats["last_ms"], 3),
+            "avg_ms": round(stats["total_ms"] / requests, 3) if requests else 0.0,
+        }
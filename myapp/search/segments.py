@@ -0,0 +1,362 @@
+"""
+Segment-based inverted index for incremental catalogue updates.
+The index built at start-up becomes the first sealed segment. New and changed products are
+indexed into a small mutable segment, which is sealed once it holds max_buffered_docs
+documents; deleted and replaced products are recorded as tombstones on the segment holding
+them. A background merger rewrites groups of small segments (and segments carrying many
+tombstones) into one, dropping the dead postings, and swaps the result in atomically.
+
+Readers keep the InvertedIndex interface: term_to_docs[term] is the list of live postings of
+every segment, concatenated on first access and cached until a write touches the term.
+Readers never take the write lock.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PART2_DIR = os.path.abspath(os.path.join(CURRENT_DIR, "..", "..", "project_progress", "part_2"))
+if PART2_DIR not in sys.path:
+    sys.path.append(PART2_DIR)
+
+from inverted_index import InvertedIndex
+
+
+class IndexSegment:
+    """
+    Structure:
+    - index = InvertedIndex with the postings of the documents indexed in this segment
+    - doc_ids = documents indexed in the segment, deleted = tombstoned subset of doc_ids
+    Sealed segments never receive postings again; only their tombstones grow.
+    """
+
+    def __init__(self, segment_id: int, index: InvertedIndex, doc_ids: Set[str], sealed: bool = False):
+        self.segment_id = segment_id
+        self.index = index
+        self.doc_ids = doc_ids
+        self.deleted: Set[str] = set()
+        self.sealed = sealed
+
+    @property
+    def live_documents(self) -> int:
+        return len(self.doc_ids) - len(self.deleted)
+
+    def live_postings(self, term: str) -> List:
+        postings = self.index.term_to_docs.get(term)
+        if not postings or not self.deleted:
+            return postings or []
+        deleted = self.deleted
+        return [posting for posting in postings if posting[0] not in deleted]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "id": self.segment_id,
+            "documents": len(self.doc_ids),
+            "deleted": len(self.deleted),
+            "sealed": self.sealed,
+        }
+
+
+class SegmentedPostings(Mapping):
+    """
+    Read-only term -> live postings view over the segments of a SegmentedIndex.
+    Like the defaultdict of InvertedIndex, a missing term reads as an empty list.
+    """
+
+    def __init__(self, owner: "SegmentedIndex"):
+        self._owner = owner
+
+    def __getitem__(self, term: str) -> List:
+        return self._owner.postings(term)
+
+    def get(self, term: str, default=None):
+        return self._owner.postings(term) or default
+
+    def __contains__(self, term) -> bool:
+        return bool(self._owner.postings(term))
+
+    def __iter__(self) -> Iterator[str]:
+        segments = self._owner.segments
+        if len(segments) == 1 and not segments[0].deleted:
+            return iter(list(segments[0].index.term_to_docs))
+        terms = dict.fromkeys(term for segment in segments for term in list(segment.index.term_to_docs))
+        return (term for term in terms if self._owner.postings(term))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class SegmentedIndex:
+    """
+    InvertedIndex over a list of segments with tombstones.
+
+    :param base: Index built from the initial corpus (becomes the first sealed segment)
+    :param doc_ids: Documents indexed in `base`
+    :param max_buffered_docs: Documents held by the mutable segment before it is sealed
+    :param merge_factor: The merger combines this many sealed segments once more than that exist
+    :param max_deleted_ratio: Segments with at least this share of tombstoned documents are rewritten alone
+    """
+
+    # InvertedIndex query helpers only read term_to_docs and total_documents
+    conjunctive_query = InvertedIndex.conjunctive_query
+    get_documents_for_term = InvertedIndex.get_documents_for_term
+    get_vocabulary_stats = InvertedIndex.get_vocabulary_stats
+    get_most_frequent_terms = InvertedIndex.get_most_frequent_terms
+    posting_frequency = staticmethod(InvertedIndex.posting_frequency)
+
+    def __init__(
+        self,
+        base: InvertedIndex,
+        doc_ids: Iterable[str],
+        max_buffered_docs: int = 1000,
+        merge_factor: int = 4,
+        max_deleted_ratio: float = 0.3,
+    ):
+        self.store_positions = base.store_positions
+        self.max_buffered_docs = max(1, max_buffered_docs)
+        self.merge_factor = max(2, merge_factor)
+        self.max_deleted_ratio = max_deleted_ratio
+        # Writers and segment swaps; readers work on the `segments` tuple they read
+        self.lock = threading.RLock()
+        # One merge at a time, whether run by the merger thread or by maybe_merge()
+        self._merge_lock = threading.Lock()
+        self._next_segment_id = 0
+        base_segment = self._new_segment(base, set(doc_ids), sealed=True)
+        self.segments: Tuple[IndexSegment, ...] = (base_segment,)
+        self.doc_segment: Dict[str, IndexSegment] = dict.fromkeys(base_segment.doc_ids, base_segment)
+        self.mutable: Optional[IndexSegment] = None
+        self.total_documents = len(base_segment.doc_ids)
+        self.term_to_docs = SegmentedPostings(self)
+
+        self._postings_cache: Dict[str, List] = {}
+        self._cache_lock = threading.Lock()
+        self._cache_version = 0
+
+        self.on_merge: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._merger: Optional[threading.Thread] = None
+        self._merge_wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.added = 0
+        self.deletes = 0
+        self.sealed_segments = 0
+        self.merges = 0
+        self.merge_ms_total = 0.0
+        self.last_merge: Optional[Dict[str, Any]] = None
+
+    def _new_segment(self, index: InvertedIndex, doc_ids: Set[str], sealed: bool = False) -> IndexSegment:
+        segment = IndexSegment(self._next_segment_id, index, doc_ids, sealed=sealed)
+        self._next_segment_id += 1
+        return segment
+
+    def postings(self, term: str) -> List:
+        """Live postings of a term across all segments ([] when no live document contains it)."""
+        segments = self.segments
+        if len(segments) == 1 and not segments[0].deleted:
+            return segments[0].index.term_to_docs.get(term) or []
+        cached = self._postings_cache.get(term)
+        if cached is not None:
+            return cached
+        with self._cache_lock:
+            # Version first, then the segments: a swap after this point bumps the version again,
+            # so postings built from swapped-out segments are never stored under the new one
+            version = self._cache_version
+            segments = self.segments
+        parts = [postings for postings in (segment.live_postings(term) for segment in segments) if postings]
+        if not parts:
+            return []
+        postings = parts[0] if len(parts) == 1 else [posting for part in parts for posting in part]
+        with self._cache_lock:
+            # A write that happened meanwhile may already have invalidated this term
+            if version == self._cache_version:
+                self._postings_cache[term] = postings
+        return postings
+
+    def _invalidate(self, terms: Optional[Iterable[str]] = None) -> None:
+        with self._cache_lock:
+            self._cache_version += 1
+            if terms is None:
+                self._postings_cache = {}
+            else:
+                for term in terms:
+                    self._postings_cache.pop(term, None)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_segment
+
+    def add_document(self, doc_id: str, tokens: Sequence[str]) -> None:
+        """
+        Index a new document (or the new version of a deleted one) into the mutable segment.
+        Documents without tokens are not indexed, as in InvertedIndex.
+        """
+        if not tokens:
+            return
+        with self.lock:
+            if doc_id in self.doc_segment:
+                raise ValueError(f"Document {doc_id} is already indexed; delete it before re-indexing")
+            segment = self.mutable
+            if segment is not None and doc_id in segment.deleted:
+                # Its tombstone would also hide the new postings
+                self._seal()
+                segment = None
+            if segment is None:
+                segment = self.mutable = self._new_segment(
+                    InvertedIndex(store_positions=self.store_positions), set()
+                )
+                self.segments = self.segments + (segment,)
+            segment.index.add_document(doc_id, tokens)
+            segment.doc_ids.add(doc_id)
+            self.doc_segment[doc_id] = segment
+            self.total_documents += 1
+            self.added += 1
+            self._invalidate(set(tokens))
+            if len(segment.doc_ids) >= self.max_buffered_docs:
+                self._seal()
+
+    def delete_document(self, doc_id: str, tokens: Optional[Iterable[str]] = None) -> bool:
+        """
+        Tombstone a document in the segment holding it.
+
+        :param doc_id: Document ID
+        :param tokens: Its indexed tokens, to invalidate only the affected cached postings (None clears the cache)
+        :return: False when the document was not indexed
+        """
+        with self.lock:
+            segment = self.doc_segment.pop(doc_id, None)
+            if segment is None:
+                return False
+            segment.deleted.add(doc_id)
+            self.total_documents -= 1
+            self.deletes += 1
+            self._invalidate(set(tokens) if tokens is not None else None)
+            if segment.sealed and len(segment.deleted) >= self.max_deleted_ratio * len(segment.doc_ids):
+                self._merge_wakeup.set()
+            return True
+
+    def _seal(self) -> None:
+        if self.mutable is not None:
+            self.mutable.sealed = True
+            self.mutable = None
+            self.sealed_segments += 1
+            self._merge_wakeup.set()
+
+    def _select_merge(self) -> List[IndexSegment]:
+        """
+        Merge policy: a segment with too many tombstones is rewritten on its own; otherwise, once
+        more than merge_factor sealed segments exist, the merge_factor smallest are combined.
+        """
+        sealed = [segment for segment in self.segments if segment.sealed]
+        for segment in sealed:
+            if segment.deleted and len(segment.deleted) >= self.max_deleted_ratio * len(segment.doc_ids):
+                return [segment]
+        if len(sealed) > self.merge_factor:
+            return sorted(sealed, key=lambda segment: segment.live_documents)[:self.merge_factor]
+        return []
+
+    def merge(self, sources: List[IndexSegment]) -> Dict[str, Any]:
+        """
+        Rewrite sealed segments into one without their tombstoned postings.
+        The new segment is built without the write lock; only the swap takes it, carrying
+        over the tombstones recorded on the sources in the meantime.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            tombstones = {segment.segment_id: set(segment.deleted) for segment in sources}
+        merged = InvertedIndex(store_positions=self.store_positions)
+        doc_ids: Set[str] = set()
+        for segment in sources:
+            dead = tombstones[segment.segment_id]
+            doc_ids.update(segment.doc_ids - dead if dead else segment.doc_ids)
+            for term, postings in segment.index.term_to_docs.items():
+                live = [posting for posting in postings if posting[0] not in dead] if dead else postings
+                if live:
+                    merged.term_to_docs[term].extend(live)
+        merged.total_documents = len(doc_ids)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            segment = self._new_segment(merged, doc_ids, sealed=True)
+            for source in sources:
+                segment.deleted.update(source.deleted - tombstones[source.segment_id])
+            for doc_id in doc_ids:
+                if self.doc_segment.get(doc_id) in sources:
+                    self.doc_segment[doc_id] = segment
+            segments: List[IndexSegment] = []
+            for current in self.segments:
+                if current not in sources:
+                    segments.append(current)
+                elif segment not in segments and segment.live_documents:
+                    segments.append(segment)
+            self.segments = tuple(segments)
+            self._invalidate()
+        report = {
+            "sources": [source.stats() for source in sources],
+            "segment": segment.stats(),
+            "dropped_postings_of": sum(len(dead) for dead in tombstones.values()),
+            "build_ms": round(build_ms, 2),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        self.merges += 1
+        self.merge_ms_total += report["elapsed_ms"]
+        self.last_merge = report
+        return report
+
+    def maybe_merge(self) -> List[Dict[str, Any]]:
+        """Run merges until the policy selects nothing; on_merge is called after each one."""
+        reports = []
+        with self._merge_lock:
+            while True:
+                with self.lock:
+                    sources = self._select_merge()
+                if not sources:
+                    return reports
+                report = self.merge(sources)
+                reports.append(report)
+                if self.on_merge is not None:
+                    self.on_merge(report)
+
+    def start_merger(self, interval: float = 1.0) -> None:
+        """Start the background merger thread (woken by seals and tombstone-heavy segments, or every `interval` s)."""
+        if self._merger is not None and self._merger.is_alive():
+            return
+        self._stopped.clear()
+
+        def run() -> None:
+            while not self._stopped.is_set():
+                self._merge_wakeup.wait(interval)
+                self._merge_wakeup.clear()
+                if not self._stopped.is_set():
+                    self.maybe_merge()
+
+        self._merger = threading.Thread(target=run, name="index-merger", daemon=True)
+        self._merger.start()
+
+    def stop_merger(self) -> None:
+        self._stopped.set()
+        self._merge_wakeup.set()
+        if self._merger is not None:
+            self._merger.join()
+            self._merger = None
+
+    def estimate_memory_bytes(self) -> int:
+        return sum(segment.index.estimate_memory_bytes() for segment in self.segments)
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self.segments
+        return {
+            "segments": [segment.stats() for segment in segments],
+            "documents": self.total_documents,
+            "tombstones": sum(len(segment.deleted) for segment in segments),
+            "buffered": len(self.mutable.doc_ids) if self.mutable is not None else 0,
+            "added": self.added,
+            "deleted": self.deletes,
+            "sealed": self.sealed_segments,
+            "merges": self.merges,
+            "merge_ms_total": round(self.merge_ms_total, 2),
+            "last_merge": self.last_merge,
+            "merger_running": self._merger is not None and self._merger.is_alive(),
+            "cached_terms": len(self._postings_cache),
+        }
@@ -0,0 +1,214 @@
+"""
+Parallel build of the inverted index and the TF-IDF statistics.
+The corpus is cut into contiguous partitions and a process pool works on them in two rounds:
+1. each worker indexes its partition (postings, tf, log tf);
+   the parent concatenates the postings in partition order and sums df over the partitions
+2. with N and the global df known, each worker computes the TF-IDF lengths of its documents
+   (idf = log2(N / df) cannot be computed from one partition alone)
+Postings travel as one flat record per term (see _encode_postings): pickling a list of small
+position arrays costs more than building it.
+The merged index is identical to InvertedIndex.build_from_corpus on the whole corpus.
+"""
+
+import math
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PART2_DIR = os.path.abspath(os.path.join(CURRENT_DIR, "..", "..", "project_progress", "part_2"))
+if PART2_DIR not in sys.path:
+    sys.path.append(PART2_DIR)
+
+from inverted_index import InvertedIndex
+
+# (doc_id, tokens) of the whole corpus, set in every worker by _init_worker
+_documents: Sequence[Tuple[str, List[str]]] = ()
+
+
+def _init_worker(documents: Sequence[Tuple[str, List[str]]]) -> None:
+    global _documents
+    _documents = documents
+
+
+def _encode_postings(postings: List[List], store_positions: bool) -> Tuple[List[str], array, Optional[array]]:
+    """Posting list -> (doc ids, frequencies, concatenated positions or None)."""
+    doc_ids = [posting[0] for posting in postings]
+    if not store_positions:
+        return doc_ids, array('I', [posting[1] for posting in postings]), None
+    positions = array('I')
+    for posting in postings:
+        positions.extend(posting[1])
+    return doc_ids, array('I', [len(posting[1]) for posting in postings]), positions
+
+
+def _decode_postings(encoded: Tuple[List[str], array, Optional[array]], out: List[List]) -> None:
+    """Append the postings of an _encode_postings record to `out`."""
+    doc_ids, frequencies, positions = encoded
+    if positions is None:
+        out.extend(map(list, zip(doc_ids, frequencies)))
+        return
+    # Posting i holds positions[ends[i - 1]:ends[i]]; map() keeps the per-posting work in C
+    ends = list(accumulate(frequencies))
+    starts = [0] + ends[:-1]
+    out.extend(map(list, zip(doc_ids, map(positions.__getitem__, map(slice, starts, ends)))))
+
+
+def _index_partition(bounds: Tuple[int, int], store_positions: bool, encode: bool = True) -> Tuple[Dict, Dict, Dict, int]:
+    """Round 1: postings (encoded for the parent process unless `encode` is False), tf and log tf of [start, end)."""
+    start, end = bounds
+    index = InvertedIndex(store_positions=store_positions)
+    for doc_id, tokens in _documents[start:end]:
+        index.add_document(doc_id, tokens)
+    term_frequencies: Dict[Tuple[str, str], int] = {}
+    log_tf: Dict[Tuple[str, str], float] = {}
+    for term, postings in index.term_to_docs.items():
+        for posting in postings:
+            freq = InvertedIndex.posting_frequency(posting)
+            term_frequencies[(term, posting[0])] = freq
+            log_tf[(term, posting[0])] = 1.0 + math.log2(freq)
+    if not encode:
+        return dict(index.term_to_docs), term_frequencies, log_tf, index.total_documents
+    postings = {term: _encode_postings(term_postings, store_positions) for term, term_postings in index.term_to_docs.items()}
+    return postings, term_frequencies, log_tf, index.total_documents
+
+
+def _partition_lengths(bounds: Tuple[int, int], idf: Dict[str, float]) -> Dict[str, float]:
+    """Round 2: TF-IDF document lengths sqrt(sum(((1 + log2 tf) * idf)^2)) of the documents in [start, end)."""
+    start, end = bounds
+    lengths: Dict[str, float] = {}
+    for doc_id, tokens in _documents[start:end]:
+        if tokens:
+            lengths[doc_id] = math.sqrt(sum(
+                ((1.0 + math.log2(freq)) * idf[term]) ** 2 for term, freq in Counter(tokens).items()
+            ))
+    return lengths
+
+
+def _partitions(size: int, count: int) -> List[Tuple[int, int]]:
+    step = -(-size // count) if size else 1
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+class ShardedBuild:
+    """
+    Result of build_sharded_index.
+
+    - index: InvertedIndex over the whole corpus
+    - tfidf_statistics: keyword arguments of TFIDFRanker.from_statistics
+    - timings: milliseconds per phase
+    """
+
+    def __init__(self, index: InvertedIndex, tfidf_statistics: Dict[str, Any], workers: int,
+                 partitions: int, timings: Dict[str, float]):
+        self.index = index
+        self.tfidf_statistics = tfidf_statistics
+        self.workers = workers
+        self.partitions = partitions
+        self.timings = timings
+
+
+def build_sharded_index(
+    corpus_data: List[Dict[str, Any]],
+    workers: int,
+    store_positions: bool = True,
+    text_field: str = 'tokens',
+) -> ShardedBuild:
+    """
+    Build the inverted index and the TF-IDF statistics with `workers` processes.
+    Workers get the corpus through the pool initializer (inherited, not pickled, where processes
+    are forked) and only exchange partition bounds and results with the parent.
+    With workers <= 1 the same partition code runs in this process.
+
+    :param corpus_data: Processed corpus documents ('pid' and tokens)
+    :param workers: Number of worker processes (and of partitions)
+    :param store_positions: As InvertedIndex(store_positions=...)
+    :param text_field: Field with the document tokens
+    :return: ShardedBuild with the merged index, the TF-IDF statistics and the phase timings
+    """
+    start = time.perf_counter()
+    documents = []
+    for doc in corpus_data:
+        doc_id = doc.get('pid', '')
+        if not doc_id:
+            continue
+        tokens = doc.get(text_field, [])
+        if isinstance(tokens, str):
+            tokens = tokens.split()
+        documents.append((doc_id, tokens))
+    workers = max(1, workers)
+    bounds = _partitions(len(documents), workers)
+    timings: Dict[str, float] = {}
+
+    executor: Optional[ProcessPoolExecutor] = None
+    if workers > 1:
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(documents,)
+        )
+    else:
+        _init_worker(documents)
+    try:
+        phase = time.perf_counter()
+        if executor is not None:
+            partials = list(executor.map(_index_partition, bounds, [store_positions] * len(bounds)))
+        else:
+            partials = [_index_partition(partition, store_positions, encode=False) for partition in bounds]
+        timings["partitions_ms"] = (time.perf_counter() - phase) * 1000
+
+        # Concatenating in partition order keeps every posting list in corpus order, as a serial build
+        phase = time.perf_counter()
+        index = InvertedIndex(store_positions=store_positions)
+        term_to_docs = index.term_to_docs
+        term_frequencies: Dict[Tuple[str, str], int] = {}
+        log_tf: Dict[Tuple[str, str], float] = {}
+        for postings, partition_tf, partition_log_tf, indexed in partials:
+            for term, term_postings in postings.items():
+                if executor is not None:
+                    _decode_postings(term_postings, term_to_docs[term])
+                else:
+                    term_to_docs[term].extend(term_postings)
+            term_frequencies.update(partition_tf)
+            log_tf.update(partition_log_tf)
+            index.total_documents += indexed
+        del partials
+        document_frequencies = {term: len(postings) for term, postings in term_to_docs.items()}
+        # N of the TF-IDF ranker is the corpus size
+        total_documents = len(corpus_data)
+        idf = {term: math.log2(total_documents / df) for term, df in document_frequencies.items()}
+        timings["merge_ms"] = (time.perf_counter() - phase) * 1000
+
+        phase = time.perf_counter()
+        if executor is not None:
+            partial_lengths = list(executor.map(_partition_lengths, bounds, [idf] * len(bounds)))
+        else:
+            partial_lengths = [_partition_lengths(partition, idf) for partition in bounds]
+        doc_lengths: Dict[str, float] = {}
+        for lengths in partial_lengths:
+            doc_lengths.update(lengths)
+        timings["lengths_ms"] = (time.perf_counter() - phase) * 1000
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _init_worker(())
+
+    timings = {name: round(value, 1) for name, value in timings.items()}
+    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return ShardedBuild(
+        index,
+        {
+            "term_frequencies": term_frequencies,
+            "document_frequencies": document_frequencies,
+            "log_tf": log_tf,
+            "doc_lengths": doc_lengths,
+        },
+        workers=workers,
+        partitions=len(bounds),
+        timings=timings,
+    )
@@ -0,0 +1,377 @@
+"""
+Document-partitioned sharding over HTTP.
+Each shard is a SearchAlgorithm over the documents whose pid hashes to it, served by a small
+Flask app; a broker sends every query to all shards and merges their top-k (scatter-gather).
+
+Scores are comparable across shards because the broker sums the collection statistics of the
+shards (N, df, token count) and installs the totals on every shard before serving, so TF-IDF and
+BM25 use the global idf. A shard that does not answer within SHARD_TIMEOUT_MS is left out and the
+response is marked partial.
+
+Usage (all on one machine):
+    python -m myapp.search.sharding local <processed_corpus.json> <shards> [broker_port]
+    python -m myapp.search.sharding shard <processed_corpus.json> <index> <shards> <port>
+    python -m myapp.search.sharding broker <port> <shard_url> [shard_url ...]
+"""
+
+import heapq
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from flask import Flask, jsonify, request
+
+from myapp.search.algorithms import SearchAlgorithm
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+
+def shard_of(doc_id: str, shard_count: int) -> int:
+    """Shard of a document: stable hash of its pid (the same in every process and run)."""
+    return zlib.crc32(doc_id.encode('utf-8')) % shard_count
+
+
+def write_shard_corpus(corpus_path: str, shard_index: int, shard_count: int) -> str:
+    """
+    Write the documents of one shard next to the corpus as "<root>.shard<i>of<n>.json".
+
+    :return: Path of the shard corpus
+    """
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    documents = [doc for doc in corpus if doc.get('pid') and shard_of(doc['pid'], shard_count) == shard_index]
+    shard_path = f"{os.path.splitext(corpus_path)[0]}.shard{shard_index}of{shard_count}.json"
+    with open(shard_path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f, ensure_ascii=False)
+    return shard_path
+
+
+def build_shard(corpus_path: str, shard_index: int, shard_count: int) -> SearchAlgorithm:
+    shard_path = write_shard_corpus(corpus_path, shard_index, shard_count)
+    # One blob file per shard, whatever BLOB_STORE_PATH says
+    search_algorithm = SearchAlgorithm(shard_path, blob_store_path=os.path.splitext(shard_path)[0] + ".blobs")
+    # Relaxing on a shard's own result count would mix relaxed and exact results in the merged page
+    search_algorithm.query_relaxer.max_attempts = 0
+    return search_algorithm
+
+
+def create_shard_app(search_algorithm: SearchAlgorithm, shard_index: int, shard_count: int) -> Flask:
+    """
+    Flask app of one shard:
+    - GET /shard/health
+    - GET /shard/statistics: local N, token count and df (summed by the broker)
+    - PUT /shard/statistics: install the collection-wide totals
+    - GET /shard/search?q=<query>&k=<top k>&method=<ranking method>: local top-k as [pid, score]
+    """
+    app = Flask(f"shard{shard_index}")
+
+    @app.route('/shard/health', methods=['GET'])
+    def health():
+        return jsonify({
+            "shard": shard_index,
+            "shards": shard_count,
+            "documents": len(search_algorithm.corpus_data),
+            "global_statistics": search_algorithm.collection_statistics is not None,
+        })
+
+    @app.route('/shard/statistics', methods=['GET'])
+    def get_statistics():
+        return jsonify(dict(search_algorithm.get_collection_statistics(), shard=shard_index))
+
+    @app.route('/shard/statistics', methods=['PUT'])
+    def set_statistics():
+        data = request.get_json(force=True)
+        search_algorithm.set_collection_statistics(
+            documents=int(data["documents"]),
+            total_document_length=int(data["total_document_length"]),
+            document_frequencies=data["document_frequencies"],
+        )
+        return jsonify({"shard": shard_index, "installed": True})
+
+    @app.route('/shard/search', methods=['GET'])
+    def search():
+        start = time.perf_counter()
+        response = search_algorithm.execute(
+            request.args.get('q', ''),
+            top_k=max(1, int(request.args.get('k', 20))),
+            ranking_method=request.args.get('method') or None,
+        )
+        return jsonify({
+            "shard": shard_index,
+            "results": [[doc_id, score] for doc_id, score in response.results],
+            "total": response.total,
+            "ranking_fallback": response.ranking_fallback,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        })
+
+    return app
+
+
+class ShardBroker:
+    """
+    Scatter-gather over shard servers.
+
+    :param shard_urls: Base URLs of the shards (http://host:port)
+    :param timeout: Seconds to wait for the shards of one query; late shards are left out
+    :param statistics_timeout: Seconds to wait for a shard's statistics (full vocabulary)
+    """
+
+    def __init__(self, shard_urls: List[str], timeout: float = 1.0, statistics_timeout: float = 60.0):
+        if not shard_urls:
+            raise ValueError("A broker needs at least one shard")
+        self.shard_urls = [url.rstrip('/') for url in shard_urls]
+        self.timeout = timeout
+        self.statistics_timeout = statistics_timeout
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.shard_urls), thread_name_prefix="broker")
+        self._lock = threading.Lock()
+        self.collection: Optional[Dict[str, Any]] = None
+        self.queries = 0
+        self.partial_queries = 0
+        self.total_ms = 0.0
+        self.shard_counters: Dict[str, Dict[str, Any]] = {
+            url: {"requests": 0, "timeouts": 0, "failures": 0, "total_ms": 0.0} for url in self.shard_urls
+        }
+
+    @staticmethod
+    def _call(url: str, timeout: float, payload: Optional[Dict[str, Any]] = None) -> Any:
+        if payload is None:
+            req = Request(url)
+        else:
+            req = Request(url, data=json.dumps(payload).encode('utf-8'), method='PUT',
+                          headers={"Content-Type": "application/json"})
+        with urlopen(req, timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def refresh_statistics(self) -> Dict[str, Any]:
+        """
+        Sum N, token count and df over all shards and install the totals on every shard.
+        Run before serving and again after the shards' documents changed.
+        Raises if a shard does not answer: scores from partial statistics would not be comparable.
+        """
+        start = time.perf_counter()
+        shards = list(self._executor.map(
+            lambda url: self._call(f"{url}/shard/statistics", self.statistics_timeout), self.shard_urls
+        ))
+        document_frequencies: Dict[str, int] = {}
+        for shard in shards:
+            for term, df in shard["document_frequencies"].items():
+                document_frequencies[term] = document_frequencies.get(term, 0) + df
+        totals = {
+            "documents": sum(shard["documents"] for shard in shards),
+            "total_document_length": sum(shard["total_document_length"] for shard in shards),
+            "document_frequencies": document_frequencies,
+        }
+        list(self._executor.map(
+            lambda url: self._call(f"{url}/shard/statistics", self.statistics_timeout, totals), self.shard_urls
+        ))
+        self.collection = {
+            "shards": len(shards),
+            "documents": totals["documents"],
+            "documents_per_shard": [shard["documents"] for shard in shards],
+            "terms": len(document_frequencies),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return self.collection
+
+    def search(self, query: str, top_k: int = 20, ranking_method: Optional[str] = None, offset: int = 0) -> Dict[str, Any]:
+        """
+        Send the query to every shard, wait up to `timeout` and merge the answers.
+        Each shard returns its own first offset + top_k; the merged page is ordered by descending
+        score, then doc id, like SearchAlgorithm.execute on a single index.
+
+        :return: Merged page ([{"pid", "score", "shard"}]), total matches of the answering shards,
+                 and which shards timed out or failed (partial=True if any)
+        """
+        start = time.perf_counter()
+        count = offset + top_k
+        params = {"q": query, "k": count}
+        if ranking_method:
+            params["method"] = ranking_method
+        query_string = urlencode(params)
+        futures = {
+            self._executor.submit(self._call, f"{url}/shard/search?{query_string}", self.timeout): url
+            for url in self.shard_urls
+        }
+        done, not_done = wait(futures, timeout=self.timeout)
+
+        merged = []
+        total = 0
+        timed_out = [futures[future] for future in not_done]
+        failed: Dict[str, str] = {}
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            url = futures[future]
+            try:
+                answer = future.result()
+            except (socket.timeout, TimeoutError):
+                timed_out.append(url)
+                continue
+            except (URLError, OSError, ValueError) as e:
+                if isinstance(getattr(e, "reason", None), (socket.timeout, TimeoutError)):
+                    timed_out.append(url)
+                else:
+                    failed[url] = f"{type(e).__name__}: {e}"
+                continue
+            fallback = answer.get("ranking_fallback")
+            if fallback:
+                # Scores of another method cannot be merged with the other shards' scores
+                failed[url] = f"ranking method {fallback['requested']} is {fallback['state']} on the shard"
+                continue
+            total += answer["total"]
+            merged.extend((doc_id, score, answer["shard"]) for doc_id, score in answer["results"])
+            with self._lock:
+                self.shard_counters[url]["total_ms"] += answer["elapsed_ms"]
+
+        page = heapq.nsmallest(count, merged, key=lambda result: (-result[1], result[0]))[offset:]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        partial = bool(timed_out or failed)
+        with self._lock:
+            self.queries += 1
+            self.partial_queries += partial
+            self.total_ms += elapsed_ms
+            for url in self.shard_urls:
+                self.shard_counters[url]["requests"] += 1
+            for url in timed_out:
+                self.shard_counters[url]["timeouts"] += 1
+            for url in failed:
+                self.shard_counters[url]["failures"] += 1
+        return {
+            "query": query,
+            "results": [{"pid": doc_id, "score": score, "shard": shard} for doc_id, score, shard in page],
+            "total": total,
+            "partial": partial,
+            "shards": {
+                "queried": len(self.shard_urls),
+                "answered": len(self.shard_urls) - len(timed_out) - len(failed),
+                "timed_out": timed_out,
+                "failed": failed,
+            },
+            "elapsed_ms": round(elapsed_ms, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shards = {
+                url: {
+                    "requests": counters["requests"],
+                    "timeouts": counters["timeouts"],
+                    "failures": counters["failures"],
+                    "avg_shard_ms": round(
+                        counters["total_ms"] / max(1, counters["requests"] - counters["timeouts"] - counters["failures"]), 3
+                    ),
+                }
+                for url, counters in self.shard_counters.items()
+            }
+            return {
+                "queries": self.queries,
+                "partial_queries": self.partial_queries,
+                "avg_ms": round(self.total_ms / self.queries, 3) if self.queries else 0.0,
+                "timeout_ms": round(self.timeout * 1000, 1),
+                "collection": self.collection,
+                "shards": shards,
+            }
+
+
+def create_broker_app(broker: ShardBroker) -> Flask:
+    """
+    Flask app of the broker:
+    - GET /api/search?q=<query>&k=<top k>&method=<ranking method>&offset=<n>
+    - GET /api/shards: broker and per-shard counters
+    - POST /api/shards/statistics: recompute and reinstall the collection statistics
+    """
+    app = Flask("broker")
+
+    @app.route('/api/search', methods=['GET'])
+    def search():
+        try:
+            top_k = min(max(int(request.args.get('k', 20)), 1), 1000)
+            offset = max(int(request.args.get('offset', 0)), 0)
+        except ValueError:
+            return jsonify({"error": "k and offset must be integers"}), 400
+        return jsonify(broker.search(request.args.get('q', ''), top_k, request.args.get('method') or None, offset))
+
+    @app.route('/api/shards', methods=['GET'])
+    def shards():
+        return jsonify(broker.stats())
+
+    @app.route('/api/shards/statistics', methods=['POST'])
+    def refresh_statistics():
+        return jsonify(broker.refresh_statistics())
+
+    return app
+
+
+def _wait_for_shards(urls: List[str], processes: List[subprocess.Popen], timeout: float) -> None:
+    deadline = time.time() + timeout
+    pending = list(urls)
+    while pending:
+        if any(process.poll() is not None for process in processes):
+            raise RuntimeError("A shard process exited during startup")
+        if time.time() > deadline:
+            raise RuntimeError(f"Shards not ready after {timeout:.0f} s: {pending}")
+        for url in list(pending):
+            try:
+                ShardBroker._call(f"{url}/shard/health", 1.0)
+                pending.remove(url)
+            except (URLError, OSError):
+                pass
+        time.sleep(0.5)
+
+
+def run_local(corpus_path: str, shard_count: int, port: int = 8090) -> None:
+    """
+    Start `shard_count` shard servers as local processes (ports port+1 ...) and serve the broker on `port`.
+    """
+    corpus_path = os.path.abspath(corpus_path)
+    urls = [f"http://127.0.0.1:{port + 1 + index}" for index in range(shard_count)]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "myapp.search.sharding", "shard", corpus_path, str(index), str(shard_count),
+             str(port + 1 + index)],
+            cwd=PROJECT_ROOT,
+        )
+        for index in range(shard_count)
+    ]
+    # SIGTERM exits through the finally below, so the shard processes are not left behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        _wait_for_shards(urls, processes, timeout=float(os.getenv("SHARD_STARTUP_TIMEOUT", "600")))
+        broker = ShardBroker(urls, timeout=float(os.getenv("SHARD_TIMEOUT_MS", "1000")) / 1000)
+        print("Collection statistics:", broker.refresh_statistics())
+        create_broker_app(broker).run(host="127.0.0.1", port=port, threaded=True)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) >= 3 and argv[0] == "local":
+        run_local(argv[1], int(argv[2]), int(argv[3]) if len(argv) > 3 else 8090)
+    elif len(argv) == 5 and argv[0] == "shard":
+        shard_index, shard_count, port = int(argv[2]), int(argv[3]), int(argv[4])
+        search_algorithm = build_shard(argv[1], shard_index, shard_count)
+        create_shard_app(search_algorithm, shard_index, shard_count).run(host="127.0.0.1", port=port, threaded=False)
+    elif len(argv) >= 3 and argv[0] == "broker":
+        broker = ShardBroker(argv[2:], timeout=float(os.getenv("SHARD_TIMEOUT_MS", "1000")) / 1000)
+        print("Collection statistics:", broker.refresh_statistics())
+        create_broker_app(broker).run(host="127.0.0.1", port=int(argv[1]), threaded=True)
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,675 @@
+"""
+Read-only inverted index in a memory-mapped file, for serving from several processes.
+The postings, the ranking statistics and the document vectors are written once as flat arrays
+(CSR layout: term i owns postings term_postings[i]:term_postings[i + 1]) and every worker maps
+the same file, so their pages are held once in the OS page cache instead of once per process.
+Queries read the arrays in place; no per-term, per-posting or per-document Python object is shared
+between workers, so reference counting never copies a shared page into a worker. The precomputed
+pair intersections (PairIndex) are written the same way.
+
+File layout: magic, header length, JSON header (scalars and, per array, dtype, shape and offset),
+then the arrays at 64-byte aligned offsets.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+MAGIC = b"IRWASHX1"
+ALIGNMENT = 64
+# Postings decoded per step when a posting list is iterated
+DECODE_CHUNK = 4096
+
+
+def _posting_frequency(posting: List) -> int:
+    value = posting[1]
+    return value if isinstance(value, int) else len(value)
+
+
+def write_shared_index(
+    path: str,
+    index,
+    doc_ids: List[str],
+    tfidf_ranker,
+    bm25_ranker=None,
+    word2vec_ranker=None,
+    pair_index=None,
+) -> Dict[str, Any]:
+    """
+    Write an index and the statistics of its rankers as a shared index file.
+    The file is written next to `path` and renamed over it, so processes that still map
+    an older file keep reading it.
+
+    :param path: Destination file
+    :param index: InvertedIndex or SegmentedIndex (its live postings are written)
+    :param doc_ids: Documents in numbering order (the corpus order)
+    :param tfidf_ranker: TFIDFRanker whose N and document lengths are written
+    :param bm25_ranker: BM25Ranker whose N, k1, b and token counts are written (computed from the postings without one)
+    :param word2vec_ranker: Word2VecRanker whose document vectors are written, if any
+    :param pair_index: PairIndex whose intersections are written as doc numbers, if any
+    :return: Number of terms, postings and documents and the size of the file
+    """
+    start = time.perf_counter()
+    doc_numbers = {doc_id: number for number, doc_id in enumerate(doc_ids)}
+    # UTF-8 byte order is code point order, which is how the reader compares terms
+    terms = sorted((term.encode('utf-8') for term in index.term_to_docs), key=bytes)
+
+    term_offsets = array('q', [0])
+    term_postings = array('q', [0])
+    posting_docs = array('I')
+    posting_tf = array('I')
+    position_offsets = array('q', [0])
+    positions = array('I')
+    store_positions = index.store_positions
+    for term in terms:
+        postings = index.term_to_docs[term.decode('utf-8')]
+        term_offsets.append(term_offsets[-1] + len(term))
+        # Segments append updated documents out of corpus order; readers rely on ascending doc numbers
+        numbered = sorted((doc_numbers[posting[0]], posting) for posting in postings)
+        for number, posting in numbered:
+            posting_docs.append(number)
+            posting_tf.append(_posting_frequency(posting))
+            if store_positions:
+                positions.extend(posting[1])
+                position_offsets.append(len(positions))
+        term_postings.append(len(posting_docs))
+
+    documents = len(doc_ids)
+    tf = np.frombuffer(posting_tf, dtype=np.uint32)
+    docs = np.frombuffer(posting_docs, dtype=np.uint32)
+    token_counts = np.bincount(docs, weights=tf, minlength=documents).astype(np.uint32)
+    tfidf_lengths = np.array([tfidf_ranker.doc_lengths.get(doc_id, 1.0) for doc_id in doc_ids], dtype=np.float64)
+    pid_width = max((len(doc_id) for doc_id in doc_ids), default=1)
+    pids = np.array(doc_ids, dtype=f"<U{pid_width}")
+    pid_order = np.argsort(pids, kind="stable").astype(np.uint32)
+
+    arrays: Dict[str, np.ndarray] = {
+        "term_bytes": np.frombuffer(b"".join(terms), dtype=np.uint8),
+        "term_offsets": np.frombuffer(term_offsets, dtype=np.int64),
+        "term_postings": np.frombuffer(term_postings, dtype=np.int64),
+        "posting_docs": docs,
+        "posting_tf": tf,
+        "doc_ids": pids,
+        "sorted_doc_ids": pids[pid_order],
+        "sorted_doc_numbers": pid_order,
+        "tfidf_lengths": tfidf_lengths,
+        "token_counts": token_counts,
+    }
+    if store_positions:
+        arrays["position_offsets"] = np.frombuffer(position_offsets, dtype=np.int64)
+        arrays["positions"] = np.frombuffer(positions, dtype=np.uint32)
+
+    if bm25_ranker is not None:
+        bm25 = {
+            "k1": bm25_ranker.k1,
+            "b": bm25_ranker.b,
+            "documents": bm25_ranker.total_documents,
+            "total_document_length": bm25_ranker.total_document_length,
+            "avg_document_length": bm25_ranker.avg_document_length,
+        }
+        arrays["token_counts"] = np.array(
+            [bm25_ranker.document_lengths.get(doc_id, 0) for doc_id in doc_ids], dtype=np.uint32
+        )
+    else:
+        total_length = int(token_counts.sum())
+        bm25 = {
+            "k1": 1.2,
+            "b": 0.75,
+            "documents": tfidf_ranker.total_documents,
+            "total_document_length": total_length,
+            "avg_document_length": total_length / tfidf_ranker.total_documents if tfidf_ranker.total_documents else 0.0,
+        }
+
+    if word2vec_ranker is not None and word2vec_ranker.vector_dim:
+        vectors = np.zeros((documents, word2vec_ranker.vector_dim), dtype=np.float32)
+        has_vector = np.zeros(documents, dtype=bool)
+        for doc_id, vector in word2vec_ranker.doc_vectors.items():
+            number = doc_numbers.get(doc_id)
+            if number is not None:
+                vectors[number] = vector
+                has_vector[number] = True
+        arrays["doc_vectors"] = vectors
+        arrays["has_vector"] = has_vector
+
+    pairs = None
+    if pair_index is not None:
+        term_ids = {term.decode('utf-8'): term_id for term_id, term in enumerate(terms)}
+        pair_terms = array('I')
+        pair_offsets = array('q', [0])
+        pair_docs: List[np.ndarray] = []
+        for (term_a, term_b), pair_doc_ids in pair_index.pairs.items():
+            pair_terms.extend((term_ids[term_a], term_ids[term_b]))
+            pair_docs.append(np.sort(np.array([doc_numbers[doc_id] for doc_id in pair_doc_ids], dtype=np.uint32)))
+            pair_offsets.append(pair_offsets[-1] + len(pair_docs[-1]))
+        arrays["pair_terms"] = np.frombuffer(pair_terms, dtype=np.uint32).reshape(-1, 2)
+        arrays["pair_offsets"] = np.frombuffer(pair_offsets, dtype=np.int64)
+        arrays["pair_docs"] = np.concatenate(pair_docs) if pair_docs else np.empty(0, dtype=np.uint32)
+        pairs = {"memory_budget_bytes": pair_index.memory_budget_bytes, "build_ms": pair_index.build_ms}
+
+    header: Dict[str, Any] = {
+        "store_positions": store_positions,
+        "indexed_documents": index.total_documents,
+        "tfidf_documents": tfidf_ranker.total_documents,
+        "bm25": bm25,
+        "pairs": pairs,
+        "arrays": None,
+    }
+    # Offsets depend on the header length, which depends on the offsets: lay out until stable
+    while True:
+        header_bytes = json.dumps(header).encode('utf-8')
+        offset = len(MAGIC) + 8 + len(header_bytes)
+        layout = {}
+        for name, values in arrays.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            layout[name] = {"dtype": values.dtype.str, "shape": list(values.shape), "offset": offset}
+            offset += values.nbytes
+        if layout == header["arrays"]:
+            break
+        header["arrays"] = layout
+
+    temporary_path = f"{path}.tmp{os.getpid()}"
+    with open(temporary_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name, values in arrays.items():
+            f.write(b"\0" * (header["arrays"][name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(values).tobytes())
+    os.replace(temporary_path, path)
+    return {
+        "path": path,
+        "terms": len(terms),
+        "postings": len(posting_docs),
+        "documents": documents,
+        "bytes": os.path.getsize(path),
+        "write_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+class PostingList(Sequence):
+    """
+    Postings of one term, decoded from the shared arrays when read.
+    Items are [doc_id, positions] or [doc_id, tf], as in InvertedIndex; len() costs nothing.
+    """
+
+    __slots__ = ("_index", "_start", "_end")
+
+    def __init__(self, index: "SharedIndex", start: int, end: int):
+        self._index = index
+        self._start = start
+        self._end = end
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return self._index.decode_postings(self._start, self._end)[item]
+            return self._index.decode_postings(self._start + start, self._start + max(start, stop))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("posting index out of range")
+        return self._index.decode_postings(self._start + item, self._start + item + 1)[0]
+
+    def __iter__(self) -> Iterator[List]:
+        for start in range(self._start, self._end, DECODE_CHUNK):
+            yield from self._index.decode_postings(start, min(start + DECODE_CHUNK, self._end))
+
+    def doc_numbers(self) -> np.ndarray:
+        return self._index.posting_docs[self._start:self._end]
+
+
+class SharedPostings(Mapping):
+    """
+    Read-only term -> PostingList view of a SharedIndex.
+    Like the defaultdict of InvertedIndex, a missing term reads as an empty list.
+    """
+
+    def __init__(self, owner: "SharedIndex"):
+        self._owner = owner
+
+    def __getitem__(self, term: str):
+        return self._owner.postings(term)
+
+    def get(self, term: str, default=None):
+        return self._owner.postings(term) or default
+
+    def __contains__(self, term) -> bool:
+        return self._owner.term_id(term) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._owner.term(term_id) for term_id in range(self._owner.vocabulary_size))
+
+    def __len__(self) -> int:
+        return self._owner.vocabulary_size
+
+
+class SharedDocVectors(Mapping):
+    """doc_id -> averaged word vector (a row of the shared matrix) for Word2VecRanker.doc_vectors."""
+
+    def __init__(self, owner: "SharedIndex"):
+        self._owner = owner
+        self._vectors = owner.arrays["doc_vectors"]
+        self._has_vector = owner.arrays["has_vector"]
+
+    def __getitem__(self, doc_id: str) -> np.ndarray:
+        number = self._owner.doc_number(doc_id)
+        if number < 0 or not self._has_vector[number]:
+            raise KeyError(doc_id)
+        return self._vectors[number]
+
+    def __iter__(self) -> Iterator[str]:
+        doc_ids = self._owner.doc_ids
+        return (doc_ids[number] for number in np.flatnonzero(self._has_vector).tolist())
+
+    def __len__(self) -> int:
+        return int(self._has_vector.sum())
+
+
+class SharedIndex:
+    """
+    InvertedIndex interface over a shared index file (see write_shared_index).
+
+    Structure (documents are numbered in corpus order):
+    - term(i) = i-th term in UTF-8 order; term_postings[i]:term_postings[i + 1] = its postings
+    - posting_docs, posting_tf = doc number and tf of every posting, ascending doc numbers per term
+    - position_offsets[p]:position_offsets[p + 1] = positions of posting p (when stored)
+    - doc_ids[number] = pid; sorted_doc_ids / sorted_doc_numbers = pid -> number lookup
+    - tfidf_lengths, token_counts = TF-IDF length and token count per document
+    - doc_vectors, has_vector = averaged word vectors (when a Word2Vec ranker was written)
+    - pair_terms[i] = term ids of pair i; pair_offsets[i]:pair_offsets[i + 1] = its sorted doc numbers
+      in pair_docs (when a PairIndex was written, see SharedPairIndex)
+    Writes raise ValueError: the file is shared by processes that cannot see each other's changes.
+    """
+
+    posting_frequency = staticmethod(_posting_frequency)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        if hasattr(mmap, "MAP_POPULATE"):
+            # Mapped in full here, so the pages workers read are never mapped by a worker alone
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, flags=mmap.MAP_SHARED | mmap.MAP_POPULATE, prot=mmap.PROT_READ
+            )
+        else:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a shared index file")
+        (header_length,) = struct.unpack('<Q', self._mmap[len(MAGIC):len(MAGIC) + 8])
+        self.header = json.loads(self._mmap[len(MAGIC) + 8:len(MAGIC) + 8 + header_length])
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            self.arrays[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=spec["offset"]
+            ).reshape(spec["shape"])
+
+        self.store_positions: bool = self.header["store_positions"]
+        self.total_documents: int = self.header["indexed_documents"]
+        self._term_base = self.header["arrays"]["term_bytes"]["offset"]
+        self._term_offsets = self.arrays["term_offsets"]
+        self.term_postings = self.arrays["term_postings"]
+        self.posting_docs = self.arrays["posting_docs"]
+        self.posting_tf = self.arrays["posting_tf"]
+        self.doc_ids = self.arrays["doc_ids"]
+        self.vocabulary_size = len(self.term_postings) - 1
+        self.term_to_docs = SharedPostings(self)
+        self.doc_vectors: Optional[SharedDocVectors] = SharedDocVectors(self) if "doc_vectors" in self.arrays else None
+        # Bounded per process; repeated lookups of the terms of one query skip the binary search
+        self.term_id = lru_cache(maxsize=4096)(self._find_term)
+        # SearchAlgorithm takes it around ranker builds
+        self.lock = threading.RLock()
+        self.on_merge = None
+
+    def term(self, term_id: int) -> str:
+        start = self._term_base + int(self._term_offsets[term_id])
+        end = self._term_base + int(self._term_offsets[term_id + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def _find_term(self, term: str) -> int:
+        """Id of a term (binary search over the sorted vocabulary), -1 if it is not indexed."""
+        key = term.encode('utf-8')
+        data, base, offsets = self._mmap, self._term_base, self._term_offsets
+        low, high = 0, self.vocabulary_size
+        while low < high:
+            middle = (low + high) // 2
+            if data[base + int(offsets[middle]):base + int(offsets[middle + 1])] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.vocabulary_size and data[base + int(offsets[low]):base + int(offsets[low + 1])] == key:
+            return low
+        return -1
+
+    def posting_range(self, term: str) -> Tuple[int, int]:
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return 0, 0
+        return int(self.term_postings[term_id]), int(self.term_postings[term_id + 1])
+
+    def document_frequency(self, term: str) -> int:
+        start, end = self.posting_range(term)
+        return end - start
+
+    def postings(self, term: str):
+        start, end = self.posting_range(term)
+        if start == end:
+            return []
+        return PostingList(self, start, end)
+
+    def decode_postings(self, start: int, end: int) -> List[List]:
+        doc_ids = self.doc_ids[self.posting_docs[start:end]].tolist()
+        if not self.store_positions:
+            return list(map(list, zip(doc_ids, self.posting_tf[start:end].tolist())))
+        bounds = self.arrays["position_offsets"][start:end + 1].tolist()
+        positions = self.arrays["positions"][bounds[0]:bounds[-1]].tolist()
+        first = bounds[0]
+        return [
+            [doc_id, positions[low - first:high - first]]
+            for doc_id, low, high in zip(doc_ids, bounds, bounds[1:])
+        ]
+
+    def document_positions(self, term: str, doc_id: str) -> Optional[List[int]]:
+        """Positions of a term in one document (None if the document does not contain it)."""
+        start, end = self.posting_range(term)
+        number = self.doc_number(doc_id)
+        if start == end or number < 0 or not self.store_positions:
+            return None
+        slot = start + int(np.searchsorted(self.posting_docs[start:end], number))
+        if slot == end or self.posting_docs[slot] != number:
+            return None
+        offsets = self.arrays["position_offsets"]
+        return self.arrays["positions"][offsets[slot]:offsets[slot + 1]].tolist()
+
+    def doc_number(self, doc_id: str) -> int:
+        return int(self.doc_numbers_of([doc_id])[0])
+
+    def doc_numbers_of(self, doc_ids: Sequence) -> np.ndarray:
+        """Doc numbers of pids, aligned with the input; -1 for unknown pids."""
+        if not len(doc_ids):
+            return np.empty(0, dtype=np.int64)
+        sorted_ids = self.arrays["sorted_doc_ids"]
+        keys = np.array(doc_ids, dtype=str)
+        slots = np.minimum(np.searchsorted(sorted_ids, keys), len(sorted_ids) - 1)
+        found = sorted_ids[slots] == keys
+        return np.where(found, self.arrays["sorted_doc_numbers"][slots].astype(np.int64), -1)
+
+    def term_doc_numbers(self, term: str) -> np.ndarray:
+        start, end = self.posting_range(term)
+        return self.posting_docs[start:end]
+
+    def conjunctive_query(self, terms: List[str], initial_docs=None) -> Set[str]:
+        # Same contract as InvertedIndex.conjunctive_query, intersecting sorted doc number arrays;
+        # initial_docs may also be sorted doc numbers (a SharedPairIndex seed)
+        if isinstance(initial_docs, np.ndarray):
+            result = initial_docs.astype(np.uint32)
+            remaining_terms = terms
+        elif not terms:
+            return set(initial_docs) if initial_docs is not None else set()
+        elif initial_docs is not None:
+            numbers = self.doc_numbers_of(list(initial_docs))
+            result = np.unique(numbers[numbers >= 0]).astype(np.uint32)
+            remaining_terms = terms
+        else:
+            result = self.term_doc_numbers(terms[0])
+            remaining_terms = terms[1:]
+        for term in remaining_terms:
+            if not len(result):
+                break
+            result = np.intersect1d(result, self.term_doc_numbers(term), assume_unique=True)
+        return set(self.doc_ids[result].tolist())
+
+    def get_documents_for_term(self, term: str) -> Set[str]:
+        return set(self.doc_ids[self.term_doc_numbers(term)].tolist())
+
+    def get_vocabulary_stats(self) -> Dict[str, Any]:
+        return {
+            'total_terms': self.vocabulary_size,
+            'total_documents': self.total_documents,
+            'most_frequent_terms': self.get_most_frequent_terms(10),
+        }
+
+    def get_most_frequent_terms(self, n: int) -> List[tuple]:
+        frequencies = np.diff(self.term_postings)
+        top = np.argsort(-frequencies, kind="stable")[:n].tolist()
+        return [(self.term(term_id), int(frequencies[term_id])) for term_id in top]
+
+    def estimate_memory_bytes(self) -> int:
+        # Mapped, not on the heap: shared by every process mapping the file
+        return len(self._mmap)
+
+    def add_document(self, doc_id: str, tokens: Iterable[str]) -> None:
+        raise ValueError("The shared index is read-only")
+
+    def delete_document(self, doc_id: str, tokens: Iterable[str] = ()) -> None:
+        raise ValueError("The shared index is read-only")
+
+    def stop_merger(self) -> None:
+        # Nothing merges a read-only index
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shared": True,
+            "path": self.path,
+            "bytes": len(self._mmap),
+            "terms": self.vocabulary_size,
+            "postings": len(self.posting_docs),
+            "documents": len(self.doc_ids),
+            "term_cache": self.term_id.cache_info()._asdict(),
+        }
+
+
+class SharedPairIndex:
+    """
+    PairIndex.plan over the pair intersections of a shared index file.
+    Stored as sorted doc numbers rather than sets of pids: copying a set of pids (as PairIndex.plan
+    does) writes the reference count of every pid, and so copies into each worker the pages of the
+    parent's heap holding them. Seeds are doc number arrays for SharedIndex.conjunctive_query.
+    """
+
+    def __init__(self, index: SharedIndex):
+        settings = index.header["pairs"]
+        self.memory_budget_bytes = settings["memory_budget_bytes"]
+        self.build_ms = settings["build_ms"]
+        offsets = index.arrays["pair_offsets"].tolist()
+        docs = index.arrays["pair_docs"]
+        self.pairs: Dict[Tuple[str, str], np.ndarray] = {
+            (index.term(term_a), index.term(term_b)): docs[start:end]
+            for (term_a, term_b), start, end in zip(index.arrays["pair_terms"].tolist(), offsets, offsets[1:])
+        }
+        self.memory_bytes = docs.nbytes
+        self.planned_queries = 0
+        self.pairs_used = 0
+        self.updated_pairs = 0
+
+    def plan(self, terms: List[str]) -> Tuple[Optional[np.ndarray], List[str]]:
+        # Same cover as PairIndex.plan, cheapest pair first
+        pairs = self.pairs
+        uncovered = set(terms)
+        seed: Optional[np.ndarray] = None
+        used = 0
+        while len(uncovered) > 1:
+            options = [
+                (len(pairs[pair]), pair)
+                for pair in combinations(sorted(uncovered), 2)
+                if pair in pairs
+            ]
+            if not options:
+                break
+            _, pair = min(options)
+            docs = pairs[pair]
+            seed = docs if seed is None else np.intersect1d(seed, docs, assume_unique=True)
+            uncovered.difference_update(pair)
+            used += 1
+            if not len(seed):
+                break
+        self.planned_queries += 1
+        self.pairs_used += used
+        remaining = [term for term in dict.fromkeys(terms) if term in uncovered]
+        return seed, remaining
+
+    def apply_changes(self, removed: Iterable = (), added: Iterable = ()) -> int:
+        raise ValueError("The shared index is read-only")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pairs": len(self.pairs),
+            "memory_bytes": self.memory_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "build_ms": round(self.build_ms, 2),
+            "planned_queries": self.planned_queries,
+            "pairs_used": self.pairs_used,
+            "updated_pairs": self.updated_pairs,
+            "shared": True,
+        }
+
+
+def _candidate_keys(index: SharedIndex, doc_ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (doc numbers with -1 for unknown pids, the same numbers as uint32 search keys).
+    Unknown pids become 0xFFFFFFFF, which matches no posting; keys of the posting dtype
+    keep searchsorted from converting whole posting lists.
+    """
+    numbers = index.doc_numbers_of(doc_ids)
+    return numbers, numbers.astype(np.uint32)
+
+
+def _candidate_positions(docs: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(mask of the candidates in a posting list, their posting indexes) for sorted `docs`."""
+    slots = np.minimum(np.searchsorted(docs, keys), len(docs) - 1)
+    found = docs[slots] == keys
+    return found, slots[found]
+
+
+class SharedTFIDFRanker:
+    """
+    TFIDFRanker.score_documents over a SharedIndex, term at a time over the candidates.
+    Scores are bit-for-bit those of TFIDFRanker: the same float operations run in the same
+    order (per document, query terms are accumulated in query order).
+    """
+
+    def __init__(self, index: SharedIndex):
+        self.index = index
+        self.total_documents: int = index.header["tfidf_documents"]
+        self.doc_lengths = index.arrays["tfidf_lengths"]
+        max_tf = int(index.posting_tf.max()) if len(index.posting_tf) else 0
+        # 1 + log2(tf) by tf, computed with math.log2 as TFIDFRanker does
+        self.log_tf_table = np.array([0.0] + [1.0 + math.log2(freq) for freq in range(1, max_tf + 1)])
+
+    def calculate_idf(self, term: str) -> float:
+        df = self.index.document_frequency(term)
+        if df == 0:
+            return 0.0
+        return math.log2(self.total_documents / df)
+
+    def rank_documents(self, query_terms: List[str], candidate_docs: Set[str]) -> List[Tuple[str, float]]:
+        scored_docs = self.score_documents(query_terms, candidate_docs)
+        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        return scored_docs
+
+    def score_documents(
+        self, query_terms: List[str], candidate_docs: Set[str], term_weights: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        doc_ids = list(candidate_docs)
+        numbers, keys = _candidate_keys(self.index, doc_ids)
+        dot_products = np.zeros(len(doc_ids))
+        query_term_counts = Counter(query_terms)
+        for term in query_terms:
+            start, end = self.index.posting_range(term)
+            if start == end:
+                continue
+            idf = self.calculate_idf(term)
+            query_weight = (1.0 + math.log2(query_term_counts[term])) * idf
+            if term_weights is not None:
+                query_weight *= term_weights.get(term, 1.0)
+            found, slots = _candidate_positions(self.index.posting_docs[start:end], keys)
+            doc_weights = self.log_tf_table[self.index.posting_tf[start:end][slots]] * idf
+            dot_products[found] += query_weight * doc_weights
+        lengths = np.where(numbers >= 0, self.doc_lengths[np.maximum(numbers, 0)], 1.0)
+        scores = np.divide(dot_products, lengths, out=np.zeros(len(doc_ids)), where=lengths > 0)
+        return list(zip(doc_ids, scores.tolist()))
+
+    def add_document(self, doc: Dict) -> None:
+        raise ValueError("The shared index is read-only")
+
+    def remove_document(self, doc: Dict) -> None:
+        raise ValueError("The shared index is read-only")
+
+
+class SharedBM25Ranker:
+    """
+    BM25Ranker.score_documents over a SharedIndex, with the parameters and collection
+    statistics written with the index. Scores are bit-for-bit those of BM25Ranker.
+    """
+
+    def __init__(self, index: SharedIndex):
+        statistics = index.header["bm25"]
+        self.index = index
+        self.k1: float = statistics["k1"]
+        self.b: float = statistics["b"]
+        self.total_documents: int = statistics["documents"]
+        self.total_document_length: int = statistics["total_document_length"]
+        self.avg_document_length: float = statistics["avg_document_length"]
+        self.document_lengths = index.arrays["token_counts"]
+
+    def idf(self, term: str) -> float:
+        df = self.index.document_frequency(term)
+        if df <= 0 or self.total_documents <= 0:
+            return 0.0
+        return math.log(self.total_documents / df)
+
+    def rank_documents(self, query_terms: List[str], candidate_docs: Set[str]) -> List[Tuple[str, float]]:
+        scores = self.score_documents(query_terms, candidate_docs)
+        scores.sort(key=lambda x: x[1], reverse=True)
+        return scores
+
+    def score_documents(
+        self, query_terms: List[str], candidate_docs: Set[str], term_weights: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        doc_ids = list(candidate_docs)
+        numbers, keys = _candidate_keys(self.index, doc_ids)
+        scores = np.zeros(len(doc_ids))
+        # Same construction as BM25Ranker, so terms are summed in the same order
+        idf_map = {t: self.idf(t) for t in set(query_terms) if self.index.document_frequency(t)}
+        if term_weights is not None:
+            idf_map = {t: idf_val * term_weights.get(t, 1.0) for t, idf_val in idf_map.items()}
+        doc_lengths = np.where(numbers >= 0, self.document_lengths[np.maximum(numbers, 0)], 0).astype(np.float64)
+        if self.avg_document_length > 0:
+            relative_lengths = doc_lengths / self.avg_document_length
+        else:
+            relative_lengths = np.zeros(len(doc_ids))
+        length_norms = self.k1 * (1.0 - self.b + self.b * relative_lengths)
+        for term, idf_val in idf_map.items():
+            start, end = self.index.posting_range(term)
+            found, slots = _candidate_positions(self.index.posting_docs[start:end], keys)
+            tf = self.index.posting_tf[start:end][slots].astype(np.float64)
+            denominators = tf + length_norms[found]
+            tf_components = np.divide(
+                tf * (self.k1 + 1.0), denominators, out=np.zeros(len(tf)), where=denominators != 0.0
+            )
+            scores[found] += idf_val * tf_components
+        return list(zip(doc_ids, scores.tolist()))
+
+    def add_document(self, doc: Dict) -> None:
+        raise ValueError("The shared index is read-only")
+
+    def remove_document(self, doc: Dict) -> None:
+        raise ValueError("The shared index is read-only")
@@ -0,0 +1,189 @@
+"""
+Typo-tolerant term matching over the index vocabulary (SymSpell).
+Every vocabulary term is stored under the strings obtained by deleting up to
+`max_distance` characters from its prefix; a misspelled query term is looked up by
+generating its own deletes, so candidates are found with a handful of dictionary
+lookups instead of a scan of the vocabulary. Candidates are then verified with the
+(optimal string alignment) Damerau-Levenshtein distance.
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (insert, delete, substitute, transpose adjacent).
+    Returns max_distance + 1 as soon as the distance is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymSpellIndex:
+    """
+    Structure:
+    - frequencies[term] = document frequency of the vocabulary term
+    - deletes[key] = vocabulary terms whose prefix becomes `key` after up to max_distance deletions
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.frequencies: Dict[str, int] = {}
+        self.deletes: Dict[str, List[str]] = {}
+        self.build_ms = 0.0
+
+    @classmethod
+    def build(cls, term_frequencies: Mapping[str, int], max_distance: int = 2, prefix_length: int = 7) -> "SymSpellIndex":
+        """
+        :param term_frequencies: Vocabulary term -> document frequency
+        :param max_distance: Largest edit distance that can be looked up
+        :param prefix_length: Only this many leading characters generate deletes (bounds memory)
+        """
+        start = time.perf_counter()
+        index = cls(max_distance, prefix_length)
+        for term, frequency in term_frequencies.items():
+            index.add_term(term, frequency)
+        index.build_ms = (time.perf_counter() - start) * 1000
+        return index
+
+    def add_term(self, term: str, frequency: int) -> None:
+        if term in self.frequencies:
+            self.frequencies[term] = frequency
+            return
+        self.frequencies[term] = frequency
+        for key in self._deletes(term[:self.prefix_length], self.max_distance):
+            self.deletes.setdefault(key, []).append(term)
+
+    @staticmethod
+    def _deletes(word: str, max_distance: int) -> Set[str]:
+        # The word itself and every string reachable by deleting up to max_distance characters
+        result = {word}
+        frontier = {word}
+        for _ in range(max_distance):
+            next_frontier = set()
+            for candidate in frontier:
+                if len(candidate) <= 1:
+                    continue
+                for i in range(len(candidate)):
+                    next_frontier.add(candidate[:i] + candidate[i + 1:])
+            next_frontier -= result
+            result |= next_frontier
+            frontier = next_frontier
+        return result
+
+    def lookup(self, term: str, max_distance: Optional[int] = None, limit: int = 3) -> Tuple[List[Tuple[str, int]], int]:
+        """
+        Closest vocabulary terms, nearest first and most frequent first among equals.
+
+        :param term: Out-of-vocabulary (stemmed) query term
+        :param max_distance: Edit distance limit (capped at the distance the index was built for)
+        :param limit: Maximum number of suggestions
+        :return: ([(vocabulary term, distance)], number of candidates verified)
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        seen: Set[str] = set()
+        matches: List[Tuple[int, int, str]] = []
+        verified = 0
+        for key in self._deletes(term[:self.prefix_length], max_distance):
+            for candidate in self.deletes.get(key, ()):
+                if candidate in seen or candidate == term:
+                    continue
+                seen.add(candidate)
+                verified += 1
+                distance = edit_distance(term, candidate, max_distance)
+                if distance <= max_distance:
+                    matches.append((distance, -self.frequencies[candidate], candidate))
+        matches.sort()
+        return [(candidate, distance) for distance, _, candidate in matches[:limit]], verified
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "terms": len(self.frequencies),
+            "delete_keys": len(self.deletes),
+            "max_distance": self.max_distance,
+            "prefix_length": self.prefix_length,
+            "build_ms": round(self.build_ms, 2),
+        }
+
+
+class FuzzyTermExpander:
+    """
+    Expands out-of-vocabulary query terms into their nearest vocabulary terms under a budget:
+    at most `max_expansions` terms per misspelled term and `max_total_expansions` per query.
+    Short terms only tolerate one edit.
+    """
+
+    def __init__(
+        self,
+        spelling_index: SymSpellIndex,
+        max_expansions: int = 3,
+        max_total_expansions: int = 6,
+        short_term_length: int = 4,
+    ):
+        self.spelling_index = spelling_index
+        self.max_expansions = max_expansions
+        self.max_total_expansions = max_total_expansions
+        self.short_term_length = short_term_length
+        self.oov_queries = 0
+        self.expanded_queries = 0
+        self.unresolved_terms = 0
+        self.total_ms = 0.0
+
+    def expand(self, terms: Iterable[str], vocabulary: Mapping[str, Any]) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+        """
+        :param terms: Preprocessed query terms
+        :param vocabulary: Index vocabulary (term_to_docs)
+        :return: ({oov term: [vocabulary terms]}, per-query cost report)
+        """
+        start = time.perf_counter()
+        expansions: Dict[str, List[str]] = {}
+        report: Dict[str, Any] = {"oov_terms": [], "expansions": {}, "candidates_verified": 0, "budget_exhausted": False}
+        budget = self.max_total_expansions
+        for term in dict.fromkeys(terms):
+            if term in vocabulary:
+                continue
+            report["oov_terms"].append(term)
+            if budget <= 0:
+                report["budget_exhausted"] = True
+                continue
+            max_distance = 1 if len(term) <= self.short_term_length else None
+            suggestions, verified = self.spelling_index.lookup(
+                term, max_distance=max_distance, limit=min(self.max_expansions, budget)
+            )
+            report["candidates_verified"] += verified
+            if suggestions:
+                expansions[term] = [candidate for candidate, _ in suggestions]
+                report["expansions"][term] = [[candidate, distance] for candidate, distance in suggestions]
+                budget -= len(suggestions)
+            else:
+                self.unresolved_terms += 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        report["elapsed_ms"] = round(elapsed_ms, 3)
+        self.oov_queries += 1
+        self.expanded_queries += bool(expansions)
+        self.total_ms += elapsed_ms
+        return expansions, report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.spelling_index.stats(),
+            "oov_queries": self.oov_queries,
+            "expanded_queries": self.expanded_queries,
+            "unresolved_terms": self.unresolved_terms,
+            "avg_ms": round(self.total_ms / self.oov_queries, 3) if self.oov_queries else 0.0,
+        }
@@ -0,0 +1,195 @@
+"""
+Query autocomplete backed by sorted arrays and binary search.
+Two sources are kept apart: past queries (weighted by how often they were searched)
+and vocabulary words (weighted by document frequency). Completions of a prefix are a
+contiguous range of a sorted array, found with bisect; the top-k of every short prefix
+is precomputed so that prefixes of up to three letters, whose ranges are huge, cost a dict lookup.
+"""
+
+import heapq
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from myapp.search.preprocessing import STEMMER
+
+WORD_PATTERN = re.compile(r"[a-z][a-z-]+")
+
+
+def surface_forms(corpus_data: Iterable[Dict[str, Any]], fields: Sequence[str] = ("title",)) -> Dict[str, str]:
+    """
+    Map stems back to readable words: the most frequent word of the given raw text fields
+    producing each stem.
+
+    :param corpus_data: Documents with their original text fields
+    :param fields: Raw text fields to read words from
+    :return: {stem: word}
+    """
+    stems: Dict[str, str] = {}
+    surface_counts: Dict[str, Counter] = {}
+    for doc in corpus_data:
+        for field in fields:
+            for word in WORD_PATTERN.findall(str(doc.get(field) or "").lower()):
+                stem = stems.get(word)
+                if stem is None:
+                    stem = stems[word] = STEMMER.stem(word)
+                surface_counts.setdefault(stem, Counter())[word] += 1
+    return {stem: counts.most_common(1)[0][0] for stem, counts in surface_counts.items()}
+
+
+def vocabulary_completions(inverted_index, corpus_data: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Readable title words of the indexed stems, weighted by the stem's document frequency.
+
+    :param inverted_index: Built InvertedIndex (stemmed vocabulary)
+    :param corpus_data: Documents with their original 'title'
+    :return: {word: document frequency}
+    """
+    term_to_docs = inverted_index.term_to_docs
+    return {
+        word: len(term_to_docs[stem])
+        for stem, word in surface_forms(corpus_data).items()
+        if stem in term_to_docs
+    }
+
+
+class _SortedCompletions:
+    """
+    One source of completions: sorted keys, their weights and the precomputed
+    top-k of every prefix up to `precompute_length` characters.
+    """
+
+    def __init__(self, weights: Mapping[str, float], top_k: int, precompute_length: int):
+        self.top_k = top_k
+        self.precompute_length = precompute_length
+        self.weights: Dict[str, float] = dict(weights)
+        self.keys: List[str] = sorted(self.weights)
+        self.head: Dict[str, List[Tuple[float, str]]] = {}
+        for key in self.keys:
+            for prefix in self._short_prefixes(key):
+                self.head.setdefault(prefix, []).append((-self.weights[key], key))
+        for prefix, entries in self.head.items():
+            entries.sort()
+            del entries[top_k:]
+
+    def _short_prefixes(self, key: str) -> Iterable[str]:
+        return (key[:length] for length in range(1, min(len(key), self.precompute_length) + 1))
+
+    def complete(self, prefix: str, k: int, max_scan: int) -> List[Tuple[float, str]]:
+        if k <= self.top_k and len(prefix) <= self.precompute_length:
+            return [(-neg_weight, key) for neg_weight, key in self.head.get(prefix, ())[:k]]
+        start = bisect_left(self.keys, prefix)
+        # Keys sharing the prefix sort right after it; stop at the first key that does not match
+        candidates = []
+        for key in self.keys[start:start + max_scan]:
+            if not key.startswith(prefix):
+                break
+            candidates.append((self.weights[key], key))
+        return heapq.nlargest(k, candidates)
+
+    def update(self, key: str, weight: float) -> None:
+        if key not in self.weights:
+            insort(self.keys, key)
+        self.weights[key] = weight
+        for prefix in self._short_prefixes(key):
+            entries = [entry for entry in self.head.get(prefix, ()) if entry[1] != key]
+            entries.append((-weight, key))
+            entries.sort()
+            self.head[prefix] = entries[:self.top_k]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class PrefixSuggester:
+    """
+    Structure:
+    - queries: past normalized queries, weight 1 + log(1 + count), completed on the whole prefix
+    - terms: vocabulary words, weight log(1 + df) / log(1 + max df) (always below any past query),
+      completed on the last word of the prefix
+    """
+
+    def __init__(
+        self,
+        query_counts: Mapping[str, int],
+        term_frequencies: Mapping[str, int],
+        top_k: int = 10,
+        precompute_length: int = 3,
+        max_scan: int = 5000,
+    ):
+        self.top_k = top_k
+        self.max_scan = max_scan
+        self.query_counts: Counter = Counter({query: count for query, count in query_counts.items() if query})
+        max_df = max(term_frequencies.values(), default=1)
+        self._df_norm = math.log1p(max_df) or 1.0
+        self.queries = _SortedCompletions(
+            {query: self._query_weight(count) for query, count in self.query_counts.items()},
+            top_k,
+            precompute_length,
+        )
+        self.terms = _SortedCompletions(
+            {term: math.log1p(df) / self._df_norm for term, df in term_frequencies.items()},
+            top_k,
+            precompute_length,
+        )
+        self.requests = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _query_weight(count: int) -> float:
+        return 1.0 + math.log1p(count)
+
+    def suggest(self, prefix: str, k: int = 8) -> List[Dict[str, Any]]:
+        """
+        Top-k completions of what the user typed so far, past queries first.
+
+        :param prefix: Raw text of the search box
+        :param k: Number of completions
+        :return: [{"text", "source", "weight"}]
+        """
+        start = time.perf_counter()
+        prefix = " ".join(prefix.lower().split()) + (" " if prefix[-1:].isspace() else "")
+        suggestions: List[Dict[str, Any]] = []
+        if prefix.strip():
+            with self._lock:
+                seen = set()
+                for weight, query in self.queries.complete(prefix, k, self.max_scan):
+                    seen.add(query)
+                    suggestions.append({"text": query, "source": "query", "weight": round(weight, 4)})
+                head, _, last_word = prefix.rpartition(" ")
+                if last_word and len(suggestions) < k:
+                    lead = f"{head} " if head else ""
+                    for weight, term in self.terms.complete(last_word, k, self.max_scan):
+                        text = lead + term
+                        if text in seen:
+                            continue
+                        suggestions.append({"text": text, "source": "term", "weight": round(weight, 4)})
+                        if len(suggestions) == k:
+                            break
+        self.requests += 1
+        self.total_ms += (time.perf_counter() - start) * 1000
+        return suggestions[:k]
+
+    def record_query(self, query: str, count: int = 1) -> None:
+        """
+        Incremental update after a search: the query becomes (or moves up as) a completion.
+        """
+        normalized = " ".join(query.lower().split())
+        if not normalized:
+            return
+        with self._lock:
+            self.query_counts[normalized] += count
+            self.queries.update(normalized, self._query_weight(self.query_counts[normalized]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queries": len(self.queries),
+            "terms": len(self.terms),
+            "requests": self.requests,
+            "avg_ms": round(self.total_ms / self.requests, 4) if self.requests else 0.0,
+        }
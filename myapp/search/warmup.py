@@ -0,0 +1,119 @@
+"""
+Query cache warm-up from the persisted analytics query log.
+After a restart the head queries are ranked ahead of traffic so the first users
+hitting them are served from the query result cache.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from myapp.analytics.analytics_data import AnalyticsData
+
+
+def warm_up_cache(
+    search_algorithm,
+    queries: List[str],
+    methods: Optional[List[str]] = None,
+    top_k: int = 20,
+    facets: bool = True,
+) -> Dict[str, Any]:
+    """
+    Rank every query with every method and store the results in the query cache.
+    Queries run with the options of the results page (web_app search_form_post: first page,
+    relevance order, no filters, facets), since those are part of the cache key.
+    Methods whose ranker is still being built in the background (or failed) are skipped:
+    their queries would rank with the fallback method, which is not cached.
+
+    :param search_algorithm: Initialized SearchAlgorithm
+    :param queries: Normalized queries, most important first
+    :param methods: Ranking methods to warm (defaults to all enabled methods)
+    :param top_k: Result count used by the web application
+    :param facets: Whether the web application requests facet counts
+    :return: Report with the number of warmed entries, failures and skipped methods and elapsed time
+    """
+    methods = methods or list(search_algorithm.enabled_methods)
+    start = time.perf_counter()
+    warmed = 0
+    failures: Dict[str, str] = {}
+    skipped: Dict[str, str] = {}
+    ranker_status = search_algorithm.get_ranker_status()
+    for method in methods:
+        state = ranker_status.get(method, {}).get("state")
+        if state in ("pending", "building", "failed"):
+            skipped[method] = state
+            continue
+        for query in queries:
+            try:
+                search_algorithm.execute(
+                    query,
+                    top_k=top_k,
+                    ranking_method=method,
+                    facets=facets,
+                    sort_by=search_algorithm.DEFAULT_SORT,
+                )
+            except Exception as e:
+                # e.g. Word2Vec without gensim or without a reachable model
+                failures[method] = str(e)
+                break
+            warmed += 1
+    return {
+        "queries": len(queries),
+        "methods": methods,
+        "warmed_entries": warmed,
+        "failures": failures,
+        "skipped": skipped,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def warm_up_from_query_log(
+    search_algorithm,
+    query_log_path: Optional[str],
+    top_n: int = 50,
+    methods: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Warm the cache with the top-N normalized queries of a persisted query log.
+    """
+    if not query_log_path:
+        return {"queries": 0, "warmed_entries": 0, "failures": {}, "elapsed_ms": 0.0}
+    queries = AnalyticsData.read_top_queries(query_log_path, limit=top_n)
+    return warm_up_cache(search_algorithm, queries, methods=methods)
+
+
+class CacheWarmer:
+    """
+    Background thread that re-runs the warm-up on a fixed interval,
+    keeping head queries cached after their TTL expires.
+    """
+
+    def __init__(
+        self,
+        search_algorithm,
+        query_log_path: str,
+        top_n: int = 50,
+        interval_seconds: float = 600.0,
+        methods: Optional[List[str]] = None,
+    ):
+        self.search_algorithm = search_algorithm
+        self.query_log_path = query_log_path
+        self.top_n = top_n
+        self.methods = methods
+        self.interval_seconds = interval_seconds
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+
+    def start(self) -> "CacheWarmer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.last_report = warm_up_from_query_log(
+                self.search_algorithm, self.query_log_path, self.top_n, self.methods
+            )
@@ -1,4 +1,5 @@
 import json
+import sys
 from collections import defaultdict
 from typing import Dict, List, Set, Any
 from array import array
@@ -12,11 +13,15 @@ class InvertedIndex:
     Structure:
     - term_to_docs[term] = [[doc_id, array([pos1, pos2, ...])], [doc_id, array([pos1, pos2, ...])], ...]
     - Each posting contains: [document_id, array of term positions in that document]
+    
+    With store_positions=False the index is built in frequency-only mode and each posting is
+    [document_id, term frequency]. Use posting_frequency() to read tf in either mode.
     """
     
-    def __init__(self):
+    def __init__(self, store_positions: bool = True):
         self.term_to_docs: Dict[str, List[List]] = defaultdict(list)
         self.total_documents: int = 0
+        self.store_positions = store_positions
     
     def add_document(self, doc_id: str, tokens: List[str]) -> None:
         if not tokens:
@@ -27,9 +32,12 @@ class InvertedIndex:
         for position, term in enumerate(tokens):
             term_positions[term].append(position)
         
-        # Add postings to the index: [doc_id, array of positions]
+        # Add postings to the index: [doc_id, array of positions] or [doc_id, tf]
         for term, positions in term_positions.items():
-            posting = [doc_id, array('I', positions)]  # 'I' = unsigned int
+            if self.store_positions:
+                posting = [doc_id, array('I', positions)]  # 'I' = unsigned int
+            else:
+                posting = [doc_id, len(positions)]
             self.term_to_docs[term].append(posting)
         
         self.total_documents += 1
@@ -56,20 +64,26 @@ class InvertedIndex:
             # Debug: Show first 10 terms in the inverted index
             self.debug_print_index_samples(n=10)
     
-    def conjunctive_query(self, terms: List[str]) -> Set[str]:
+    def conjunctive_query(self, terms: List[str], initial_docs: Set[str] = None) -> Set[str]:
+        # initial_docs: optional candidate set already known to match other terms (e.g. a previous query)
         if not terms:
-            return set()
+            return set(initial_docs) if initial_docs is not None else set()
         
         # Extract document IDs from postings: posting = [doc_id, array(positions)]
         def get_doc_ids(term: str) -> Set[str]:
             postings = self.term_to_docs.get(term, [])
             return {posting[0] for posting in postings}
         
-        # Start with documents containing the first term
-        result = get_doc_ids(terms[0])
+        # Start with the given candidates or with documents containing the first term
+        if initial_docs is not None:
+            result = set(initial_docs)
+            remaining_terms = terms
+        else:
+            result = get_doc_ids(terms[0])
+            remaining_terms = terms[1:]
         
         # Intersect with documents containing each subsequent term
-        for term in terms[1:]:
+        for term in remaining_terms:
             term_docs = get_doc_ids(term)
             result = result.intersection(term_docs)
             
@@ -79,6 +93,21 @@ class InvertedIndex:
         
         return result
     
+    @staticmethod
+    def posting_frequency(posting: List) -> int:
+        # Term frequency of a posting, whether it stores positions or only the count
+        value = posting[1]
+        return value if isinstance(value, int) else len(value)
+    
+    def estimate_memory_bytes(self) -> int:
+        # Approximate heap size of the postings (dict, posting lists, postings and position arrays)
+        total = sys.getsizeof(self.term_to_docs)
+        for postings in self.term_to_docs.values():
+            total += sys.getsizeof(postings)
+            for posting in postings:
+                total += sys.getsizeof(posting) + sys.getsizeof(posting[1])
+        return total
+    
     def get_documents_for_term(self, term: str) -> Set[str]:
         # We get all document IDs containing the given term
         postings = self.term_to_docs.get(term, [])
@@ -103,7 +132,8 @@ class InvertedIndex:
         for i, (term, postings) in enumerate(list(self.term_to_docs.items())[:n]):
             print(f"\n'{term}': {len(postings)} documents")
             for j, posting in enumerate(postings[:3]):
-                print(f"  [{posting[0]}, {list(posting[1])}]")
+                value = posting[1] if isinstance(posting[1], int) else list(posting[1])
+                print(f"  [{posting[0]}, {value}]")
             if len(postings) > 3:
                 print(f"  ... ({len(postings) - 3} more)")
 
@@ -1,5 +1,5 @@
 import math
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Optional, Tuple, Set
 from collections import Counter, defaultdict
 from inverted_index import InvertedIndex
 
@@ -28,7 +28,28 @@ class TFIDFRanker:
         self.document_frequencies = self.build_document_frequencies()        
         self.log_tf = self.build_log_tf()
         self.doc_lengths = self.build_document_lengths()
-    
+
+    @classmethod
+    def from_statistics(
+        cls,
+        inverted_index: InvertedIndex,
+        corpus_data: List[Dict],
+        term_frequencies: Dict[Tuple[str, str], int],
+        document_frequencies: Dict[str, int],
+        log_tf: Dict[Tuple[str, str], float],
+        doc_lengths: Dict[str, float],
+    ) -> "TFIDFRanker":
+        # Ranker over statistics computed elsewhere (e.g. by a parallel build), skipping the precomputation
+        ranker = cls.__new__(cls)
+        ranker.index = inverted_index
+        ranker.corpus_data = corpus_data
+        ranker.total_documents = len(corpus_data)
+        ranker.term_frequencies = term_frequencies
+        ranker.document_frequencies = document_frequencies
+        ranker.log_tf = log_tf
+        ranker.doc_lengths = doc_lengths
+        return ranker
+
     def build_term_frequencies(self) -> Dict[Tuple[str, str], int]:
         # We build tf from the inverted index positions
         term_freqs = {}
@@ -37,9 +58,8 @@ class TFIDFRanker:
         for term, postings in self.index.term_to_docs.items():
             for posting in postings:
                 doc_id = posting[0]
-                positions = posting[1]  # array of positions
                 # Term frequency is the number of times the term appears (length of positions array)
-                term_freqs[(term, doc_id)] = len(positions)
+                term_freqs[(term, doc_id)] = self.index.posting_frequency(posting)
         
         return term_freqs
     
@@ -60,8 +80,7 @@ class TFIDFRanker:
         for term, postings in self.index.term_to_docs.items():
             for posting in postings:
                 doc_id = posting[0]
-                positions = posting[1]
-                raw_freq = len(positions)
+                raw_freq = self.index.posting_frequency(posting)
                 
                 # Formula: tf = 1 + log₂(freq)
                 if raw_freq > 0:
@@ -83,8 +102,7 @@ class TFIDFRanker:
             
             for posting in postings:
                 doc_id = posting[0]
-                positions = posting[1]
-                raw_freq = len(positions)
+                raw_freq = self.index.posting_frequency(posting)
                 
                 # Calculate TF-IDF weight: (1 + log₂ freq) × idf
                 if raw_freq > 0:
@@ -98,7 +116,56 @@ class TFIDFRanker:
             doc_lengths[doc_id] = math.sqrt(sum(w ** 2 for w in weights))
         
         return doc_lengths
-    
+
+    def add_document(self, doc: Dict) -> None:
+        # Incremental update for a document just added to the index: N, df and its tf entries are exact,
+        # its length uses the current idf (refresh_document_lengths() brings every length up to date)
+        doc_id = doc.get('pid')
+        tokens = doc.get('tokens', [])
+        if isinstance(tokens, str):
+            tokens = tokens.split()
+        term_counts = Counter(tokens)
+
+        self.total_documents += 1
+        for term, freq in term_counts.items():
+            self.document_frequencies[term] = self.document_frequencies.get(term, 0) + 1
+            self.term_frequencies[(term, doc_id)] = freq
+            self.log_tf[(term, doc_id)] = 1.0 + math.log2(freq)
+
+        if term_counts:
+            weights = [self.log_tf[(term, doc_id)] * self.calculate_idf(term) for term in term_counts]
+            self.doc_lengths[doc_id] = math.sqrt(sum(w ** 2 for w in weights))
+
+    def remove_document(self, doc: Dict) -> None:
+        # Inverse of add_document for a document removed from the index (doc holds its indexed tokens)
+        doc_id = doc.get('pid')
+        tokens = doc.get('tokens', [])
+        if isinstance(tokens, str):
+            tokens = tokens.split()
+
+        self.total_documents -= 1
+        for term in set(tokens):
+            df = self.document_frequencies.get(term, 0) - 1
+            if df > 0:
+                self.document_frequencies[term] = df
+            else:
+                self.document_frequencies.pop(term, None)
+            self.term_frequencies.pop((term, doc_id), None)
+            self.log_tf.pop((term, doc_id), None)
+        self.doc_lengths.pop(doc_id, None)
+
+    def refresh_document_lengths(self) -> None:
+        # Recompute every length with the current idf from the stored log tf (no index scan).
+        # Lengths of documents indexed before later updates drift as N and df change
+        squared_weights = defaultdict(float)
+        idf_cache: Dict[str, float] = {}
+        for (term, doc_id), tf in self.log_tf.items():
+            idf = idf_cache.get(term)
+            if idf is None:
+                idf = idf_cache[term] = self.calculate_idf(term)
+            squared_weights[doc_id] += (tf * idf) ** 2
+        self.doc_lengths = {doc_id: math.sqrt(total) for doc_id, total in squared_weights.items()}
+
     def calculate_tf(self, term: str, doc_id: str) -> float:
         # We use the logarithmic TF that was precomputed
         return self.log_tf.get((term, doc_id), 0.0)
@@ -116,7 +183,16 @@ class TFIDFRanker:
         return tf * idf
     
     def rank_documents(self, query_terms: List[str], candidate_docs: Set[str]) -> List[Tuple[str, float]]:
-        # Rank documents using cosine similarity matching the theory formula: score(d, q) = (query_vector · doc_vector) / doc_length
+        # Score all candidates and sort them by score in descending order
+        scored_docs = self.score_documents(query_terms, candidate_docs)
+        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        return scored_docs
+
+    def score_documents(
+        self, query_terms: List[str], candidate_docs: Set[str], term_weights: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        # Score documents (unsorted) using cosine similarity matching the theory formula: score(d, q) = (query_vector · doc_vector) / doc_length
+        # term_weights optionally scales query term components (e.g. expansion terms weigh less than the typed ones)
         from collections import Counter
         
         # Count query term frequencies and build query vector
@@ -139,16 +215,20 @@ class TFIDFRanker:
             
             # Query vector component: w_i,q = (1 + log₂ f_i,q) × log₂(N / df_i)
             query_vector[term_index] = query_tf * query_idf
+            if term_weights is not None:
+                query_vector[term_index] *= term_weights.get(term, 1.0)
         
         # Build document vectors and calculate scores
         scored_docs = []
+        # Index membership is checked once per query term, not once per candidate
+        indexed_terms = [term in self.index.term_to_docs for term in query_terms]
         
         for doc_id in candidate_docs:
             doc_vector = [0.0] * len(query_terms)
             
             # Build TF-IDF vector for this document
             for term_index, term in enumerate(query_terms):
-                if term not in self.index.term_to_docs:
+                if not indexed_terms[term_index]:
                     continue
                 
                 # Get TF-IDF weight for this term in this document
@@ -165,8 +245,6 @@ class TFIDFRanker:
             score = dot_product / doc_length if doc_length > 0 else 0.0
             scored_docs.append((doc_id, score))
         
-        # Sort by score in descending order
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
         return scored_docs
 
 
@@ -1,6 +1,6 @@
 import math
 from collections import Counter
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 from typing import Any
 
@@ -33,8 +33,9 @@ class BM25Ranker:
         self.total_documents = len(corpus_data)
         self.document_frequencies: Dict[str, int] = self.build_document_frequencies()
         self.document_lengths: Dict[str, int] = self.build_document_lengths()
+        self.total_document_length: int = sum(self.document_lengths.values())
         self.avg_document_length: float = (
-            sum(self.document_lengths.values()) / self.total_documents
+            self.total_document_length / self.total_documents
             if self.total_documents > 0
             else 0.0
         )
@@ -57,6 +58,40 @@ class BM25Ranker:
             lengths[doc_id] = len(tokens)
         return lengths
 
+    def _document_tokens(self, doc: Dict) -> List[str]:
+        tokens = doc.get(self.text_field, [])
+        if isinstance(tokens, str):
+            tokens = tokens.split()
+        return tokens
+
+    def add_document(self, doc: Dict) -> None:
+        # Incremental update for a document just added to the index: N, df, its length and the
+        # average length stay exact without a rebuild (tf is read from the index postings)
+        doc_id = doc.get("pid")
+        tokens = self._document_tokens(doc)
+        self.total_documents += 1
+        for term in set(tokens):
+            self.document_frequencies[term] = self.document_frequencies.get(term, 0) + 1
+        self.document_lengths[doc_id] = len(tokens)
+        self.total_document_length += len(tokens)
+        self.avg_document_length = self.total_document_length / self.total_documents
+
+    def remove_document(self, doc: Dict) -> None:
+        # Inverse of add_document for a document removed from the index (doc holds its indexed tokens)
+        doc_id = doc.get("pid")
+        tokens = self._document_tokens(doc)
+        self.total_documents -= 1
+        for term in set(tokens):
+            df = self.document_frequencies.get(term, 0) - 1
+            if df > 0:
+                self.document_frequencies[term] = df
+            else:
+                self.document_frequencies.pop(term, None)
+        self.total_document_length -= self.document_lengths.pop(doc_id, len(tokens))
+        self.avg_document_length = (
+            self.total_document_length / self.total_documents if self.total_documents > 0 else 0.0
+        )
+
     def idf(self, term: str) -> float:
         df = self.document_frequencies.get(term, 0)
         # BM25 idf; guard df extremes
@@ -78,19 +113,29 @@ class BM25Ranker:
         return (tf * (self.k1 + 1.0)) / denom
 
     def rank_documents(self, query_terms: List[str], candidate_docs: Set[str]) -> List[Tuple[str, float]]:
+        scores = self.score_documents(query_terms, candidate_docs)
+        scores.sort(key=lambda x: x[1], reverse=True)
+        return scores
+
+    def score_documents(
+        self, query_terms: List[str], candidate_docs: Set[str], term_weights: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        # Unsorted BM25 scores of the candidates; term_weights optionally scales each term's contribution
         query_tf = Counter(query_terms)
         scores: List[Tuple[str, float]] = []
 
         # Precompute idf for query terms appearing in index to avoid repeated work
         idf_map: Dict[str, float] = {t: self.idf(t) for t in set(query_terms) if t in self.index.term_to_docs}
+        if term_weights is not None:
+            idf_map = {t: idf_val * term_weights.get(t, 1.0) for t, idf_val in idf_map.items()}
 
         # Build a quick access map from term -> dict(doc_id -> tf)
         term_doc_tf: Dict[str, Dict[str, int]] = {}
         for term in idf_map.keys():
             postings = self.index.term_to_docs.get(term, [])
             doc_tf_map: Dict[str, int] = {}
-            for doc_id, positions in postings:
-                doc_tf_map[doc_id] = len(positions)
+            for posting in postings:
+                doc_tf_map[posting[0]] = self.index.posting_frequency(posting)
             term_doc_tf[term] = doc_tf_map
 
         for doc_id in candidate_docs:
@@ -104,7 +149,6 @@ class BM25Ranker:
                 score += idf_val * tf_component
             scores.append((doc_id, score))
 
-        scores.sort(key=lambda x: x[1], reverse=True)
         return scores
 
 
@@ -1,6 +1,6 @@
 import math
 from collections import Counter, defaultdict
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 import sys
 import os
@@ -41,6 +41,9 @@ class CustomRanker:
         exact_match_bonus: float = 0.2,
     ):
         # Initializes the ranker with TF-IDF base and precomputes caches for efficient scoring
+        if not getattr(inverted_index, "store_positions", True):
+            # Proximity scoring reads term positions, which a frequency-only index does not keep
+            raise ValueError("CustomRanker requires an inverted index built with store_positions=True")
         self.index = inverted_index
         self.corpus_data = corpus_data
         self.tfidf_ranker = tfidf_ranker or TFIDFRanker(inverted_index, corpus_data)
@@ -79,15 +82,30 @@ class CustomRanker:
             doc_id = doc.get("pid")
             if not doc_id:
                 continue
-            field_map: Dict[str, Set[str]] = {}
-            for field in self.FIELD_WEIGHTS.keys():
-                tokens = doc.get(field, [])
-                if isinstance(tokens, str):
-                    tokens = tokens.split()
-                field_map[field] = set(tokens)
-            cache[doc_id] = field_map
+            cache[doc_id] = self._field_token_map(doc)
         return cache
 
+    def _field_token_map(self, doc: Dict) -> Dict[str, Set[str]]:
+        field_map: Dict[str, Set[str]] = {}
+        for field in self.FIELD_WEIGHTS.keys():
+            tokens = doc.get(field, [])
+            if isinstance(tokens, str):
+                tokens = tokens.split()
+            field_map[field] = set(tokens)
+        return field_map
+
+    def add_document(self, doc: Dict) -> None:
+        # Incremental update for a document added to the index; the shared TF-IDF ranker is updated by its owner.
+        # The average description length is kept from the build
+        doc_id = doc.get("pid")
+        self.doc_lookup[doc_id] = doc
+        self.field_token_cache[doc_id] = self._field_token_map(doc)
+
+    def remove_document(self, doc: Dict) -> None:
+        doc_id = doc.get("pid")
+        self.doc_lookup.pop(doc_id, None)
+        self.field_token_cache.pop(doc_id, None)
+
     def _compute_field_score(self, doc_id: str, query_term_set: Set[str]) -> float:
         # Calculates a weighted score based on how many query terms appear in each document field
         field_tokens = self.field_token_cache.get(doc_id, {})
@@ -111,13 +129,18 @@ class CustomRanker:
             return 1.0
 
         position_lists: List[List[int]] = []
+        # Indexes that look up one document's positions directly (SharedIndex) skip the posting scan
+        document_positions = getattr(self.index, "document_positions", None)
         for term in query_terms:
-            postings = self.index.term_to_docs.get(term, [])
-            doc_positions = None
-            for posting_doc_id, positions in postings:
-                if posting_doc_id == doc_id:
-                    doc_positions = list(positions)
-                    break
+            if document_positions is not None:
+                doc_positions = document_positions(term, doc_id)
+            else:
+                postings = self.index.term_to_docs.get(term, [])
+                doc_positions = None
+                for posting_doc_id, positions in postings:
+                    if posting_doc_id == doc_id:
+                        doc_positions = list(positions)
+                        break
             if not doc_positions:
                 # term missing or no positions
                 return 0.0
@@ -198,10 +221,18 @@ class CustomRanker:
 
     def rank_documents(self, query_terms: List[str], candidate_docs: Set[str]) -> List[Tuple[str, float]]:
         # Main ranking function that combines all scoring components to rank candidate documents
+        scored_docs = self.score_documents(query_terms, candidate_docs)
+        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        return scored_docs
+
+    def score_documents(
+        self, query_terms: List[str], candidate_docs: Set[str], term_weights: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        # Composite score of every candidate document (unsorted); term_weights only scales the TF-IDF base score
         if not candidate_docs:
             return []
 
-        base_scores_list = self.tfidf_ranker.rank_documents(query_terms, candidate_docs)
+        base_scores_list = self.tfidf_ranker.score_documents(query_terms, candidate_docs, term_weights)
         base_scores = {doc_id: score for doc_id, score in base_scores_list}
 
         scored_docs: List[Tuple[str, float]] = []
@@ -230,5 +261,4 @@ class CustomRanker:
 
             scored_docs.append((doc_id, composite))
 
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
         return scored_docs
\ No newline at end of file
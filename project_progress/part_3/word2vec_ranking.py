@@ -37,19 +37,23 @@ class Word2VecRanker:
         text_field: str = "tokens",
         model_name: str = "word2vec-google-news-300",
         model_path: Optional[str] = None,
+        word_vectors: Optional[KeyedVectors] = None,
     ):
         self.index = inverted_index
         self.corpus_data = corpus_data
         self.text_field = text_field
         
-        # Load word2vec model
-        self.word_vectors = self._load_word2vec_model(model_name, model_path)
+        # Load word2vec model (unless an already loaded one is given)
+        if word_vectors is None:
+            word_vectors = self.load_word2vec_model(model_name, model_path)
+        self.word_vectors = word_vectors
         self.vector_dim = self.word_vectors.vector_size if self.word_vectors else None
         
         # Precompute document vectors
         self.doc_vectors: Dict[str, np.ndarray] = self._precompute_document_vectors()
     
-    def _load_word2vec_model(self, model_name: str, model_path: Optional[str]) -> Optional[KeyedVectors]:
+    @staticmethod
+    def load_word2vec_model(model_name: str, model_path: Optional[str]) -> Optional[KeyedVectors]:
         if KeyedVectors is None:
             raise ImportError("gensim is required. Install with: pip install gensim")
         
@@ -101,6 +105,21 @@ class Word2VecRanker:
         avg_vector = np.mean(vectors, axis=0)
         return avg_vector
     
+    def _weighted_average_word_vectors(self, tokens: List[str], weights: Dict[str, float]) -> Optional[np.ndarray]:
+        # Weighted average of the token vectors (tokens missing from weights count once).
+        vectors = []
+        vector_weights = []
+        for token in tokens:
+            vec = self._get_word_vector(token)
+            if vec is not None:
+                vectors.append(vec)
+                vector_weights.append(weights.get(token, 1.0))
+        
+        if not vectors or sum(vector_weights) <= 0:
+            return None
+        
+        return np.average(vectors, axis=0, weights=vector_weights)
+    
     def _precompute_document_vectors(self) -> Dict[str, np.ndarray]:
         # Precompute averaged word vectors for all documents.
         doc_vectors: Dict[str, np.ndarray] = {}
@@ -125,6 +144,19 @@ class Word2VecRanker:
         print(f"Precomputed vectors for {len(doc_vectors)} documents")
         return doc_vectors
     
+    def add_document(self, doc: Dict) -> None:
+        # Incremental update for a document added to the index: only its averaged vector is needed.
+        doc_id = doc.get("pid")
+        tokens = doc.get(self.text_field, [])
+        if isinstance(tokens, str):
+            tokens = tokens.split()
+        doc_vector = self._average_word_vectors(tokens)
+        if doc_vector is not None:
+            self.doc_vectors[doc_id] = doc_vector
+    
+    def remove_document(self, doc: Dict) -> None:
+        self.doc_vectors.pop(doc.get("pid"), None)
+    
     def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:        
         # Compute cosine similarity between two vectors.
 
@@ -143,12 +175,29 @@ class Word2VecRanker:
         candidate_docs: Set[str]
     ) -> List[Tuple[str, float]]:
         # Rank documents using word2vec cosine similarity.
+        scored_docs = self.score_documents(query_terms, candidate_docs)
+        
+        # Sort by score in descending order
+        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        return scored_docs
+
+    def score_documents(
+        self, 
+        query_terms: List[str], 
+        candidate_docs: Set[str],
+        term_weights: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        # Unsorted word2vec cosine similarities (documents without a vector are skipped).
+        # term_weights turns the query vector into a weighted average of the term vectors.
 
         if not query_terms or not candidate_docs:
             return []
         
         # Compute query vector by averaging query term vectors
-        query_vector = self._average_word_vectors(query_terms)
+        if term_weights is None:
+            query_vector = self._average_word_vectors(query_terms)
+        else:
+            query_vector = self._weighted_average_word_vectors(query_terms, term_weights)
         
         if query_vector is None:
             # No valid word vectors found for query terms
@@ -168,6 +217,4 @@ class Word2VecRanker:
             similarity = self._cosine_similarity(query_vector, doc_vector)
             scored_docs.append((doc_id, similarity))
         
-        # Sort by score in descending order
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
         return scored_docs
@@ -1,5 +1,7 @@
+import hmac
 import re
 import os
+import threading
 import time
 import uuid
 from datetime import datetime
@@ -7,14 +9,21 @@ from json import JSONEncoder
 from typing import Optional
 
 import httpagentparser  # for getting the user agent as json
-from flask import Flask, render_template, session, request
+from flask import Flask, jsonify, render_template, session, request
 from markupsafe import Markup, escape
 
 from myapp.analytics.analytics_data import AnalyticsData, ClickedDoc
-from myapp.search.load_corpus import load_corpus
+from myapp.search.attributes import SearchFilters
+from myapp.search.enrichment import enrich_document
+from myapp.search.fielded import parse_field_clauses
+from myapp.search.generations import GenerationManager, IndexGeneration
+from myapp.search.load_corpus import load_display_corpus
 from myapp.search.objects import Document, StatsDocument
-from myapp.search.search_engine import SearchEngine
+from myapp.search.prefork import PreforkServer, process_memory
+from myapp.search.preprocessing import preprocess_query
 from myapp.search.algorithms import SearchAlgorithm
+from myapp.search.suggest import PrefixSuggester, vocabulary_completions
+from myapp.search.warmup import CacheWarmer, warm_up_from_query_log
 from myapp.generation.rag import RAGGenerator
 from dotenv import load_dotenv
 load_dotenv()  # take environment variables from .env
@@ -36,23 +45,120 @@ app.secret_key = os.getenv("SECRET_KEY")
 # open browser dev tool to see the cookies
 app.session_cookie_name = os.getenv("SESSION_COOKIE_NAME")
 
-# Load documents corpus into memory (for display purposes)
+# Load the short raw display fields (brand, category, seller as written by the seller) into memory;
+# descriptions, images and product details are read from the search algorithm's blob store
 full_path = os.path.realpath(__file__)
 path, filename = os.path.split(full_path)
 file_path = path + "/" + os.getenv("DATA_FILE_PATH")
-corpus = load_corpus(file_path)
+corpus = load_display_corpus(file_path)
 
 # Initialize search algorithm with processed corpus (contains tokens for indexing)
 processed_corpus_path = os.path.join(path, "project_progress", "part_1", "data", "processed_corpus.json")
-print(f"\nInitializing search algorithm with corpus: {processed_corpus_path}")
-search_algorithm = SearchAlgorithm(processed_corpus_path)
+query_log_path = os.getenv("QUERY_LOG_PATH", os.path.join(path, "data", "query_log.jsonl"))
+warmup_methods = [m.strip() for m in os.getenv("CACHE_WARMUP_METHODS", "").split(",") if m.strip()] or None
+warmup_top_n = int(os.getenv("CACHE_WARMUP_TOP_N", "50"))
+cache_warmer: Optional[CacheWarmer] = None
+# Worker processes serving requests (1: the Flask server in this process). With more, the index is shared
+# read-only between them (see SearchAlgorithm.share_index) and reloads need a restart
+web_workers = int(os.getenv("WEB_WORKERS", "1"))
+# Serve the requests of the Flask server from one thread each (single worker process only)
+web_threaded = os.getenv("WEB_THREADED", "0") == "1"
+worker_slot: Optional[int] = None
+# Set once the first generation's warm-up covered every enabled ranking method (see _prepare_generation)
+startup_warm_up_done = threading.Event()
+startup_warm_up_report: Optional[dict] = None
+
+
+def _build_search_algorithm(corpus_path: str, blob_path: str) -> SearchAlgorithm:
+    search_algorithm = SearchAlgorithm(
+        corpus_path,
+        pair_index_queries=AnalyticsData.read_top_queries(query_log_path, limit=500),
+        blob_store_path=blob_path,
+    )
+    # BM25, Word2Vec and Custom are built in background threads; until then their queries rank with TF-IDF
+    search_algorithm.prebuild_rankers()
+    return search_algorithm
+
 
-# Instantiate search engine with the algorithm
-search_engine = SearchEngine(search_algorithm)
-ranking_methods_options = search_algorithm.get_available_methods()
+def _warm_up_generation(generation: IndexGeneration) -> dict:
+    # Warm-up skips methods whose ranker is still building, so every build must have finished
+    generation.search_algorithm.wait_for_rankers()
+    report = warm_up_from_query_log(generation.search_algorithm, query_log_path, warmup_top_n, warmup_methods)
+    print(f"Query cache warm-up (generation {generation.number}):", report)
+    return report
 
-# Instantiate our in memory persistence
-analytics_data = AnalyticsData()
+
+def _warm_up_startup_generation(generation: IndexGeneration):
+    global startup_warm_up_report
+    try:
+        startup_warm_up_report = _warm_up_generation(generation)
+    finally:
+        startup_warm_up_done.set()
+
+
+def _prepare_generation(generation: IndexGeneration, current: Optional[IndexGeneration]):
+    if current is not None:
+        # A reloaded generation only replaces the serving one once its rankers are built and its cache is warm
+        _warm_up_generation(generation)
+        return
+    # At startup the app serves while the rankers build (methods still building rank with TF-IDF);
+    # the head queries of previous runs are warmed for every method once the builds finish and
+    # /ready answers 503 until then
+    threading.Thread(
+        target=_warm_up_startup_generation, args=(generation,), name="startup-warm-up", daemon=True
+    ).start()
+
+
+def _on_generation_swap(generation: IndexGeneration, previous: Optional[IndexGeneration]):
+    global suggester
+    if previous is None:
+        return
+    # Same past queries, vocabulary of the new corpus
+    suggester = PrefixSuggester(
+        suggester.query_counts,
+        vocabulary_completions(generation.search_algorithm.inverted_index, generation.search_algorithm.corpus_data),
+    )
+    if cache_warmer is not None:
+        cache_warmer.search_algorithm = generation.search_algorithm
+
+
+# Requests read generations.current once and use that generation to the end, so a reload
+# (POST /api/admin/reload or a change of the corpus file) never mixes two index versions
+print(f"\nInitializing search algorithm with corpus: {processed_corpus_path}")
+generations = GenerationManager(
+    processed_corpus_path,
+    build=_build_search_algorithm,
+    blob_path=os.getenv("BLOB_STORE_PATH"),
+    prepare=_prepare_generation,
+    on_swap=_on_generation_swap,
+)
+startup_algorithm = generations.load().search_algorithm
+ranking_methods_options = startup_algorithm.get_available_methods()
+sort_options = startup_algorithm.get_sort_options()
+RESULTS_PER_PAGE = 20
+
+# Instantiate our in memory persistence (queries are also appended to a JSONL log for cache warm-up)
+analytics_data = AnalyticsData(query_log_path=query_log_path)
+
+# Autocomplete: past queries of the log (updated on every search) and the vocabulary words of titles
+suggester = PrefixSuggester(
+    AnalyticsData.read_query_counts(query_log_path),
+    vocabulary_completions(startup_algorithm.inverted_index, startup_algorithm.corpus_data),
+)
+print("Suggester:", suggester.stats())
+
+warmup_interval = float(os.getenv("CACHE_WARMUP_INTERVAL", "0"))
+# Worker processes start their own warmer (threads are not forked, see _start_worker)
+if warmup_interval > 0 and web_workers <= 1:
+    cache_warmer = CacheWarmer(startup_algorithm, query_log_path, warmup_top_n, warmup_interval, warmup_methods).start()
+
+# Later generations replace it: no module-level reference may keep the first one alive
+del startup_algorithm
+
+# Reload automatically when the processed corpus file changes (seconds between checks, 0 disables)
+corpus_watch_interval = float(os.getenv("CORPUS_WATCH_INTERVAL", "0"))
+if corpus_watch_interval > 0 and web_workers <= 1:
+    generations.start_watcher(corpus_watch_interval)
 
 # Instantiate RAG generator
 rag_generator = RAGGenerator()
@@ -82,7 +188,32 @@ def _extract_query_terms(query: str) -> list[str]:
     """
     if not query:
         return []
-    return [term for term in re.split(r"\s+", query.strip()) if term]
+    # Query-language syntax (quotes, parentheses, operators), attribute clauses and negated words are not highlighted
+    terms = []
+    negated = False
+    for term in re.findall(r'[^\s()"]+', query):
+        if term in ("AND", "OR"):
+            continue
+        if term == "NOT":
+            negated = True
+            continue
+        # Attribute clauses (brand:puma, price:<1500), valid or ignored, are not text
+        if ":" in term and not parse_field_clauses(term)[0]:
+            negated = False
+            continue
+        if not negated and not term.startswith("-"):
+            terms.append(term)
+        negated = False
+    return terms
+
+def _relaxed_words(query_terms: list[str], relaxation: Optional[dict]) -> list[str]:
+    """
+    Words of the raw query whose stems the search engine stopped requiring.
+    """
+    if not relaxation:
+        return []
+    relaxed_terms = set(relaxation["relaxed_terms"])
+    return [term for term in query_terms if relaxed_terms.intersection(preprocess_query(term))]
 
 def parse_rag_summary(summary_text: str):
     """
@@ -136,12 +267,18 @@ def index():
 
     print("Remote IP: {} - JSON user browser {}".format(user_ip, agent))
     print(session)
-    selected_method = session.get('last_ranking_method', search_algorithm.DEFAULT_RANKING_METHOD)
+    search_algorithm = generations.current.search_algorithm
+    selected_method = session.get('last_ranking_method', SearchAlgorithm.DEFAULT_RANKING_METHOD)
     response = render_template(
         'index.html',
         page_title="Welcome",
         ranking_methods=ranking_methods_options,
-        selected_ranking_method=selected_method
+        selected_ranking_method=selected_method,
+        selected_filters=session.get('last_filters', {}),
+        sort_options=sort_options,
+        selected_sort=session.get('last_sort_by', search_algorithm.DEFAULT_SORT),
+        expansion_available=search_algorithm.expansion_table is not None,
+        selected_expand=session.get('last_expand', False)
     )
     _log_request(session_id, context)
     return response
@@ -150,6 +287,8 @@ def index():
 @app.route('/search', methods=['POST'])
 def search_form_post():
     search_query = request.form['search-query']
+    generation = generations.current
+    search_algorithm, search_engine = generation.search_algorithm, generation.search_engine
     session_id, context = _prepare_request_context()
     visitor_id = _ensure_visitor_id()
     mission_id = _ensure_mission(session_id)
@@ -164,9 +303,18 @@ def search_form_post():
         context["city"] = city_override
     ranking_method = request.form.get('ranking-method', search_algorithm.DEFAULT_RANKING_METHOD)
     query_terms = _extract_query_terms(search_query)
+    filters = SearchFilters.from_form(request.form)
+    sort_by = request.form.get('sort-by') or search_algorithm.DEFAULT_SORT
+    expand = request.form.get('expand-query') == 'on'
+    # Cursor of the requested page, plus the cursors of the pages before it ("-" = first page)
+    search_after = request.form.get('search-after') or None
+    cursor_trail = request.form.get('cursor-trail', '').split()
 
     session['last_search_query'] = search_query
     session['last_ranking_method'] = ranking_method
+    session['last_filters'] = filters.to_form()
+    session['last_sort_by'] = sort_by
+    session['last_expand'] = expand
 
     search_id = analytics_data.save_query_terms(
         search_query,
@@ -181,14 +329,35 @@ def search_form_post():
         city=context.get("city"),
     )
 
-    results = search_engine.search(
-        search_query,
-        search_id,
-        corpus,
-        ranking_method=ranking_method
+    search_kwargs = dict(
+        ranking_method=ranking_method,
+        session_id=session_id,
+        filters=filters,
+        facets=True,
+        top_k=RESULTS_PER_PAGE,
+        sort_by=sort_by,
+        expand=expand,
     )
+    try:
+        results, search_response = search_engine.run_search(
+            search_query,
+            search_id,
+            corpus,
+            search_after=search_after,
+            first_position=len(cursor_trail) * RESULTS_PER_PAGE + 1,
+            **search_kwargs
+        )
+    except ValueError as e:
+        # Stale or tampered cursor (e.g. the sort order changed): restart from the first page
+        print(f"Ignoring pagination cursor: {e}")
+        search_after, cursor_trail = None, []
+        results, search_response = search_engine.run_search(search_query, search_id, corpus, **search_kwargs)
+    page = len(cursor_trail) + 1
     found_count = len(results)
-    analytics_data.update_query_results(search_id, found_count)
+    analytics_data.update_query_results(search_id, found_count, relaxed=search_response.relaxation is not None)
+    if found_count > 0 and not search_after:
+        # Only queries that found something become completions, counted once per search
+        suggester.record_query(search_query)
 
     rag_result = None
     rag_summary = None
@@ -212,23 +381,46 @@ def search_form_post():
 
     print(session)
 
-    ranking_label = search_algorithm.get_method_label(ranking_method)
-    highlighted_results = []
-    for doc in results:
-        doc_data = doc.model_dump()
-        doc_data["highlighted_title"] = _highlight_text(doc.title, query_terms)
-        doc_data["highlighted_description"] = _highlight_text(doc.description, query_terms)
-        highlighted_results.append(doc_data)
+    ranking_fallback = search_response.ranking_fallback
+    if ranking_fallback:
+        # The chosen method is kept in the session; this page was ranked with the default one
+        ranking_fallback = dict(ranking_fallback, label=search_algorithm.get_method_label(ranking_fallback["requested"]))
+    ranking_label = search_algorithm.get_method_label(ranking_fallback["used"] if ranking_fallback else ranking_method)
+    highlighted_results = [
+        doc.with_highlights(
+            _highlight_text(doc.title, query_terms),
+            _highlight_text(doc.description, query_terms),
+        )
+        for doc in results
+    ]
 
     response = render_template(
         'results.html',
         results_list=highlighted_results,
         page_title="Results",
-        found_counter=found_count,
+        found_counter=search_response.total,
         rag_result=rag_result,
         rag_summary=rag_summary,
         search_id=search_id,
-        ranking_method_label=ranking_label
+        ranking_method_label=ranking_label,
+        ranking_fallback=ranking_fallback,
+        active_filters=filters.to_form(),
+        facets=search_response.facets,
+        search_query=search_query,
+        ranking_method=ranking_method,
+        sort_by=sort_by,
+        sort_options=sort_options,
+        page=page,
+        next_cursor=search_response.next_cursor,
+        current_cursor=search_after or '-',
+        cursor_trail=cursor_trail,
+        spelling=search_response.spelling,
+        relaxed_words=_relaxed_words(query_terms, search_response.relaxation),
+        relaxation=search_response.relaxation,
+        synonyms=search_response.synonyms,
+        query_plan=search_response.query_plan,
+        field_clauses=search_response.field_clauses,
+        expand=expand,
     )
     latency_ms = round((time.perf_counter() - start_time) * 1000, 2)
     _log_request(session_id, context, latency_ms=latency_ms)
@@ -252,7 +444,7 @@ def doc_details():
         return response
 
     # Get document data from search algorithm's processed corpus
-    doc_data = search_algorithm.get_document_by_id(clicked_doc_id)
+    doc_data = generations.current.search_algorithm.get_document_by_id(clicked_doc_id)
 
     if not doc_data:
         # Fallback to display corpus
@@ -275,17 +467,14 @@ def doc_details():
                 'url': doc.original_url or doc.url,
                 'images': doc.images
             }
+            enrich_document(doc_data)
         else:
             response = render_template('doc_details.html', error="Product not found", page_title="Error")
             _log_request(session_id, context, status_code=404)
             return response
 
-    # Handle description fallback
-    description = doc_data.get('description')
-    if not description or (isinstance(description, str) and description.strip() == ''):
-        description = doc_data.get('full_text', '')
-    if not description or (isinstance(description, str) and description.strip() == ''):
-        description = doc_data.get('title', 'No description available')
+    # Description fallback chain was resolved at ingestion time (display_description)
+    description = doc_data.get('display_description') or 'No description available'
 
     # Handle product_details
     product_details = doc_data.get('product_details')
@@ -316,7 +505,10 @@ def doc_details():
 
     # Get last search query/ranking to support back navigation
     last_search_query = session.get('last_search_query', '')
-    last_ranking_method = session.get('last_ranking_method', search_algorithm.DEFAULT_RANKING_METHOD)
+    last_ranking_method = session.get('last_ranking_method', SearchAlgorithm.DEFAULT_RANKING_METHOD)
+    last_filters = session.get('last_filters', {})
+    last_sort_by = session.get('last_sort_by')
+    last_expand = session.get('last_expand', False)
 
     # Pass all available document data to template
     response = render_template(
@@ -326,6 +518,9 @@ def doc_details():
         product_details=product_details,
         last_search_query=last_search_query,
         last_ranking_method=last_ranking_method,
+        last_filters=last_filters,
+        last_sort_by=last_sort_by,
+        last_expand=last_expand,
         page_title=doc_data.get('title', 'Product Details'),
         search_id=search_id,
     )
@@ -341,7 +536,9 @@ def stats():
     for doc_id in analytics_data.fact_clicks:
         row: Document = corpus[doc_id]
         count = analytics_data.fact_clicks[doc_id]
-        doc = StatsDocument(pid=row.pid, title=row.title, description=row.description, url=row.url, count=count)
+        doc_data = generations.current.search_algorithm.get_document_by_id(doc_id) or {}
+        description = doc_data.get('display_description') or row.description
+        doc = StatsDocument(pid=row.pid, title=row.title, description=description, url=row.url, count=count)
         docs.append(doc)
     
     # simulate sort by ranking
@@ -357,10 +554,11 @@ def dashboard():
     visited_docs = []
     for doc_id in analytics_data.fact_clicks.keys():
         d: Document | None = corpus.get(doc_id)
+        doc_data = generations.current.search_algorithm.get_document_by_id(doc_id) or {}
         doc = ClickedDoc(
             doc_id=doc_id,
             title=getattr(d, "title", None) if d else None,
-            description=getattr(d, "description", None) if d else None,
+            description=doc_data.get('display_description'),
             counter=analytics_data.fact_clicks[doc_id],
         )
         visited_docs.append(doc)
@@ -511,6 +709,88 @@ def plot_number_of_views():
     return analytics_data.plot_number_of_views()
 
 
+@app.route('/api/search_stats', methods=['GET'])
+def search_stats():
+    """
+    Monitoring endpoint: query cache counters and result hydration timings.
+    Not logged as analytics traffic so that scrapers do not skew the dashboard.
+    """
+    generation = generations.current
+    search_algorithm, search_engine = generation.search_algorithm, generation.search_engine
+    return jsonify({
+        "query_cache": search_algorithm.get_cache_stats(),
+        "refinement": search_algorithm.get_refinement_stats(),
+        "pair_index": search_algorithm.get_pair_index_stats(),
+        "spelling": search_algorithm.get_spelling_stats(),
+        "relaxation": search_algorithm.get_relaxation_stats(),
+        "expansion": search_algorithm.get_expansion_stats(),
+        "segments": search_algorithm.get_segment_stats(),
+        "suggest": suggester.stats(),
+        "hydration": search_engine.get_hydration_stats(),
+        "generations": generations.status(),
+        "rankers": search_algorithm.get_ranker_status(),
+        "process": dict(process_memory() or {"pid": os.getpid()}, worker=worker_slot),
+    })
+
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """
+    Autocomplete for the search box: ?q=<typed text>&k=<number of completions>.
+    Not logged as analytics traffic (one call per keystroke).
+    """
+    prefix = request.args.get('q', '')
+    try:
+        k = min(max(int(request.args.get('k', 8)), 1), suggester.top_k)
+    except ValueError:
+        k = 8
+    return jsonify({"query": prefix, "suggestions": suggester.suggest(prefix, k)})
+
+
+@app.route('/api/explain', methods=['GET'])
+def explain_query():
+    """
+    Execution plan of a query-language query: ?q="round neck" -polo (cotton OR linen).
+    Not logged as analytics traffic.
+    """
+    return jsonify(generations.current.search_algorithm.explain_query(request.args.get('q', '')))
+
+
+@app.route('/ready', methods=['GET'])
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 200 while an index generation serves (including during a background rebuild),
+    503 before the first one is ready and its query cache is warm for every enabled ranking method.
+    The body is the generation status, the startup warm-up and the build state of the serving
+    generation's rankers (methods still building rank with TF-IDF).
+    With ?rankers=all it also answers 503 while a ranker is still building; failed ones do not count.
+    """
+    status = generations.status()
+    current = generations.current
+    status["rankers"] = current.search_algorithm.get_ranker_status() if current else {}
+    status["warm_up"] = startup_warm_up_report if startup_warm_up_done.is_set() else "running"
+    building = [method for method, ranker in status["rankers"].items() if ranker["state"] in ("pending", "building")]
+    ready = status["ready"] and startup_warm_up_done.is_set() and not (request.args.get("rankers") == "all" and building)
+    return jsonify(status), (200 if ready else 503)
+
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Rebuild the index from the processed corpus file in the background and swap it in when ready.
+    Needs an X-Admin-Token header equal to ADMIN_TOKEN (disabled when ADMIN_TOKEN is not set).
+    Answers 202 when the build started, 409 when one is already running.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), admin_token):
+        return jsonify({"error": "forbidden"}), 403
+    if generations.current.search_algorithm.shared_index is not None:
+        return jsonify({"error": "the index is shared between worker processes, restart the server to reload it"}), 409
+    started = generations.reload("admin")
+    return jsonify(dict(generations.status(), started=started)), (202 if started else 409)
+
+
 @app.route('/track_dwell', methods=['POST'])
 def track_dwell():
     session_id, context = _prepare_request_context()
@@ -536,5 +816,21 @@ def track_dwell():
     return ("", 204)
 
 
+def _start_worker(slot: int):
+    global worker_slot, cache_warmer
+    worker_slot = slot
+    if warmup_interval > 0:
+        cache_warmer = CacheWarmer(
+            generations.current.search_algorithm, query_log_path, warmup_top_n, warmup_interval, warmup_methods
+        ).start()
+
+
 if __name__ == "__main__":
-    app.run(port=8088, host="0.0.0.0", threaded=False, debug=os.getenv("DEBUG"))
+    if web_workers > 1:
+        # The index, ranking statistics and document vectors move to a mapped file every worker reads in place
+        generations.current.search_algorithm.share_index()
+        # Workers inherit the warmed query cache: fork only once the startup warm-up finished
+        startup_warm_up_done.wait()
+        PreforkServer(app, "0.0.0.0", 8088, web_workers, post_fork=_start_worker).serve_forever()
+    else:
+        app.run(port=8088, host="0.0.0.0", threaded=web_threaded, debug=os.getenv("DEBUG"))